@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+对比句向量后端（torch / onnx）的别名合并结果与开销
+
+每个后端在独立子进程中运行（内存峰值互不影响）：预处理、NER 与别名识别后执行 merge_characters，
+记录模型加载耗时、合并耗时、进程内存峰值和合并分组。输出两个后端的指标，
+以及以 torch 为基准的"名字 -> 主名"一致率和不一致的名字。
+
+用法:
+    python benchmark_embedding.py novel.txt [--backends torch onnx] [--threshold 0.8]
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def run_backend(backend: str, text: str, threshold: float) -> Dict[str, Any]:
+    """在当前进程中用指定后端完成一次别名合并"""
+    from src.config import settings
+
+    settings.EMBEDDING_BACKEND = backend
+    settings.EMBEDDING_CACHE_ENABLED = False
+
+    from src.core import AliasRecognizer, NERRecognizer, TextPreprocessor
+
+    _, sentences, _ = TextPreprocessor().preprocess(text)
+    mentions = NERRecognizer().recognize(sentences)
+    alias = AliasRecognizer()
+    mentions.extend(alias.recognize_aliases(sentences))
+
+    started = time.perf_counter()
+    alias.initialize()
+    load_seconds = time.perf_counter() - started
+    if not alias.uses_semantic_merge:
+        raise RuntimeError(f"{backend} 后端加载失败")
+
+    started = time.perf_counter()
+    characters, _ = alias.merge_characters(mentions, sentences, "benchmark", threshold)
+    merge_seconds = time.perf_counter() - started
+
+    return {
+        "backend": backend,
+        "model_id": alias.embedding_model_id,
+        "load_seconds": load_seconds,
+        "merge_seconds": merge_seconds,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "main_of": {
+            name: character.canonical_name
+            for character in characters
+            for name in (character.canonical_name, *character.aliases)
+        },
+    }
+
+
+def _child(backend: str, text: str, threshold: float, queue: multiprocessing.Queue) -> None:
+    try:
+        queue.put(run_backend(backend, text, threshold))
+    except Exception as error:
+        queue.put({"backend": backend, "error": str(error)})
+
+
+def agreement(baseline: Dict[str, str], other: Dict[str, str]) -> Dict[str, Any]:
+    """
+    比较两组合并结果
+
+    两个名字在一组结果中属于同一人物、在另一组中不属于时记为一次分歧。
+
+    Returns:
+        一致的名字对比例与涉及分歧的名字
+    """
+    names = sorted(set(baseline) & set(other))
+    total = disagree = 0
+    changed = set()
+    for i, left in enumerate(names):
+        for right in names[i + 1:]:
+            total += 1
+            if (baseline[left] == baseline[right]) != (other[left] == other[right]):
+                disagree += 1
+                changed.update((left, right))
+    return {
+        "pairs": total,
+        "agreement": 1.0 - disagree / total if total else 1.0,
+        "changed_names": sorted(changed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比句向量后端的别名合并结果")
+    parser.add_argument("text_file", help="UTF-8 小说文本")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args()
+
+    text = Path(args.text_file).read_text(encoding="utf-8")
+    context = multiprocessing.get_context("spawn")
+
+    results: List[Dict[str, Any]] = []
+    for backend in args.backends:
+        queue = context.Queue()
+        process = context.Process(target=_child, args=(backend, text, args.threshold, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if "error" in result:
+            print(f"{backend}: 失败 - {result['error']}")
+            continue
+        results.append(result)
+        print(
+            f"{backend:>6}: 加载 {result['load_seconds']:.2f}s, 合并 {result['merge_seconds']:.2f}s, "
+            f"内存峰值 {result['max_rss_mb']:.0f} MB, 人物 {len(set(result['main_of'].values()))} 个"
+        )
+
+    if len(results) < 2:
+        return
+
+    baseline = results[0]
+    for result in results[1:]:
+        stats = agreement(baseline["main_of"], result["main_of"])
+        print(
+            f"{result['backend']} vs {baseline['backend']}: {stats['pairs']} 个名字对, "
+            f"合并决策一致率 {stats['agreement']:.2%}"
+        )
+        if stats["changed_names"]:
+            print(f"  分歧涉及: {', '.join(stats['changed_names'])}")
+
+
+if __name__ == "__main__":
+    main()
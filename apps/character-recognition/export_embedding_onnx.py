@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+导出 int8 量化的 ONNX 句向量模型，供 EMBEDDING_BACKEND=onnx 使用
+
+导出 EMBEDDING_MODEL（默认 shibing624/text2vec-base-chinese）的 BERT 编码器，输出最后一层隐状态，
+平均池化在 OnnxEmbeddingBackend 中完成；再用 onnxruntime 做动态量化。
+导出只需在构建镜像时运行一次，服务运行时不依赖 torch/transformers。
+
+用法:
+    python export_embedding_onnx.py [--model shibing624/text2vec-base-chinese] [--output models/embedding-onnx]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.config import settings
+from src.onnx_export import export_quantized
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 int8 ONNX 句向量模型")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--output", default=os.path.dirname(settings.EMBEDDING_ONNX_MODEL_PATH))
+    args = parser.parse_args()
+
+    # 输出最后一层隐状态，平均池化在 OnnxEmbeddingBackend 中完成
+    export_quantized(
+        args.model,
+        args.output,
+        model_class="AutoModel",
+        sample_text="雅芙是老板的女儿。",
+        output_name="last_hidden_state",
+        config=lambda model: {"pooling": "mean"},
+    )
+
+
+if __name__ == "__main__":
+    main()
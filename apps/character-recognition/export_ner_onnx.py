@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+导出 int8 量化的 ONNX NER 模型，供 NER_ENGINE=onnx 使用
+
+HanLP 的 MSRA_NER_BERT_BASE_ZH 是 TensorFlow 检查点，无法直接导出；
+这里导出同类的 HuggingFace 中文 BERT 人名识别模型（标签为 B-/I- + PER/NR 等），
+再用 onnxruntime 做动态量化。导出只需在构建镜像时运行一次，服务运行时不依赖 torch/transformers。
+
+用法:
+    python export_ner_onnx.py [--model shibing624/bert4ner-base-chinese] [--output models/ner-onnx]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.config import settings
+from src.onnx_export import export_quantized
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 int8 ONNX NER 模型")
+    parser.add_argument("--model", default="shibing624/bert4ner-base-chinese")
+    parser.add_argument("--output", default=os.path.dirname(settings.NER_ONNX_MODEL_PATH))
+    args = parser.parse_args()
+
+    # 引擎运行时需要标签表
+    export_quantized(
+        args.model,
+        args.output,
+        model_class="AutoModelForTokenClassification",
+        sample_text="王强笑着说道。",
+        output_name="logits",
+        config=lambda model: {"id2label": model.config.id2label},
+    )
+
+
+if __name__ == "__main__":
+    main()
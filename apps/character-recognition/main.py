@@ -5,7 +5,7 @@ from pathlib import Path
 # 添加 src 到路径
 sys.path.insert(0, str(Path(__file__).parent))
 
-from datetime import datetime
+import asyncio
 from typing import Any, Dict, Optional
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
@@ -15,11 +15,13 @@ import uvicorn
 import httpx
 
 from src.cache import (
-    cache_callback, cache_meta, cache_result, cache_stage,
-    fetch_meta, fetch_result, enqueue_task, get_queue_length
+    cache_callback, choose_lane, fetch_meta, fetch_result, fetch_worker_pools, enqueue_task, get_queue_length, get_queue_stats
 )
 from src.config import settings
+from src.executor import ExecutorSaturated, RecognitionExecutor, recognize_in_process
 from src.models import RecognitionRequest, RecognitionResponse
+from src.parallel import shutdown_shard_pool
+from src.progress import ProgressReporter
 from src.recognizer import CharacterRecognizer
 from src.utils import setup_logging
 from src.task_manager import task_manager, TaskStatus
@@ -46,134 +48,45 @@ app.add_middleware(
 # 创建识别器实例
 recognizer = CharacterRecognizer()
 
+# 同步识别与内存模式任务的有界执行池（识别是 CPU 密集型，不能在事件循环中执行）
+recognize_executor = RecognitionExecutor()
 
-# ======================== 任务进度与缓存辅助 ========================
-class ProgressReporter:
-    """统一管理进度上报与 Redis 缓存"""
 
-    STAGE_PROGRESS = {
-        "preprocess": 10,
-        "ner": 60,
-        "merge": 70,
-        "coreference": 78,
-        "relations": 92,
-        "result": 96,
-    }
+# ======================== 识别执行辅助 ========================
+def submit_recognition(request: RecognitionRequest, reporter: Optional[ProgressReporter] = None) -> "asyncio.Future":
+    """
+    把识别提交到执行池
 
-    STAGE_MESSAGES = {
-        "preprocess": "文本预处理完成",
-        "ner": "人名识别中",
-        "merge": "别名合并完成",
-        "coreference": "指代消解完成",
-        "relations": "关系抽取完成",
-        "result": "结果组装完成",
-    }
+    Args:
+        request: 识别请求
+        reporter: 进度上报器（进程池模式下无法跨进程回调，只上报开始与结束）
+
+    Returns:
+        可 await 的识别结果
+
+    Raises:
+        ExecutorSaturated: 执行池已满
+    """
+    if recognize_executor.uses_processes:
+        return recognize_executor.submit(recognize_in_process, request)
+
+    if reporter is None:
+        return recognize_executor.submit(recognizer.recognize, request)
+    return recognize_executor.submit(
+        recognizer.recognize,
+        request,
+        on_sentence=reporter.on_sentence,
+        on_stage=reporter.on_stage
+    )
 
-    def __init__(self, task_id: str):
-        self.task_id = task_id
-        self.total_sentences = 0
-        self.processed_sentences = 0
-        self.progress = 0
-        self.status = TaskStatus.PROCESSING
-        self.message = ""
-
-    def start(self) -> None:
-        self._publish(progress=0, message="开始识别角色")
-
-    def on_sentence(self, processed: int, total: int) -> None:
-        self.total_sentences = max(self.total_sentences, total)
-        self.processed_sentences = max(self.processed_sentences, processed)
-
-        progress = self._calc_sentence_progress()
-        message = f"逐句识别中 ({self.processed_sentences}/{self.total_sentences})"
-        self._publish(progress=progress, message=message)
-
-    def on_stage(self, stage: str, payload: Dict[str, Any]) -> None:
-        # 写入阶段产物缓存
-        cache_stage(self.task_id, stage, payload or {})
-
-        if stage == "preprocess":
-            self.total_sentences = payload.get("total_sentences", self.total_sentences)
-
-        target_progress = self.STAGE_PROGRESS.get(stage)
-        message = self.STAGE_MESSAGES.get(stage, "识别中")
-
-        if target_progress is not None:
-            self._publish(progress=target_progress, message=message)
-
-    def complete(self, result: Dict[str, Any]) -> None:
-        cache_result(self.task_id, result)
-        self.status = TaskStatus.COMPLETED
-        self._publish(
-            status=TaskStatus.COMPLETED,
-            progress=100,
-            message="识别完成",
-            result=result
-        )
-
-    def fail(self, error: str) -> None:
-        self.status = TaskStatus.FAILED
-        self._publish(
-            status=TaskStatus.FAILED,
-            progress=self.progress,
-            message="识别失败",
-            error=error
-        )
-
-    def meta_snapshot(self) -> Dict[str, Any]:
-        return {
-            "status": self.status.value if isinstance(self.status, TaskStatus) else self.status,
-            "progress": self.progress,
-            "message": self.message,
-            "processed_sentences": self.processed_sentences,
-            "total_sentences": self.total_sentences,
-            "updated_at": datetime.utcnow().isoformat(),
-        }
 
-    def _calc_sentence_progress(self) -> int:
-        if not self.total_sentences:
-            return max(self.progress, self.STAGE_PROGRESS["preprocess"])
-
-        ratio = min(self.processed_sentences / self.total_sentences, 1)
-        span = self.STAGE_PROGRESS["ner"] - self.STAGE_PROGRESS["preprocess"]
-        return max(self.progress, self.STAGE_PROGRESS["preprocess"] + int(ratio * span))
-
-    def _publish(
-        self,
-        *,
-        status: TaskStatus = TaskStatus.PROCESSING,
-        progress: Optional[int] = None,
-        message: Optional[str] = None,
-        result: Optional[Dict[str, Any]] = None,
-        error: Optional[str] = None,
-    ) -> None:
-        if progress is not None:
-            self.progress = max(self.progress, progress)
-
-        self.status = status or self.status
-        if message is not None:
-            self.message = message
-
-        task_manager.update_task(
-            self.task_id,
-            status=self.status,
-            progress=self.progress if progress is not None else None,
-            message=message,
-            total_sentences=self.total_sentences,
-            processed_sentences=self.processed_sentences,
-            result=result,
-            error=error
-        )
-
-        cache_meta(self.task_id, {
-            "status": self.status.value if isinstance(self.status, TaskStatus) else self.status,
-            "progress": self.progress,
-            "message": self.message,
-            "error": error,
-            "processed_sentences": self.processed_sentences,
-            "total_sentences": self.total_sentences,
-            "updated_at": datetime.utcnow().isoformat(),
-        })
+def overloaded(status_code: int, error: ExecutorSaturated) -> HTTPException:
+    """执行池已满时的快速失败响应（429 / 503 + Retry-After）"""
+    return HTTPException(
+        status_code=status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
 
 
 @app.on_event("startup")
@@ -185,6 +98,13 @@ async def startup_event():
     # recognizer.initialize()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放识别执行池与分片识别进程池"""
+    recognize_executor.shutdown()
+    shutdown_shard_pool()
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -209,6 +129,8 @@ async def health_check():
 async def recognize_characters(request: RecognitionRequest):
     """
     识别小说人物
+
+    识别在执行池中进行；执行池已满时立即返回 429，Retry-After 为预计的等待秒数。
     
     Args:
         request: 识别请求
@@ -218,12 +140,20 @@ async def recognize_characters(request: RecognitionRequest):
     """
     try:
         logger.info(f"收到识别请求，文本长度: {len(request.text)}")
-        
+
+        try:
+            future = submit_recognition(request)
+        except ExecutorSaturated as e:
+            logger.warning(f"识别执行池已满，拒绝请求: {recognize_executor.stats()}")
+            raise overloaded(429, e)
+
         # 执行识别
-        result = recognizer.recognize(request)
+        result = await future
         
         return result
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -234,7 +164,8 @@ async def recognize_characters(request: RecognitionRequest):
 @app.post("/api/recognize/async")
 async def recognize_characters_async(
     request: RecognitionRequest,
-    callback_url: Optional[str] = None
+    callback_url: Optional[str] = None,
+    priority: Optional[str] = None
 ):
     """
     异步识别小说人物（解耦版本：立即返回，任务入队）
@@ -242,15 +173,21 @@ async def recognize_characters_async(
     Args:
         request: 识别请求
         callback_url: 任务完成后的回调URL
+        priority: 任务通道（如 interactive / normal / bulk），为空时按文本长度选择
 
     Returns:
         任务ID和状态
     """
+    try:
+        lane = choose_lane(priority, len(request.text))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # 创建任务
         task_id = task_manager.create_task(callback_url)
 
-        logger.info(f"创建异步识别任务: {task_id}, 文本长度: {len(request.text)}, 队列长度: {get_queue_length()}")
+        logger.info(f"创建异步识别任务: {task_id}, 文本长度: {len(request.text)}, 通道: {lane}, 队列长度: {get_queue_length()}")
 
         # 将任务数据推入 Redis 队列
         task_data = {
@@ -261,21 +198,30 @@ async def recognize_characters_async(
             "callback_url": callback_url
         }
 
-        success = enqueue_task(task_id, task_data)
+        success = enqueue_task(task_id, task_data, lane)
 
         if not success:
-            # 如果入队失败（比如 Redis 不可用），回退到内存模式
+            # 如果入队失败（比如 Redis 不可用），回退到内存模式，在执行池中处理
             logger.warning(f"任务 {task_id} 入队失败，回退到内存模式")
-            import asyncio
-            asyncio.create_task(process_recognition_task(task_id, request))
+            reporter = ProgressReporter(task_id)
+            reporter.start()
+            try:
+                future = submit_recognition(request, reporter)
+            except ExecutorSaturated as e:
+                reporter.fail(str(e))
+                raise overloaded(503, e)
+            asyncio.create_task(process_recognition_task(task_id, future, reporter))
 
         return {
             "success": True,
             "task_id": task_id,
             "message": "任务已创建，正在队列中等待处理",
+            "lane": lane,
             "queue_length": get_queue_length()
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"创建任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -348,6 +294,7 @@ async def get_statistics():
         "storage_mode": "redis" if task_manager._use_redis else "memory",
         "models": {
             "ner": settings.NER_MODEL,
+            "ner_engine": settings.NER_ENGINE,
             "embedding": settings.EMBEDDING_MODEL
         },
         "config": {
@@ -356,8 +303,11 @@ async def get_statistics():
         },
         "queue": {
             "length": get_queue_length(),
-            "note": "当前队列中等待处理的任务数"
+            "note": "当前队列中等待处理的任务数",
+            **get_queue_stats()
         },
+        "executor": recognize_executor.stats(),
+        "workers": fetch_worker_pools(),
         "redis": {
             "enabled": settings.ENABLE_CACHE,
             "url": settings.REDIS_URL if settings.ENABLE_CACHE else None
@@ -365,25 +315,18 @@ async def get_statistics():
     }
 
 
-async def process_recognition_task(task_id: str, request: RecognitionRequest):
+async def process_recognition_task(task_id: str, future: "asyncio.Future", reporter: ProgressReporter):
     """
-    后台处理识别任务
+    等待执行池中的识别完成，完成后上报结果并发送回调（内存模式）
     
     Args:
         task_id: 任务ID
-        request: 识别请求
+        future: submit_recognition 返回的识别结果
+        reporter: 该任务的进度上报器
     """
-    reporter = ProgressReporter(task_id)
-
     try:
-        reporter.start()
-
         logger.info(f"开始处理任务 {task_id}")
-        result = recognizer.recognize(
-            request,
-            on_sentence=reporter.on_sentence,
-            on_stage=reporter.on_stage
-        )
+        result = await future
 
         result_dict = result.dict()
         reporter.complete(result_dict)
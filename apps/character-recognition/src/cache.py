@@ -3,7 +3,8 @@
 """
 
 import json
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from loguru import logger
 
@@ -11,10 +12,12 @@ from .config import settings
 
 try:
     from redis import Redis
-    from redis.exceptions import RedisError
+    from redis.exceptions import RedisError, ResponseError, WatchError
 except Exception:  # pragma: no cover - 仅在缺少依赖时触发
     Redis = None  # type: ignore
     RedisError = Exception  # type: ignore
+    ResponseError = Exception  # type: ignore
+    WatchError = Exception  # type: ignore
 
 
 _redis_client: Optional["Redis"] = None
@@ -42,14 +45,17 @@ def _serialize(payload: Dict[str, Any]) -> str:
 
 
 def cache_meta(task_id: str, meta: Dict[str, Any]) -> None:
-    """缓存任务元数据（状态、进度、统计）。"""
+    """缓存任务元数据（状态、进度、统计）；以 Hash 保存，只写入传入的字段。"""
     client = _get_client()
-    if not client:
+    if not client or not meta:
         return
 
     key = f"{settings.CACHE_PREFIX}:{task_id}:meta"
     try:
-        client.set(key, _serialize(meta), ex=settings.CACHE_TTL)
+        pipeline = client.pipeline(transaction=False)
+        pipeline.hset(key, mapping={field: json.dumps(value, ensure_ascii=False) for field, value in meta.items()})
+        pipeline.expire(key, settings.CACHE_TTL)
+        pipeline.execute()
     except RedisError as error:  # pragma: no cover - 仅记录缓存失败
         logger.warning(f"写入 Redis meta 失败: {error}")
 
@@ -109,8 +115,23 @@ def _fetch_json(key: str) -> Optional[Dict[str, Any]]:
 
 
 def fetch_meta(task_id: str) -> Optional[Dict[str, Any]]:
+    client = _get_client()
+    if not client:
+        return None
+
     key = f"{settings.CACHE_PREFIX}:{task_id}:meta"
-    return _fetch_json(key)
+    try:
+        fields = client.hgetall(key)
+    except ResponseError:
+        # 旧版本以 JSON 字符串保存
+        return _fetch_json(key)
+    except RedisError as error:  # pragma: no cover
+        logger.warning(f"读取 Redis 失败: {error}")
+        return None
+
+    if not fields:
+        return None
+    return {field: json.loads(value) for field, value in fields.items()}
 
 
 def fetch_result(task_id: str) -> Optional[Dict[str, Any]]:
@@ -123,18 +144,288 @@ def fetch_stage(task_id: str, stage: str) -> Optional[Dict[str, Any]]:
     return _fetch_json(key)
 
 
+# ======================== NER 句子缓存 ========================
+
+def _ner_key(digest: str) -> str:
+    return f"{settings.CACHE_PREFIX}:ner:{digest}"
+
+
+def fetch_ner_spans(digests: List[str]) -> Optional[List[Optional[list]]]:
+    """
+    批量读取句子级 NER 缓存
+
+    Args:
+        digests: 句子缓存键（内容哈希）
+
+    Returns:
+        与 digests 一一对应的片段列表（未命中为 None）；Redis 不可用时返回 None
+    """
+    client = _get_client()
+    if not client or not digests:
+        return None
+
+    try:
+        raws = client.mget([_ner_key(digest) for digest in digests])
+    except RedisError as error:
+        logger.warning(f"读取 Redis NER 缓存失败: {error}")
+        return None
+
+    return [json.loads(raw) if raw else None for raw in raws]
+
+
+def cache_ner_spans(entries: Dict[str, list]) -> bool:
+    """批量写入句子级 NER 缓存（单次 pipeline），返回是否成功"""
+    client = _get_client()
+    if not client or not entries:
+        return False
+
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for digest, spans in entries.items():
+            pipeline.set(_ner_key(digest), json.dumps(spans, ensure_ascii=False), ex=settings.NER_CACHE_TTL)
+        pipeline.execute()
+        return True
+    except RedisError as error:
+        logger.warning(f"写入 Redis NER 缓存失败: {error}")
+        return False
+
+
+# ======================== 句向量缓存 ========================
+
+def _embedding_key(digest: str) -> str:
+    return f"{settings.CACHE_PREFIX}:emb:{digest}"
+
+
+def fetch_embeddings(digests: List[str]) -> Optional[List[Optional[str]]]:
+    """
+    批量读取句向量缓存
+
+    Args:
+        digests: 上下文缓存键（内容哈希）
+
+    Returns:
+        与 digests 一一对应的 base64 编码 float16 向量（未命中为 None）；Redis 不可用时返回 None
+    """
+    client = _get_client()
+    if not client or not digests:
+        return None
+
+    try:
+        return client.mget([_embedding_key(digest) for digest in digests])
+    except RedisError as error:
+        logger.warning(f"读取 Redis 句向量缓存失败: {error}")
+        return None
+
+
+def cache_embeddings(entries: Dict[str, str]) -> bool:
+    """批量写入句向量缓存（单次 pipeline），返回是否成功"""
+    client = _get_client()
+    if not client or not entries:
+        return False
+
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for digest, encoded in entries.items():
+            pipeline.set(_embedding_key(digest), encoded, ex=settings.EMBEDDING_CACHE_TTL)
+        pipeline.execute()
+        return True
+    except RedisError as error:
+        logger.warning(f"写入 Redis 句向量缓存失败: {error}")
+        return False
+
+
+# ======================== 增量识别状态 ========================
+
+def _book_state_key(book_id: str) -> str:
+    return f"{settings.CACHE_PREFIX}:book:{book_id}:state"
+
+
+def fetch_book_state(book_id: str) -> Optional[Dict[str, Any]]:
+    """读取一本书上一次识别的中间产物"""
+    return _fetch_json(_book_state_key(book_id))
+
+
+def cache_book_state(book_id: str, state: Dict[str, Any]) -> None:
+    """保存一本书的中间产物（逐句结果与合并分组）"""
+    client = _get_client()
+    if not client:
+        return
+
+    try:
+        client.set(_book_state_key(book_id), _serialize(state), ex=settings.BOOK_STATE_TTL)
+    except RedisError as error:  # pragma: no cover - 仅记录缓存失败
+        logger.warning(f"写入 Redis 增量识别状态失败: {error}")
+
+
+def _name_lexicon_key(book_id: str) -> str:
+    return f"{settings.CACHE_PREFIX}:book:{book_id}:lexicon"
+
+
+def fetch_name_lexicon(book_id: str) -> Optional[List[str]]:
+    """读取一本书的人名词典"""
+    return _fetch_json(_name_lexicon_key(book_id))
+
+
+def cache_name_lexicon(book_id: str, names: List[str]) -> None:
+    """保存一本书的人名词典"""
+    client = _get_client()
+    if not client:
+        return
+
+    try:
+        client.set(_name_lexicon_key(book_id), json.dumps(names, ensure_ascii=False), ex=settings.NAME_LEXICON_TTL)
+    except RedisError as error:  # pragma: no cover - 仅记录缓存失败
+        logger.warning(f"写入 Redis 人名词典失败: {error}")
+
+
 # ======================== 任务队列功能 ========================
+# 可靠队列：Worker 用 LMOVE / BLMOVE 把任务从等待队列原子地移入自己的处理中列表，处理结束后确认（ack）
+# 才删除任务数据。Worker 定期写入心跳；心跳超过 TASK_VISIBILITY_TIMEOUT 未更新的 Worker
+# 视为已退出，其处理中的任务由其他 Worker 放回队首。每个任务最多执行 TASK_MAX_ATTEMPTS 次，
+# 之后移入死信列表，任务数据保留 TASK_DEAD_LETTER_TTL 秒供排查。
+#
+# 优先级通道：TASK_LANES 中的每个通道是一个等待队列，入队时按指定的优先级或文本长度选择通道。
+# Worker 按通道权重做平滑加权轮询（每轮先尝试选中的通道，为空时依次尝试其他通道），
+# 小任务不再排在整本书的任务之后，大任务也不会一直得不到处理。默认通道沿用 TASK_QUEUE_KEY。
+# TASK_BOOK_CONCURRENCY 大于 0 时，同一 book_id 同时处理的任务数超过上限的任务放回通道队尾。
 
 TASK_QUEUE_KEY = f"{settings.CACHE_PREFIX}:task_queue"
+TASK_CONSUMERS_KEY = f"{settings.CACHE_PREFIX}:task_consumers"  # ZSET: Worker -> 最近一次心跳时间
+TASK_ATTEMPTS_KEY = f"{settings.CACHE_PREFIX}:task_attempts"  # HASH: 任务 -> 已失败（或中断）的次数
+TASK_DEAD_LETTER_KEY = f"{settings.CACHE_PREFIX}:task_dead"  # LIST: 死信记录（JSON）
+TASK_ROUTES_KEY = f"{settings.CACHE_PREFIX}:task_routes"  # HASH: 任务 -> 所在通道、book_id 与入队时间（JSON）
+TASK_LANE_STATS_KEY = f"{settings.CACHE_PREFIX}:task_lane_stats"  # HASH: {通道}:claimed / {通道}:wait 累计值
+TASK_WAITING_BOOKS_KEY = f"{settings.CACHE_PREFIX}:task_waiting_books"  # SET: 有任务等待并发名额的 book_id
+
+
+class QueuedTask(NamedTuple):
+    """Worker 领取的任务"""
+    task_id: str
+    data: Dict[str, Any]
+    attempt: int  # 本次是第几次执行（从 1 开始）
+
+
+class LaneScheduler:
+    """通道轮询顺序：平滑加权轮询（权重 8:3:1 时每 12 次中依次穿插选中 8、3、1 次）"""
+
+    def __init__(self, weights: Dict[str, int]):
+        """
+        Args:
+            weights: 通道 -> 权重，按优先级从高到低排列；权重为 0 的通道只在其他通道为空时处理
+        """
+        self.weights = dict(weights)
+        self._current = {lane: 0 for lane in self.weights}
+
+    def order(self) -> List[str]:
+        """本轮尝试通道的顺序：选中的通道在前，其余按优先级排列"""
+        weighted = [lane for lane, weight in self.weights.items() if weight > 0]
+        if not weighted:
+            return list(self.weights)
+
+        for lane in weighted:
+            self._current[lane] += self.weights[lane]
+        chosen = max(weighted, key=lambda lane: self._current[lane])
+        self._current[chosen] -= sum(self.weights[lane] for lane in weighted)
+        return [chosen] + [lane for lane in self.weights if lane != chosen]
+
+
+_lane_scheduler: Optional[LaneScheduler] = None
+
+
+def _get_lane_scheduler() -> LaneScheduler:
+    global _lane_scheduler
 
+    if _lane_scheduler is None or _lane_scheduler.weights != settings.TASK_LANES:
+        _lane_scheduler = LaneScheduler(settings.TASK_LANES)
+    return _lane_scheduler
 
-def enqueue_task(task_id: str, task_data: Dict[str, Any]) -> bool:
+
+def choose_lane(priority: Optional[str] = None, text_length: Optional[int] = None) -> str:
+    """
+    选择任务通道
+
+    Args:
+        priority: 指定的通道名；为空时按文本长度选择
+        text_length: 文本长度；不超过 TASK_LANE_MAX_CHARS 中某通道的上限时进入该通道（按优先级依次比较），
+            都超过时进入最后一个通道
+
+    Returns:
+        通道名
+
+    Raises:
+        ValueError: 指定的通道不存在
+    """
+    if priority:
+        if priority not in settings.TASK_LANES:
+            raise ValueError(f"未知的任务优先级: {priority}，可选: {', '.join(settings.TASK_LANES)}")
+        return priority
+
+    if text_length is None:
+        return settings.TASK_DEFAULT_LANE
+
+    for lane in settings.TASK_LANES:
+        limit = settings.TASK_LANE_MAX_CHARS.get(lane)
+        if limit is not None and text_length <= limit:
+            return lane
+    return list(settings.TASK_LANES)[-1]
+
+
+def _lane_key(lane: str) -> str:
+    if lane == settings.TASK_DEFAULT_LANE:
+        return TASK_QUEUE_KEY
+    return f"{TASK_QUEUE_KEY}:{lane}"
+
+
+def _task_data_key(task_id: str) -> str:
+    return f"{settings.CACHE_PREFIX}:{task_id}:task_data"
+
+
+def _processing_key(consumer_id: str, lane: Optional[str] = None) -> str:
+    """Worker 在某个通道的处理中列表；不带通道的是升级前的处理中列表，其中任务均来自默认通道"""
+    key = f"{settings.CACHE_PREFIX}:task_processing:{consumer_id}"
+    return key if lane is None else f"{key}:{lane}"
+
+
+def _processing_keys(consumer_id: str) -> List[Tuple[str, str]]:
+    """Worker 的全部处理中列表：[(任务所属通道, 处理中列表)]"""
+    keys = [(lane, _processing_key(consumer_id, lane)) for lane in settings.TASK_LANES]
+    keys.append((settings.TASK_DEFAULT_LANE, _processing_key(consumer_id)))
+    return keys
+
+
+def _book_running_key(book_id: str) -> str:
+    return f"{settings.CACHE_PREFIX}:book_running:{book_id}"
+
+
+def _book_waiting_key(book_id: str, lane: str) -> str:
+    return f"{settings.CACHE_PREFIX}:book_waiting:{book_id}:{lane}"
+
+
+def _book_slot(consumer_id: str, task_id: str) -> str:
+    """并发名额记录：同一任务被回收后由其他 Worker 领取时，两次领取的名额互不影响"""
+    return f"{task_id}@{consumer_id}"
+
+
+def _task_route(client: "Redis", task_id: str) -> Dict[str, Any]:
+    """任务所在通道、book_id 与入队时间；升级前入队的任务没有记录，视为默认通道"""
+    raw = client.hget(TASK_ROUTES_KEY, task_id)
+    route = json.loads(raw) if raw else {}
+    route.setdefault("lane", settings.TASK_DEFAULT_LANE)
+    if route["lane"] not in settings.TASK_LANES:
+        route["lane"] = settings.TASK_DEFAULT_LANE
+    route.setdefault("book_id", None)
+    route.setdefault("enqueued_at", None)
+    return route
+
+
+def enqueue_task(task_id: str, task_data: Dict[str, Any], lane: Optional[str] = None) -> bool:
     """
     将任务推入 Redis 队列
 
     Args:
         task_id: 任务ID
         task_data: 任务数据（包含 text, book_id, options, callback_url 等）
+        lane: 任务通道，为空时按文本长度选择（见 choose_lane）
 
     Returns:
         是否成功入队
@@ -144,68 +435,504 @@ def enqueue_task(task_id: str, task_data: Dict[str, Any]) -> bool:
         logger.warning("Redis 未配置，无法入队任务")
         return False
 
+    lane = lane or choose_lane(text_length=len(task_data.get("text") or ""))
+    route = {"lane": lane, "book_id": task_data.get("book_id"), "enqueued_at": time.time()}
     try:
-        # 将任务数据存储到单独的key
-        task_key = f"{settings.CACHE_PREFIX}:{task_id}:task_data"
-        client.set(task_key, _serialize(task_data), ex=settings.CACHE_TTL)
-
-        # 将任务ID推入队列
-        client.rpush(TASK_QUEUE_KEY, task_id)
-        logger.info(f"任务 {task_id} 已入队")
+        # 任务数据、通道记录与任务ID一并写入
+        pipeline = client.pipeline(transaction=True)
+        pipeline.set(_task_data_key(task_id), _serialize(task_data), ex=settings.CACHE_TTL)
+        pipeline.hset(TASK_ROUTES_KEY, task_id, _serialize(route))
+        pipeline.rpush(_lane_key(lane), task_id)
+        pipeline.execute()
+        logger.info(f"任务 {task_id} 已入队 (通道 {lane})")
         return True
     except RedisError as error:
         logger.error(f"入队任务失败: {error}")
         return False
 
 
-def dequeue_task(timeout: int = 0) -> Optional[tuple[str, Dict[str, Any]]]:
+def dequeue_task(consumer_id: str, timeout: float = 0) -> Optional[QueuedTask]:
     """
-    从 Redis 队列中取出任务（阻塞式）
+    领取一个任务（阻塞式）
+
+    按通道权重轮询；所有通道为空时在最高优先级通道上阻塞等待，
+    每 TASK_LANE_POLL_INTERVAL 秒重新轮询一次其他通道。
+    任务移入该 Worker 在所属通道的处理中列表，任务数据保留到 ack_task / fail_task；
+    Worker 中途退出时任务由 reclaim_stale_tasks 放回队列。
+    book_id 达到并发上限的任务移入该书的等待列表，名额释放时放回通道队首。
 
     Args:
+        consumer_id: Worker 标识（须先调用 heartbeat_consumer 注册）
         timeout: 超时时间（秒），0表示无限等待
 
     Returns:
-        (task_id, task_data) 或 None
+        领取的任务或 None
     """
     client = _get_client()
     if not client:
         return None
 
+    deadline = time.monotonic() + timeout if timeout else None
     try:
-        # 使用 BLPOP 阻塞式获取
-        result = client.blpop(TASK_QUEUE_KEY, timeout=timeout)
-        if not result:
+        while True:
+            for lane in _get_lane_scheduler().order():
+                task = _claim_from_lane(client, consumer_id, lane)
+                if task is not None:
+                    return task
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            wait = settings.TASK_LANE_POLL_INTERVAL if remaining is None else min(settings.TASK_LANE_POLL_INTERVAL, remaining)
+
+            top_lane = next(iter(settings.TASK_LANES))
+            task_id = client.blmove(_lane_key(top_lane), _processing_key(consumer_id, top_lane), wait, "LEFT", "RIGHT")
+            if task_id:
+                task = _claim(client, consumer_id, top_lane, task_id)
+                if task is not None:
+                    return task
+    except RedisError as error:
+        logger.error(f"出队任务失败: {error}")
+        return None
+
+
+def _claim_from_lane(client: "Redis", consumer_id: str, lane: str) -> Optional[QueuedTask]:
+    """从通道领取一个任务；取到的任务移入等待列表或已失效时继续取下一个，通道为空时返回 None"""
+    while True:
+        task_id = client.lmove(_lane_key(lane), _processing_key(consumer_id, lane), "LEFT", "RIGHT")
+        if not task_id:
             return None
+        task = _claim(client, consumer_id, lane, task_id)
+        if task is not None:
+            return task
 
-        _, task_id = result
 
-        # 获取任务数据
-        task_key = f"{settings.CACHE_PREFIX}:{task_id}:task_data"
-        task_data_str = client.get(task_key)
+def _claim(client: "Redis", consumer_id: str, lane: str, task_id: str) -> Optional[QueuedTask]:
+    """
+    确认领取已移入处理中列表的任务
 
-        if not task_data_str:
-            logger.warning(f"任务 {task_id} 数据不存在")
-            return None
+    Returns:
+        领取的任务；任务数据不存在（丢弃）或 book_id 并发已达上限（移入等待列表）时返回 None
+    """
+    processing_key = _processing_key(consumer_id, lane)
+    task_data_str = client.get(_task_data_key(task_id))
+    if not task_data_str:
+        logger.warning(f"任务 {task_id} 数据不存在")
+        pipeline = client.pipeline(transaction=True)
+        pipeline.lrem(processing_key, 1, task_id)
+        pipeline.hdel(TASK_ATTEMPTS_KEY, task_id)
+        pipeline.hdel(TASK_ROUTES_KEY, task_id)
+        pipeline.execute()
+        return None
+
+    task_data = json.loads(task_data_str)
+    route = _task_route(client, task_id)
+    route["lane"] = lane
+    route["book_id"] = route["book_id"] or task_data.get("book_id")
+
+    if not _acquire_book_slot(client, route["book_id"], _book_slot(consumer_id, task_id)):
+        _park_task(client, processing_key, route["book_id"], lane, task_id)
+        return None
+
+    now = time.time()
+    wait = max(now - (route["enqueued_at"] or now), 0.0)
+    pipeline = client.pipeline(transaction=False)
+    pipeline.hset(TASK_ROUTES_KEY, task_id, _serialize(route))
+    pipeline.hincrby(TASK_LANE_STATS_KEY, f"{lane}:claimed", 1)
+    pipeline.hincrbyfloat(TASK_LANE_STATS_KEY, f"{lane}:wait", wait)
+    pipeline.hget(TASK_ATTEMPTS_KEY, task_id)
+    failures = int(pipeline.execute()[-1] or 0)
+    return QueuedTask(task_id, task_data, failures + 1)
+
+
+def _acquire_book_slot(client: "Redis", book_id: Optional[str], slot: str) -> bool:
+    """占用 book_id 的并发名额；未设置上限或任务没有 book_id 时总是成功"""
+    limit = settings.TASK_BOOK_CONCURRENCY
+    if limit <= 0 or not book_id:
+        return True
+
+    key = _book_running_key(book_id)
+    pipeline = client.pipeline(transaction=True)
+    pipeline.sadd(key, slot)
+    pipeline.expire(key, settings.CACHE_TTL)
+    pipeline.scard(key)
+    running = pipeline.execute()[-1]
+    if running <= limit:
+        return True
+
+    # 多个 Worker 同时占用时可能都超出上限而一起移入等待列表，移入后会重新检查名额
+    client.srem(key, slot)
+    return False
+
+
+def _park_task(client: "Redis", processing_key: str, book_id: str, lane: str, task_id: str) -> None:
+    """book_id 并发已达上限：任务从处理中列表移入该书在本通道的等待列表"""
+    pipeline = client.pipeline(transaction=True)
+    pipeline.lrem(processing_key, 1, task_id)
+    pipeline.rpush(_book_waiting_key(book_id, lane), task_id)
+    pipeline.sadd(TASK_WAITING_BOOKS_KEY, book_id)
+    pipeline.execute()
+    logger.debug(f"book {book_id} 并发任务已达上限，任务 {task_id} 移入等待列表")
 
-        task_data = json.loads(task_data_str)
+    # 移入期间占用名额的任务可能已经结束（其释放时还看不到本任务）：重新检查，避免任务无人唤醒
+    if client.scard(_book_running_key(book_id)) < settings.TASK_BOOK_CONCURRENCY:
+        _release_waiting(client, book_id)
 
-        # 删除任务数据（已被取出）
-        client.delete(task_key)
 
-        return (task_id, task_data)
+def _release_waiting(client: "Redis", book_id: str, limit: Optional[int] = 1) -> int:
+    """
+    按通道优先级把该书等待中的任务放回所在通道的队首
+
+    Args:
+        limit: 最多放回的任务数，None 表示全部放回
+
+    Returns:
+        放回的任务数
+    """
+    released = 0
+    for lane in settings.TASK_LANES:
+        while limit is None or released < limit:
+            if client.lmove(_book_waiting_key(book_id, lane), _lane_key(lane), "LEFT", "LEFT") is None:
+                break
+            released += 1
+    return released
+
+
+def _release_book_slot(pipeline: Any, route: Dict[str, Any], slot: str) -> None:
+    if route.get("book_id"):
+        pipeline.srem(_book_running_key(route["book_id"]), slot)
+
+
+def _wake_book(client: "Redis", route: Dict[str, Any]) -> None:
+    """名额释放后放回该书的一个等待任务"""
+    book_id = route.get("book_id")
+    if book_id and client.sismember(TASK_WAITING_BOOKS_KEY, book_id):
+        _release_waiting(client, book_id)
+
+
+def _remove_processing(client: "Redis", consumer_id: str, task_id: str) -> int:
+    """从 Worker 的处理中列表移除任务，返回移除数；为 0 表示任务已被回收"""
+    pipeline = client.pipeline(transaction=True)
+    for _, key in _processing_keys(consumer_id):
+        pipeline.lrem(key, 1, task_id)
+    return sum(pipeline.execute())
+
+
+def ack_task(consumer_id: str, task_id: str) -> None:
+    """确认任务处理完成：移出处理中列表并删除任务数据"""
+    client = _get_client()
+    if not client:
+        return
+
+    try:
+        # 任务已被判定超时并放回队列时，数据留给重新领取的 Worker
+        if not _remove_processing(client, consumer_id, task_id):
+            logger.warning(f"任务 {task_id} 已不在 Worker {consumer_id} 的处理中列表（已被回收），保留任务数据")
+            return
+
+        route = _task_route(client, task_id)
+        pipeline = client.pipeline(transaction=True)
+        pipeline.hdel(TASK_ATTEMPTS_KEY, task_id)
+        pipeline.hdel(TASK_ROUTES_KEY, task_id)
+        pipeline.delete(_task_data_key(task_id))
+        _release_book_slot(pipeline, route, _book_slot(consumer_id, task_id))
+        pipeline.execute()
+        _wake_book(client, route)
     except RedisError as error:
-        logger.error(f"出队任务失败: {error}")
-        return None
+        logger.error(f"确认任务失败: {error}")
+
+
+def fail_task(consumer_id: str, task_id: str, error: str) -> bool:
+    """
+    记录一次失败：未达到 TASK_MAX_ATTEMPTS 时放回所在通道队尾重试，否则移入死信列表
+
+    Args:
+        consumer_id: Worker 标识
+        task_id: 任务ID
+        error: 失败原因
+
+    Returns:
+        是否重新入队（任务已被回收时返回 False，不再重复入队）
+    """
+    client = _get_client()
+    if not client:
+        return False
+
+    try:
+        if not _remove_processing(client, consumer_id, task_id):
+            logger.warning(f"任务 {task_id} 已不在 Worker {consumer_id} 的处理中列表（已被回收），不再重复入队: {error}")
+            return False
+
+        failures = client.hincrby(TASK_ATTEMPTS_KEY, task_id, 1)
+        route = _task_route(client, task_id)
+        slot = _book_slot(consumer_id, task_id)
+        pipeline = client.pipeline(transaction=True)
+        _release_book_slot(pipeline, route, slot)
+
+        if failures < settings.TASK_MAX_ATTEMPTS:
+            pipeline.hset(TASK_ROUTES_KEY, task_id, _serialize({**route, "enqueued_at": time.time()}))
+            pipeline.rpush(_lane_key(route["lane"]), task_id)
+            pipeline.execute()
+            _wake_book(client, route)
+            logger.warning(f"任务 {task_id} 第 {failures} 次失败，重新入队: {error}")
+            return True
+
+        pipeline.rpush(TASK_DEAD_LETTER_KEY, _serialize({
+            "task_id": task_id,
+            "attempts": failures,
+            "error": error,
+            "consumer": consumer_id,
+            "lane": route["lane"],
+            "failed_at": time.time(),
+        }))
+        pipeline.hdel(TASK_ATTEMPTS_KEY, task_id)
+        pipeline.hdel(TASK_ROUTES_KEY, task_id)
+        pipeline.expire(_task_data_key(task_id), settings.TASK_DEAD_LETTER_TTL)
+        pipeline.execute()
+        _wake_book(client, route)
+        logger.error(f"任务 {task_id} 已失败 {failures} 次，移入死信队列: {error}")
+        return False
+    except RedisError as redis_error:
+        logger.error(f"记录任务失败出错: {redis_error}")
+        return False
+
+
+def heartbeat_consumer(consumer_id: str) -> None:
+    """注册 / 刷新 Worker 心跳"""
+    client = _get_client()
+    if not client:
+        return
+
+    try:
+        client.zadd(TASK_CONSUMERS_KEY, {consumer_id: time.time()})
+    except RedisError as error:
+        logger.warning(f"写入 Worker 心跳失败: {error}")
+
+
+def remove_consumer(consumer_id: str) -> int:
+    """Worker 正常退出：未完成的任务放回队首并注销，返回放回的任务数"""
+    client = _get_client()
+    if not client:
+        return 0
+
+    try:
+        requeued = _requeue_processing(client, consumer_id, count_failure=False)
+        client.zrem(TASK_CONSUMERS_KEY, consumer_id)
+        return requeued
+    except RedisError as error:
+        logger.warning(f"注销 Worker 失败: {error}")
+        return 0
+
+
+def reclaim_consumer(consumer_id: str) -> int:
+    """已确认退出的 Worker（如崩溃的子进程）：处理中的任务立即放回队首并计一次中断，返回回收的任务数"""
+    client = _get_client()
+    if not client:
+        return 0
+
+    try:
+        reclaimed = _requeue_processing(client, consumer_id, count_failure=True)
+        client.zrem(TASK_CONSUMERS_KEY, consumer_id)
+        return reclaimed
+    except RedisError as error:
+        logger.warning(f"回收 Worker 任务失败: {error}")
+        return 0
+
+
+def reclaim_stale_tasks(now: Optional[float] = None) -> int:
+    """
+    回收心跳超时的 Worker 的处理中任务
+
+    任务放回所在通道的队首（逐个 LMOVE，原子且不会重复），并计一次中断；被回收的 Worker 随后注销。
+    同时检查等待并发名额的任务，名额已空出时放回队列。
+
+    Args:
+        now: 当前时间戳，默认取 time.time()
+
+    Returns:
+        回收的任务数
+    """
+    client = _get_client()
+    if not client:
+        return 0
+
+    deadline = (now if now is not None else time.time()) - settings.TASK_VISIBILITY_TIMEOUT
+    reclaimed = 0
+    try:
+        for consumer_id in client.zrangebyscore(TASK_CONSUMERS_KEY, "-inf", deadline):
+            count = _requeue_processing(client, consumer_id, count_failure=True)
+            if count:
+                logger.warning(f"Worker {consumer_id} 心跳超时，回收 {count} 个任务")
+            reclaimed += count
+
+            # 回收期间该 Worker 恢复心跳时保留注册
+            score = client.zscore(TASK_CONSUMERS_KEY, consumer_id)
+            if score is not None and score <= deadline:
+                client.zrem(TASK_CONSUMERS_KEY, consumer_id)
+
+        released = _sweep_waiting_books(client)
+        if released:
+            logger.warning(f"{released} 个等待并发名额的任务放回队列")
+    except RedisError as error:
+        logger.warning(f"回收超时任务失败: {error}")
+
+    return reclaimed
+
+
+def _requeue_processing(client: "Redis", consumer_id: str, count_failure: bool) -> int:
+    """
+    处理中的任务逐个放回各自通道的队首，返回放回的任务数
+
+    每个通道有独立的处理中列表，一次 LMOVE 即放回正确的通道；
+    心跳迟到但仍在运行的 Worker 同时领取新任务也不会导致放错通道。
+    """
+    requeued = 0
+    for lane, processing_key in _processing_keys(consumer_id):
+        while True:
+            task_id = client.lmove(processing_key, _lane_key(lane), "RIGHT", "LEFT")
+            if task_id is None:
+                break
+
+            route = _task_route(client, task_id)
+            pipeline = client.pipeline(transaction=False)
+            if count_failure:
+                pipeline.hincrby(TASK_ATTEMPTS_KEY, task_id, 1)
+            pipeline.hset(TASK_ROUTES_KEY, task_id, _serialize({**route, "lane": lane, "enqueued_at": time.time()}))
+            _release_book_slot(pipeline, route, _book_slot(consumer_id, task_id))
+            pipeline.execute()
+            _wake_book(client, route)
+            requeued += 1
+    return requeued
+
+
+def _sweep_waiting_books(client: "Redis") -> int:
+    """
+    兜底：名额已空出（如占用名额的记录随 TTL 过期）或上限已调高时放回等待中的任务，
+    并注销不再有等待任务的书籍
+
+    Returns:
+        放回的任务数
+    """
+    limit = settings.TASK_BOOK_CONCURRENCY
+    released = 0
+    for book_id in client.smembers(TASK_WAITING_BOOKS_KEY):
+        free = None if limit <= 0 else limit - client.scard(_book_running_key(book_id))
+        if free is None or free > 0:
+            released += _release_waiting(client, book_id, free)
+
+        # 注销期间有任务移入等待列表时放弃注销（WATCH 检测到变化）
+        waiting_keys = [_book_waiting_key(book_id, lane) for lane in settings.TASK_LANES]
+        with client.pipeline(transaction=True) as pipeline:
+            try:
+                pipeline.watch(*waiting_keys)
+                if any(pipeline.llen(key) for key in waiting_keys):
+                    continue
+                pipeline.multi()
+                pipeline.srem(TASK_WAITING_BOOKS_KEY, book_id)
+                pipeline.execute()
+            except WatchError:
+                pass
+    return released
 
 
 def get_queue_length() -> int:
-    """获取队列长度"""
+    """获取队列长度（所有通道的等待任务数）"""
     client = _get_client()
     if not client:
         return 0
 
     try:
-        return client.llen(TASK_QUEUE_KEY)
+        pipeline = client.pipeline(transaction=False)
+        for lane in settings.TASK_LANES:
+            pipeline.llen(_lane_key(lane))
+        return sum(pipeline.execute())
     except RedisError:
         return 0
+
+
+def get_queue_stats() -> Dict[str, Any]:
+    """
+    队列状态：等待数、活跃 Worker 数、死信数与各通道状态
+
+    各通道包含等待数（depth）、等待 book_id 并发名额的任务数（book_waiting）、
+    队首任务已等待的秒数（oldest_wait）、累计领取数（claimed）与领取时的平均等待秒数（avg_wait）。
+    """
+    empty = {"pending": 0, "consumers": 0, "dead_letter": 0, "lanes": {}}
+    client = _get_client()
+    if not client:
+        return empty
+
+    lanes = list(settings.TASK_LANES)
+    try:
+        books = list(client.smembers(TASK_WAITING_BOOKS_KEY))
+        pipeline = client.pipeline(transaction=False)
+        for lane in lanes:
+            for book_id in books:
+                pipeline.llen(_book_waiting_key(book_id, lane))
+        book_waiting = pipeline.execute()
+
+        pipeline = client.pipeline(transaction=False)
+        for lane in lanes:
+            pipeline.llen(_lane_key(lane))
+            pipeline.lindex(_lane_key(lane), 0)
+        pipeline.zcount(TASK_CONSUMERS_KEY, time.time() - settings.TASK_VISIBILITY_TIMEOUT, "+inf")
+        pipeline.llen(TASK_DEAD_LETTER_KEY)
+        pipeline.hgetall(TASK_LANE_STATS_KEY)
+        results = pipeline.execute()
+        consumers, dead_letter, totals = results[-3:]
+
+        now = time.time()
+        lane_stats = {}
+        for idx, lane in enumerate(lanes):
+            depth, head = results[idx * 2], results[idx * 2 + 1]
+            enqueued_at = _task_route(client, head)["enqueued_at"] if head else None
+            claimed = int(totals.get(f"{lane}:claimed", 0))
+            wait = float(totals.get(f"{lane}:wait", 0))
+            lane_stats[lane] = {
+                "depth": depth,
+                "book_waiting": sum(book_waiting[idx * len(books):(idx + 1) * len(books)]),
+                "oldest_wait": round(max(now - enqueued_at, 0.0), 3) if enqueued_at else 0.0,
+                "claimed": claimed,
+                "avg_wait": round(wait / claimed, 3) if claimed else 0.0,
+            }
+
+        return {
+            "pending": sum(item["depth"] for item in lane_stats.values()),
+            "consumers": consumers,
+            "dead_letter": dead_letter,
+            "lanes": lane_stats,
+        }
+    except RedisError:
+        return empty
+
+
+# ======================== Worker 进程池状态 ========================
+
+def _worker_pool_key(node_id: str) -> str:
+    return f"{settings.CACHE_PREFIX}:worker_pool:{node_id}"
+
+
+def cache_worker_pool(node_id: str, report: Dict[str, Any]) -> None:
+    """保存一个 Worker 进程池的状态（超过 3 个汇报周期未更新即过期）"""
+    client = _get_client()
+    if not client:
+        return
+
+    try:
+        client.set(_worker_pool_key(node_id), _serialize(report), ex=settings.WORKER_REPORT_INTERVAL * 3)
+    except RedisError as error:  # pragma: no cover - 仅记录缓存失败
+        logger.warning(f"写入 Worker 进程池状态失败: {error}")
+
+
+def fetch_worker_pools() -> List[Dict[str, Any]]:
+    """读取所有节点的 Worker 进程池状态"""
+    client = _get_client()
+    if not client:
+        return []
+
+    try:
+        keys = sorted(client.scan_iter(match=_worker_pool_key("*"), count=100))
+        return [json.loads(raw) for raw in client.mget(keys) if raw] if keys else []
+    except RedisError as error:
+        logger.warning(f"读取 Worker 进程池状态失败: {error}")
+        return []
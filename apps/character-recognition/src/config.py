@@ -13,20 +13,71 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8001
     DEBUG: bool = True
-    
+
+    # 预处理配置
+    PREPROCESS_CHUNK_SIZE: int = 64 * 1024  # 流式预处理每次读取的字符数
+    STREAMING_MIN_LENGTH: int = 1_000_000  # 文本超过该长度时使用流式预处理
+
     # NER 模型配置 - 使用完整 BERT BASE 模型
+    NER_ENGINE: str = "jieba"  # NER 引擎: jieba / hanlp / onnx / rules
     NER_MODEL: str = "hanlp.pretrained.ner.MSRA_NER_BERT_BASE_ZH"
     NER_BATCH_SIZE: int = 32
-    
+    NER_BUCKET_BATCHES: int = 8  # BERT 引擎每次取 NER_BATCH_SIZE * N 个句子按长度分桶
+    NER_ONNX_MODEL_PATH: str = "models/ner-onnx/model.int8.onnx"  # 由 export_ner_onnx.py 导出
+    NER_ONNX_THREADS: int = 0  # ONNX Runtime intra-op 线程数，0 表示由 onnxruntime 决定
+    NER_CACHE_ENABLED: bool = True  # 句子级 NER 结果缓存
+    NER_CACHE_SIZE: int = 200_000  # 进程内 LRU 缓存的句子数
+    NER_CACHE_TTL: int = 7 * 24 * 3600  # Redis 中句子缓存的有效期（秒）
+    JIEBA_PARALLEL: int = 0  # Jieba 自带并行分词进程数，0 表示关闭
+
+    # 分片并行识别配置
+    SHARD_WORKERS: int = 0  # 分片识别进程数，0 表示关闭（串行执行）
+    SHARD_MAX_CHARS: int = 100_000  # 单个分片的最大字符数（优先在章节边界切分）
+    SHARD_MIN_LENGTH: int = 200_000  # 文本超过该长度时才启用分片
+    
+    # API 识别执行池配置（/api/recognize 与 Redis 不可用时的内存模式任务）
+    RECOGNIZE_EXECUTOR: str = "thread"  # 执行池类型: thread / process（进程池中不上报逐句进度）
+    RECOGNIZE_CONCURRENCY: int = 2  # 同时执行的识别数
+    RECOGNIZE_QUEUE_SIZE: int = 8  # 等待执行的识别数上限，超出时返回 429/503
+    RECOGNIZE_RETRY_AFTER: int = 5  # 429/503 响应中 Retry-After 的最小秒数
+
+    # 任务进度上报配置
+    PROGRESS_PUBLISH_INTERVAL_MS: int = 1000  # 逐句进度最短写入间隔（毫秒）
+    PROGRESS_PUBLISH_DELTA: int = 5  # 进度增长达到该百分点时不受写入间隔限制
+
+    # 增量识别配置
+    INCREMENTAL_ENABLED: bool = False  # 按 book_id 复用上一次识别的逐句结果（请求须提供 book_id）
+    DEFAULT_BOOK_ID: str = "book"  # RecognitionRequest 未提供 book_id 时的默认值，视为不属于任何书籍
+    BOOK_STATE_TTL: int = 30 * 24 * 3600  # 增量识别状态的有效期（秒）
+
+    # 书籍人名词典配置
+    NAME_LEXICON_ENABLED: bool = True  # 按 book_id 保存人物名，再次识别时写入 Jieba 用户词典
+    NAME_LEXICON_MAX_NAMES: int = 500  # 每本书最多保存的人名数（按提及次数取前 N 个）
+    NAME_LEXICON_MIN_MENTIONS: int = 5  # 提及次数不少于该值的人物才写入词典，避免低频误识别进入用户词典
+    NAME_LEXICON_CACHE_SIZE: int = 64  # 进程内保留的书籍词典数（LRU 淘汰）
+    NAME_LEXICON_TTL: int = 30 * 24 * 3600  # Redis 中书籍词典的有效期（秒）
+
     # 句向量模型配置
     EMBEDDING_MODEL: str = "shibing624/text2vec-base-chinese"
     EMBEDDING_BATCH_SIZE: int = 64
     EMBEDDING_MAX_LENGTH: int = 128
+    EMBEDDING_BACKEND: str = "torch"  # 句向量后端: torch（sentence-transformers）/ onnx（int8 量化）
+    EMBEDDING_ONNX_MODEL_PATH: str = "models/embedding-onnx/model.int8.onnx"  # 由 export_embedding_onnx.py 导出
+    EMBEDDING_ONNX_THREADS: int = 0  # ONNX Runtime intra-op 线程数，0 表示由 onnxruntime 决定
+    EMBEDDING_CACHE_ENABLED: bool = True  # 缓存别名合并上下文的句向量
+    EMBEDDING_CACHE_DIR: str = ".cache/embeddings"  # 本地内存映射向量存储目录
+    EMBEDDING_CACHE_SIZE: int = 50_000  # 本地存储的向量条数上限（LRU 淘汰）
+    EMBEDDING_CACHE_TTL: int = 30 * 24 * 3600  # Redis 中句向量缓存的有效期（秒）
     
     # 别名合并配置
     SIMILARITY_THRESHOLD: float = 0.80
     MIN_ALIAS_SIMILARITY: float = 0.75
     MAX_ALIAS_SIMILARITY: float = 0.95
+    SEMANTIC_TILE_SIZE: int = 1024  # 语义配对分块矩阵乘的块大小（每块 块大小² 个相似度）
+    SEMANTIC_ANN_MIN_NAMES: int = 20_000  # 候选名字数达到该值时改用 faiss 近似近邻检索，0 表示关闭
+    SEMANTIC_ANN_NEIGHBORS: int = 32  # 近似检索时每个名字比较的近邻数
+    ALIAS_AGGREGATION_ENABLED: bool = False  # 别名先按称呼计数，只为出现次数达到 ALIAS_MIN_COUNT 的称呼生成提及
+    ALIAS_MIN_COUNT: int = 2  # 聚合模式下别名称呼的最少出现次数
     
     # 人名识别规则配置
     NAME_MIN_LENGTH: int = 2
@@ -89,6 +140,7 @@ class Settings(BaseSettings):
     # 关系抽取配置
     MIN_RELATION_WEIGHT: int = 1  # 最小关系权重
     MAX_CONTEXT_DISTANCE: int = 2  # 句子距离内视为有关系
+    RELATION_DISTANCE_DECAY: float = 1.0  # 跨句共现按 decay^距离 加权，1.0 表示不衰减
     
     # 缓存配置
     ENABLE_CACHE: bool = True
@@ -96,6 +148,24 @@ class Settings(BaseSettings):
     CACHE_PREFIX: str = "charrecog"
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # 任务队列配置
+    TASK_VISIBILITY_TIMEOUT: int = 60  # Worker 心跳超过该秒数未更新时，其处理中的任务重新入队
+    TASK_HEARTBEAT_INTERVAL: int = 10  # Worker 心跳与超时任务回收的间隔（秒）
+    TASK_MAX_ATTEMPTS: int = 3  # 单个任务最多执行次数（失败或 Worker 中断均计入），超过后移入死信列表
+    TASK_DEAD_LETTER_TTL: int = 7 * 24 * 3600  # 死信任务数据的保留时间（秒）
+    TASK_LANES: Dict[str, int] = {"interactive": 8, "normal": 3, "bulk": 1}  # 任务通道及其轮询权重，按优先级从高到低排列
+    TASK_DEFAULT_LANE: str = "normal"  # 默认通道（沿用原队列键，升级前入队的任务在此通道中处理）
+    TASK_LANE_MAX_CHARS: Dict[str, int] = {"interactive": 5_000, "normal": 500_000}  # 未指定优先级时按文本长度选择通道，超过全部上限的进入最后一个通道
+    TASK_LANE_POLL_INTERVAL: float = 1.0  # 所有通道为空时在最高优先级通道上阻塞等待的最长秒数，之后重新轮询各通道
+    TASK_BOOK_CONCURRENCY: int = 0  # 同一 book_id 同时处理的任务数上限，0 表示不限制
+    
+    # Worker 进程池配置（worker.py）
+    WORKER_PROCESSES: int = 1  # Worker 子进程数：1 为单进程；大于 1 时父进程加载模型后 fork 子进程共享；0 为按 CPU 与内存自动计算
+    WORKER_CHILD_MEMORY_MB: int = 1024  # 自动计算进程数时每个子进程预留的私有内存（MB）
+    WORKER_RESTART_DELAY: float = 1.0  # 子进程连续崩溃时的初始重启间隔（秒），之后逐次加倍
+    WORKER_RESTART_DELAY_MAX: float = 60.0  # 重启间隔上限（秒）
+    WORKER_REPORT_INTERVAL: int = 60  # 汇报子进程内存与在途任务的间隔（秒）
+    
     # 日志配置
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
@@ -1,15 +1,23 @@
 """核心处理模块"""
-from .preprocessor import TextPreprocessor
+from .preprocessor import TextPreprocessor, Chapter, ChapterIndexer
 from .ner import NERRecognizer
-from .alias import AliasRecognizer
+from .alias import AliasHits, AliasRecognizer
+from .alias_index import AliasHit, AliasIndex
+from .mentions import MentionTable
 from .coreference import CoreferenceResolver
 from .dialogue import DialogueAttributor
 from .relation import RelationExtractor
 
 __all__ = [
     "TextPreprocessor",
+    "Chapter",
+    "ChapterIndexer",
     "NERRecognizer",
     "AliasRecognizer",
+    "AliasHits",
+    "AliasHit",
+    "AliasIndex",
+    "MentionTable",
     "CoreferenceResolver",
     "DialogueAttributor",
     "RelationExtractor",
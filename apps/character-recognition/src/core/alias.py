@@ -1,164 +1,187 @@
 """别名识别与合并模块"""
 import re
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
 from difflib import SequenceMatcher
-from typing import Dict, List, Set, Tuple
+from itertools import combinations, islice
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
 from loguru import logger
 
 from ..config import settings
 from ..models.character import Character, CharacterMention
+from .alias_rules import AliasRuleScanner
+from .embedding_backends import create_embedding_backend
+from .embedding_cache import EmbeddingCache
+from .mentions import DEFAULT_CONFIDENCE, DEFAULT_SOURCE, MentionTable
+
+
+# 句内别名片段：(文本, 句内起点, 句内终点)
+AliasSpan = Tuple[str, int, int]
+
+# 合并分组：(主名, 别名集合, 成员称呼在 MentionTable 中的编号，按首次出现先后排列)
+NameGroup = Tuple[str, Set[str], List[int]]
+
+
+class AliasHits:
+    """
+    别名命中计数
+
+    规则命中不再逐个创建 CharacterMention，而是按称呼计数：counts 为每个称呼的出现次数，
+    positions 按称呼紧凑存储每次出现的 (序号, sent_id, start)，序号为全书命中顺序。
+    build_table 只保留达到次数阈值的称呼，并按序号恢复逐句识别时的顺序。
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.positions: Dict[str, array] = {}
+        self.total = 0
+
+    def add_spans(self, spans: Iterable[AliasSpan], sent_id: int, offset: int = 0) -> None:
+        """记录一个句子的别名片段，offset 为句子在全文中的起始位置"""
+        for text, start, _ in spans:
+            if text not in self.counts:
+                self.counts[text] = 0
+                self.positions[text] = array('q')
+            self.counts[text] += 1
+            self.positions[text].extend((self.total, sent_id, start + offset))
+            self.total += 1
+
+    def merge(self, other: "AliasHits", sent_offset: int = 0, char_offset: int = 0) -> None:
+        """合并另一个分片的命中记录，并把序号和位置换算为全书编号"""
+        for text, count in other.counts.items():
+            if text not in self.counts:
+                self.counts[text] = 0
+                self.positions[text] = array('q')
+            self.counts[text] += count
+
+            shifted = array('q', other.positions[text])
+            for idx in range(0, len(shifted), 3):
+                shifted[idx] += self.total
+                shifted[idx + 1] += sent_offset
+                shifted[idx + 2] += char_offset
+            self.positions[text].extend(shifted)
+
+        self.total += other.total
+
+    def __len__(self) -> int:
+        return len(self.counts)
 
 
 class AliasRecognizer:
     """别名识别器"""
+
+    # 别名规则版本：规则变化导致逐句结果变化时递增，使增量识别的历史结果失效
+    RULES_VERSION = "1"
     
     def __init__(self):
         self.embedding_model = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
         self._initialized = False
+
+        # 前缀、敬称、儿化音和描述性称呼规则编译为一个组合扫描器
+        self.rule_scanner = AliasRuleScanner(settings.NAME_PREFIXES, settings.NAME_HONORIFICS)
     
     def initialize(self):
-        """延迟初始化句向量模型"""
+        """延迟初始化句向量模型（后端由 settings.EMBEDDING_BACKEND 选择）"""
         if self._initialized:
             return
         
         try:
-            from sentence_transformers import SentenceTransformer
-            logger.info(f"正在加载句向量模型: {settings.EMBEDDING_MODEL}")
-            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            backend = create_embedding_backend()
+            backend.initialize()
+            self.embedding_model = backend
             self._initialized = True
-            logger.info("句向量模型加载成功")
+            logger.info(f"句向量模型加载成功: {backend.name} 后端")
         except Exception as e:
             logger.warning(f"句向量模型加载失败: {e}，将仅使用规则合并")
             self._initialized = False
+            return
+
+        if settings.EMBEDDING_CACHE_ENABLED:
+            try:
+                self.embedding_cache = EmbeddingCache()
+            except OSError as error:
+                logger.warning(f"句向量缓存不可用: {error}")
     
-    def recognize_aliases(self, sentences: List[str]) -> List[CharacterMention]:
-        """识别别名和称呼"""
+    def recognize_aliases(
+        self,
+        sentences: Iterable[str],
+        offsets: Optional[Sequence[int]] = None
+    ) -> List[CharacterMention]:
+        """
+        识别别名和称呼
+
+        Args:
+            sentences: 句子列表
+            offsets: 每个句子在清洗后全文中的起始位置；不提供时位置为句内偏移
+        """
         aliases = []
 
         for sent_id, sentence in enumerate(sentences):
-            # 规则1: 前缀 + 核心名
-            aliases.extend(self._extract_prefix_names(sentence, sent_id))
+            offset = offsets[sent_id] if offsets is not None else 0
+            aliases.extend(self.recognize_sentence_aliases(sentence, sent_id, offset))
 
-            # 规则2: 核心名 + 后缀敬称
-            aliases.extend(self._extract_honorific_names(sentence, sent_id))
+        logger.info(f"别名识别完成: 共 {len(aliases)} 个别名提及")
 
-            # 规则3: 儿化音昵称
-            aliases.extend(self._extract_er_names(sentence, sent_id))
+        return aliases
 
-            # 规则4: 描述性称呼（新增）
-            aliases.extend(self._extract_descriptive_names(sentence, sent_id))
+    def recognize_sentence_aliases(
+        self,
+        sentence: str,
+        sent_id: int,
+        offset: int = 0
+    ) -> List[CharacterMention]:
+        """
+        识别单个句子中的别名和称呼（供流式处理逐句调用）
 
-        logger.info(f"别名识别完成: 共 {len(aliases)} 个别名提及")
+        前缀、敬称、儿化音和描述性称呼规则由 AliasRuleScanner 一次扫描完成，见 alias_rules.py。
+        """
+        return [
+            CharacterMention(text=text, start=start + offset, end=end + offset, sent_id=sent_id)
+            for start, end, text in self.rule_scanner.scan(sentence)
+        ]
 
-        return aliases
-    
-    def _extract_prefix_names(self, sentence: str, sent_id: int) -> List[CharacterMention]:
-        """提取带前缀的称呼"""
-        mentions = []
-        
-        # 构建前缀正则
-        prefixes = '|'.join(settings.NAME_PREFIXES)
-        pattern = f'({prefixes})([一-龥]{{1,3}})'
-        
-        for match in re.finditer(pattern, sentence):
-            mentions.append(CharacterMention(
-                text=match.group(0),
-                start=match.start(),
-                end=match.end(),
-                sent_id=sent_id
-            ))
-        
-        return mentions
-    
-    def _extract_honorific_names(self, sentence: str, sent_id: int) -> List[CharacterMention]:
-        """提取带敬称的称呼"""
-        mentions = []
-        
-        # 构建后缀正则
-        honorifics = '|'.join(settings.NAME_HONORIFICS)
-        pattern = f'([一-龥]{{1,3}})({honorifics})'
-        
-        for match in re.finditer(pattern, sentence):
-            mentions.append(CharacterMention(
-                text=match.group(0),
-                start=match.start(),
-                end=match.end(),
-                sent_id=sent_id
-            ))
-        
-        return mentions
-    
-    def _extract_er_names(self, sentence: str, sent_id: int) -> List[CharacterMention]:
-        """提取儿化音昵称"""
-        mentions = []
-
-        pattern = r'([一-龥]{1,2})儿'
-        for match in re.finditer(pattern, sentence):
-            mentions.append(CharacterMention(
-                text=match.group(0),
-                start=match.start(),
-                end=match.end(),
-                sent_id=sent_id
-            ))
-
-        return mentions
-
-    def _extract_descriptive_names(self, sentence: str, sent_id: int) -> List[CharacterMention]:
-        """提取描述性称呼（描述词/颜色/职业等）"""
-        mentions = []
-
-        # 模式1: X头、X面、X脸（动物/物品 + 部位）
-        pattern1 = r'([一-龥]{2,4})(头|面|脸)'
-        for match in re.finditer(pattern1, sentence):
-            full_text = match.group(0)
-            # 排除常见非人名: "念头"、"里头"、"外头" 等
-            if full_text not in ['念头', '里头', '外头', '上头', '下头', '前头', '后头',
-                                '心头', '手头', '年头', '日头', '舌头', '骨头', '木头',
-                                '石头', '拳头', '指头', '码头', '街头', '床头', '枕头']:
-                mentions.append(CharacterMention(
-                    text=full_text,
-                    start=match.start(),
-                    end=match.end(),
-                    sent_id=sent_id
-                ))
-
-        # 模式2: 穿着描述 + 人物词（白大褂、黑衣人）
-        pattern2 = r'(白|黑|红|蓝|绿|黄|紫|灰|褐|青)(色)?(大褂|衣[人男女子]|裙[女子]|袍[人男]|服[男女])'
-        for match in re.finditer(pattern2, sentence):
-            mentions.append(CharacterMention(
-                text=match.group(0),
-                start=match.start(),
-                end=match.end(),
-                sent_id=sent_id
-            ))
-
-        # 模式3: 身体特征 + 男/女/人（花臂男、健硕男人、清冷女人）
-        pattern3 = r'([一-龥]{2,4})(男[人子]?|女[人子]?|[男女][的]?)'
-        for match in re.finditer(pattern3, sentence):
-            full_text = match.group(0)
-            # 只保留可能是角色描述的（避免"那个男人"等）
-            prefix = match.group(1)
-            if prefix not in ['这个', '那个', '每个', '一个', '有个', '某个', '另一']:
-                mentions.append(CharacterMention(
-                    text=full_text,
-                    start=match.start(),
-                    end=match.end(),
-                    sent_id=sent_id
-                ))
-
-        # 模式4: 常见身份/职业词（店小二、老板、掌柜）
-        pattern4 = r'(店小二|老板娘?|掌柜的?|伙计|小厮|丫鬟|婢女|家丁|护卫|侍卫)'
-        for match in re.finditer(pattern4, sentence):
-            mentions.append(CharacterMention(
-                text=match.group(0),
-                start=match.start(),
-                end=match.end(),
-                sent_id=sent_id
-            ))
-
-        return mentions
+    def sentence_alias_spans(self, sentence: str) -> List[AliasSpan]:
+        """单个句子的别名片段 (文本, 句内起点, 句内终点)，不创建提及对象"""
+        return [(text, start, end) for start, end, text in self.rule_scanner.scan(sentence)]
+
+    def build_mentions(self, hits: AliasHits, min_count: int = 1) -> List[CharacterMention]:
+        """将别名命中记录转换为 CharacterMention 列表，见 build_table"""
+        return self.build_table(hits, min_count).to_mentions()
+
+    def build_table(self, hits: AliasHits, min_count: int = 1) -> MentionTable:
+        """
+        将别名命中记录转换为列式提及表
+
+        Args:
+            hits: 别名命中计数
+            min_count: 称呼的最少出现次数，不足的称呼不保留；为 1 时结果与逐句识别完全一致
+
+        Returns:
+            按逐句识别顺序排列的别名提及表
+        """
+        names = [text for text, count in hits.counts.items() if count >= min_count]
+        if not names:
+            return MentionTable()
+
+        positions = [np.frombuffer(hits.positions[text], dtype=np.int64).reshape(-1, 3) for text in names]
+        name_ids = np.repeat(np.arange(len(names)), [len(rows) for rows in positions])
+        stacked = np.concatenate(positions)
+        # 按全书命中序号恢复逐句识别的顺序
+        order = np.argsort(stacked[:, 0], kind="stable")
+
+        return MentionTable(
+            names,
+            name_ids[order],
+            stacked[order, 1],
+            stacked[order, 2],
+            np.full(len(order), DEFAULT_CONFIDENCE),
+            [DEFAULT_SOURCE],
+            np.zeros(len(order))
+        )
     
     def normalize_name(self, name: str) -> str:
         """
@@ -195,37 +218,62 @@ class AliasRecognizer:
     
     def merge_characters(
         self,
-        mentions: List[CharacterMention],
+        mentions: Union[MentionTable, List[CharacterMention]],
         sentences: List[str],
         book_id: str,
-        threshold: float = None
+        threshold: float = None,
+        merge_groups: Optional[List[Tuple[str, List[str]]]] = None,
+        merge_stats: Optional[Dict[str, int]] = None
     ) -> Tuple[List[Character], Dict[str, str]]:
-        """合并人物实体并生成别名映射"""
+        """
+        合并人物实体并生成别名映射
+
+        Args:
+            mentions: 所有提及（列式提及表，或 CharacterMention 列表）
+            sentences: 句子列表
+            book_id: 书籍ID
+            threshold: 相似度阈值
+            merge_groups: 上一次识别保存的合并分组 [(主名, [别名...]), ...]；
+                提供且覆盖全部提及时跳过规则与语义合并，直接按分组重建人物
+            merge_stats: 提供时写入字符串合并的名字对统计（总对数 pairs、计算 scored、剪枝 pruned）
+        """
         if threshold is None:
             threshold = settings.SIMILARITY_THRESHOLD
-        
-        # 第一步：基于规则的合并
-        name_groups = self._rule_based_merge(mentions)
-        
-        # 第二步：基于语义的合并（如果模型已加载）
-        if self._initialized and self.embedding_model:
-            name_groups = self._semantic_merge(name_groups, sentences, threshold)
-        else:
-            name_groups = self._string_merge(name_groups, threshold)
+
+        table = mentions if isinstance(mentions, MentionTable) else MentionTable.from_mentions(mentions)
+        # 按称呼汇总一次，之后的合并只处理不同的称呼
+        counts = table.name_counts()
+        min_starts = table.min_starts()
+
+        name_groups = self._regroup(table, merge_groups) if merge_groups is not None else None
+
+        if name_groups is None:
+            # 第一步：基于规则的合并
+            name_groups = self._rule_based_merge(table, counts)
+
+            # 第二步：基于语义的合并（如果模型已加载），未加载或失败时使用字符串合并
+            merged = None
+            if self.uses_semantic_merge:
+                merged = self._semantic_merge(name_groups, table, sentences, threshold, counts)
+            if merged is None:
+                merged, pair_stats = self._string_merge(name_groups, threshold, counts, table.names)
+                if merge_stats is not None:
+                    merge_stats.update(pair_stats)
+            name_groups = merged
         
         # 构建 Character 对象
         characters = []
         alias_map = {}
         
         for char_id, group_data in enumerate(name_groups.values()):
-            main_name, aliases, mention_list = group_data
+            main_name, aliases, members = group_data
             character = Character(
                 id=f"c{char_id:03d}",
                 book_id=book_id,
                 canonical_name=main_name,
                 aliases=list(aliases),
-                mentions=len(mention_list),
-                first_appearance_idx=min(m.start for m in mention_list) if mention_list else -1
+                mentions=int(counts[members].sum()),
+                first_appearance_idx=int(min_starts[members].min()) if members else -1
             )
             
             # 推断性别
@@ -243,69 +291,207 @@ class AliasRecognizer:
         
         return characters, alias_map
     
-    def _rule_based_merge(self, mentions: List[CharacterMention]) -> Dict[str, Tuple[str, Set[str], List[CharacterMention]]]:
-        """基于核心名的快速分组"""
-        core_groups = defaultdict(lambda: {"names": set(), "mentions": []})
-        
-        for mention in mentions:
-            core_name = self.normalize_name(mention.text)
-            core_groups[core_name]["names"].add(mention.text)
-            core_groups[core_name]["mentions"].append(mention)
+    @property
+    def uses_semantic_merge(self) -> bool:
+        """是否使用句向量做语义合并（模型已加载）"""
+        return bool(self._initialized and self.embedding_model)
+
+    @property
+    def embedding_model_id(self) -> str:
+        """句向量模型标识（随后端变化）；未使用语义合并时为空"""
+        if not self.uses_semantic_merge:
+            return ""
+        return getattr(self.embedding_model, "model_id", settings.EMBEDDING_MODEL)
+
+    def _regroup(
+        self,
+        table: MentionTable,
+        merge_groups: List[Tuple[str, List[str]]]
+    ) -> Optional[Dict[str, NameGroup]]:
+        """按已有的合并分组归类称呼；有称呼不属于任何分组时返回 None"""
+        main_of = {}
+        for main_name, aliases in merge_groups:
+            main_of[main_name] = main_name
+            for alias in aliases:
+                main_of[alias] = main_name
+
+        grouped: Dict[str, List[int]] = {main_name: [] for main_name, _ in merge_groups}
+        for name_id in table.present_names():
+            main_name = main_of.get(table.names[name_id])
+            if main_name is None:
+                return None
+            grouped[main_name].append(name_id)
+
+        return {
+            main_name: (main_name, set(aliases), grouped[main_name])
+            for main_name, aliases in merge_groups
+        }
+
+    def _rule_based_merge(self, table: MentionTable, counts: np.ndarray) -> Dict[str, NameGroup]:
+        """基于核心名的快速分组（按不同称呼分组，主名取提及最多、并列时最先出现的称呼）"""
+        core_groups: Dict[str, List[int]] = defaultdict(list)
+        for name_id in table.present_names():
+            core_groups[self.normalize_name(table.names[name_id])].append(name_id)
 
         name_groups = {}
-        for core_name, group in core_groups.items():
-            name_counts = defaultdict(int)
-            for mention in group["mentions"]:
-                name_counts[mention.text] += 1
-            main_name = max(name_counts.items(), key=lambda x: x[1])[0]
-            aliases = group["names"] - {main_name}
-            name_groups[main_name] = (main_name, aliases, group["mentions"])
+        for members in core_groups.values():
+            main_id = max(members, key=lambda name_id: counts[name_id])
+            main_name = table.names[main_id]
+            aliases = {table.names[name_id] for name_id in members} - {main_name}
+            name_groups[main_name] = (main_name, aliases, members)
         
         return name_groups
     
-    def _semantic_merge(self, name_groups: Dict, sentences: List[str], threshold: float) -> Dict:
-        """基于语义相似度的合并"""
+    def _semantic_merge(
+        self,
+        name_groups: Dict[str, NameGroup],
+        table: MentionTable,
+        sentences: List[str],
+        threshold: float,
+        counts: np.ndarray
+    ) -> Optional[Dict[str, NameGroup]]:
+        """基于语义相似度的合并；编码失败时返回 None，由调用方回退字符串合并"""
         names = list(name_groups.keys())
         if len(names) < 2:
             return name_groups
 
-        contexts = [self._collect_context(name_groups[name][2], sentences) for name in names]
+        contexts = [
+            self._collect_context(table.sentence_ids(name_groups[name][2]).tolist(), sentences)
+            for name in names
+        ]
 
         try:
-            embeddings = self.embedding_model.encode(
-                contexts,
-                batch_size=min(settings.EMBEDDING_BATCH_SIZE, len(contexts)),
-                normalize_embeddings=True,
-                convert_to_numpy=True,
-                show_progress_bar=False
-            )
+            embeddings = self._encode_contexts(contexts)
         except Exception as error:  # pragma: no cover - 仅记录模型异常
             logger.warning(f"语义合并失败，回退字符串合并: {error}")
-            return self._string_merge(name_groups, threshold)
+            return None
 
         pairs = self._find_semantic_pairs(embeddings, threshold)
         if not pairs:
             return name_groups
 
-        return self._apply_merges(pairs, names, name_groups)
+        return self._apply_merges(pairs, names, name_groups, counts, table.names)
+
+    def _encode_contexts(self, contexts: List[str]) -> np.ndarray:
+        """
+        编码上下文：请求内相同的上下文只编码一次，已缓存的上下文不再编码
 
-    def _string_merge(self, name_groups: Dict, threshold: float) -> Dict:
+        向量统一按 float16 精度参与计算，命中缓存与否合并结果一致。
+        """
+        unique = list(dict.fromkeys(contexts))
+        vectors: Dict[str, np.ndarray] = {}
+
+        keys: Dict[str, str] = {}
+        if self.embedding_cache is not None:
+            model_id = getattr(self.embedding_model, "model_id", settings.EMBEDDING_MODEL)
+            keys = {context: self.embedding_cache.key(model_id, context) for context in unique}
+            cached = self.embedding_cache.get_many(list(dict.fromkeys(keys.values())))
+            vectors = {context: cached[keys[context]] for context in unique if keys[context] in cached}
+
+        missing = [context for context in unique if context not in vectors]
+        if missing:
+            encoded = self._encode_bucketed(missing)
+            fresh = dict(zip(missing, np.asarray(encoded, dtype=np.float16)))
+            vectors.update(fresh)
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many({keys[context]: vector for context, vector in fresh.items()})
+
+        logger.debug(f"上下文编码: {len(contexts)} 个, 去重后 {len(unique)} 个, 实际编码 {len(missing)} 个")
+        return np.stack([vectors[context] for context in contexts]).astype(np.float32)
+
+    def _encode_bucketed(self, texts: List[str]) -> np.ndarray:
+        """按长度排序后分批编码（同批文本长度相近，填充最少），再恢复原顺序"""
+        order = sorted(range(len(texts)), key=lambda idx: len(texts[idx]))
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.embedding_model.encode([texts[idx] for idx in batch])
+            for idx, vector in zip(batch, encoded):
+                results[idx] = vector
+
+        return np.stack(results)
+
+    def _string_merge(
+        self,
+        name_groups: Dict[str, NameGroup],
+        threshold: float,
+        counts: np.ndarray,
+        surface_names: List[str]
+    ) -> Tuple[Dict[str, NameGroup], Dict[str, int]]:
+        """
+        基于字符串相似度的合并（未加载句向量模型时使用）
+
+        Returns:
+            (合并后的分组, 名字对统计 {pairs: 总对数, scored: 实际计算的对数, pruned: 剪枝的对数})
+        """
         names = list(name_groups.keys())
+        total = len(names) * (len(names) - 1) // 2
         if len(names) < 2:
-            return name_groups
+            return name_groups, {"pairs": total, "scored": 0, "pruned": total}
+
+        cutoff = max(threshold, settings.MIN_ALIAS_SIMILARITY)
+        if cutoff > 0:
+            candidates = self._string_candidates(names, cutoff)
+        else:
+            candidates = combinations(range(len(names)), 2)
 
         pairs = []
-        for i, left in enumerate(names):
-            for j in range(i + 1, len(names)):
-                right = names[j]
-                score = self._string_similarity(left, right)
-                if score >= max(threshold, settings.MIN_ALIAS_SIMILARITY):
-                    pairs.append((i, j))
+        scored = 0
+        for i, j in candidates:
+            scored += 1
+            if self._string_similarity(names[i], names[j]) >= cutoff:
+                pairs.append((i, j))
+
+        # 统计随结果返回而不保存在实例上：同一实例可能被多个识别线程同时使用
+        stats = {"pairs": total, "scored": scored, "pruned": total - scored}
+        logger.debug(f"字符串合并: {len(names)} 个名字, 共 {total} 对, 计算 {scored} 对, 剪枝 {total - scored} 对")
 
         if not pairs:
-            return name_groups
+            return name_groups, stats
 
-        return self._apply_merges(pairs, names, name_groups)
+        return self._apply_merges(pairs, names, name_groups, counts, surface_names), stats
+
+    def _string_candidates(self, names: List[str], cutoff: float) -> List[Tuple[int, int]]:
+        """
+        候选名字对：通过字符倒排索引只枚举有共同字符的名字对，
+        再用相似度上界剪掉不可能达到 cutoff 的对，结果与逐对计算完全一致
+
+        Returns:
+            按 (i, j) 排序的候选对，i < j
+        """
+        counts = [Counter(name) for name in names]
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for idx, counter in enumerate(counts):
+            for char in counter:
+                postings[char].append(idx)
+
+        candidates: List[Tuple[int, int]] = []
+        for i, counter in enumerate(counts):
+            # 与后面每个名字共有的字符数（按多重集计）
+            shared: Dict[int, int] = defaultdict(int)
+            for char, count in counter.items():
+                posting = postings[char]
+                for j in islice(posting, bisect_right(posting, i), None):
+                    shared[j] += min(count, counts[j][char])
+
+            for j in sorted(shared):
+                if self._similarity_upper_bound(len(names[i]), len(names[j]), shared[j]) >= cutoff:
+                    candidates.append((i, j))
+
+        return candidates
+
+    @staticmethod
+    def _similarity_upper_bound(left_length: int, right_length: int, shared: int) -> float:
+        """_string_similarity 的上界：shared 为两个名字共有的字符数（按多重集计）"""
+        # SequenceMatcher 的匹配字符数不超过共有字符数
+        bound = 2.0 * shared / (left_length + right_length)
+        short, long_ = sorted((left_length, right_length))
+        if shared == short:
+            # 短名字的字符全部出现在长名字中，可能互相包含
+            bound = max(bound, 1 - (long_ - short) * 0.05)
+        return bound
     
     def _infer_gender(self, name: str, aliases: Set[str]) -> str:
         """推断性别"""
@@ -333,34 +519,100 @@ class AliasRecognizer:
             return "未知"
 
     # ===== 辅助函数：合并与相似度 =====
-    def _collect_context(self, mentions: List[CharacterMention], sentences: List[str]) -> str:
-        """收集提及周围的句子上下文"""
-        sent_ids = sorted({m.sent_id for m in mentions}) if mentions else []
+    def _collect_context(self, sent_ids: Sequence[int], sentences: List[str]) -> str:
+        """
+        收集提及周围的句子上下文
+
+        Args:
+            sent_ids: 提及所在的句子编号（去重、升序）
+            sentences: 句子列表
+        """
         fragments: List[str] = []
         for sent_id in sent_ids[: settings.EMBEDDING_BATCH_SIZE]:
             start, end = max(sent_id - 1, 0), min(sent_id + 2, len(sentences))
             fragments.extend(sentences[start:end])
             if len(fragments) >= 6:
                 break
-        return "。".join(fragments)
+        # 截断到 token 预算（中文按字切分，字符数不少于 token 数；预留 [CLS]/[SEP]）
+        return "。".join(fragments)[:max(1, settings.EMBEDDING_MAX_LENGTH - 2)]
 
     def _find_semantic_pairs(self, embeddings: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
-        """查找语义相似的名字对"""
-        pairs: List[Tuple[int, int]] = []
+        """查找语义相似的名字对（向量已归一化，内积即余弦相似度）"""
+        total = embeddings.shape[0]
+        if 0 < settings.SEMANTIC_ANN_MIN_NAMES <= total:
+            pairs = self._find_semantic_pairs_ann(embeddings, threshold)
+            if pairs is not None:
+                return pairs
+        return self._find_semantic_pairs_blocked(embeddings, threshold)
+
+    def _find_semantic_pairs_blocked(
+        self,
+        embeddings: np.ndarray,
+        threshold: float,
+        tile_size: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """分块矩阵乘：每次只计算 tile × tile 的相似度块，内存占用与名字数无关"""
+        tile = max(1, tile_size or settings.SEMANTIC_TILE_SIZE)
+        embeddings = np.ascontiguousarray(embeddings)
         total = embeddings.shape[0]
-        for i in range(total):
-            for j in range(i + 1, total):
-                if float(np.dot(embeddings[i], embeddings[j])) >= threshold:
-                    pairs.append((i, j))
-        return pairs
+
+        blocks = [np.empty((0, 2), dtype=np.int64)]
+        for row in range(0, total, tile):
+            left = embeddings[row:row + tile]
+            # 只计算上三角的块
+            for col in range(row, total, tile):
+                hits = np.argwhere(left @ embeddings[col:col + tile].T >= threshold)
+                hits[:, 0] += row
+                hits[:, 1] += col
+                blocks.append(hits[hits[:, 0] < hits[:, 1]])
+
+        pairs = np.concatenate(blocks)
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        return [(int(i), int(j)) for i, j in pairs]
+
+    def _find_semantic_pairs_ann(self, embeddings: np.ndarray, threshold: float) -> Optional[List[Tuple[int, int]]]:
+        """faiss HNSW 近似近邻：每个名字只与最相近的 SEMANTIC_ANN_NEIGHBORS 个名字比较；faiss 不可用时返回 None"""
+        try:
+            import faiss
+        except ImportError:
+            logger.warning("faiss 未安装，语义配对使用分块精确计算")
+            return None
+
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        total = vectors.shape[0]
+        neighbors = min(settings.SEMANTIC_ANN_NEIGHBORS + 1, total)  # 近邻中包含自身
+
+        index = faiss.IndexHNSWFlat(vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = max(64, neighbors)
+        index.add(vectors)
+        scores, ids = index.search(vectors, neighbors)
+
+        rows = np.repeat(np.arange(total, dtype=np.int64), neighbors)
+        cols = ids.ravel().astype(np.int64)
+        keep = (scores.ravel() >= threshold) & (cols >= 0) & (cols != rows)
+        codes = np.unique(np.minimum(rows[keep], cols[keep]) * total + np.maximum(rows[keep], cols[keep]))
+
+        logger.info(f"语义配对使用 faiss 近似检索: {total} 个名字, {len(codes)} 对")
+        return [(int(code // total), int(code % total)) for code in codes]
 
     def _apply_merges(
         self,
         pairs: List[Tuple[int, int]],
         names: List[str],
-        name_groups: Dict[str, Tuple[str, Set[str], List[CharacterMention]]]
-    ) -> Dict:
-        """将待合并对压缩为最终分组"""
+        name_groups: Dict[str, NameGroup],
+        counts: np.ndarray,
+        surface_names: List[str]
+    ) -> Dict[str, NameGroup]:
+        """
+        将待合并对压缩为最终分组
+
+        Args:
+            pairs: 待合并的分组下标对
+            names: 分组主名列表（pairs 中的下标）
+            name_groups: 合并前的分组
+            counts: 每个称呼的提及次数（MentionTable.name_counts）
+            surface_names: 称呼驻留表（MentionTable.names）
+        """
         if not pairs:
             return name_groups
         parent = list(range(len(names)))
@@ -379,22 +631,20 @@ class AliasRecognizer:
         for left, right in pairs:
             parent[find(left)] = find(right)
 
-        buckets: Dict[int, Dict[str, Set[str] | List[CharacterMention]]] = defaultdict(lambda: {"names": set(), "mentions": []})
+        buckets: Dict[int, Tuple[Set[str], List[int]]] = defaultdict(lambda: (set(), []))
         for idx, name in enumerate(names):
-            root = find(idx)
-            main_name, aliases, mentions = name_groups[name]
-            bucket = buckets[root]
-            bucket["names"].update({main_name, *aliases})
-            bucket["mentions"].extend(mentions)
-
-        merged: Dict[str, Tuple[str, Set[str], List[CharacterMention]]] = {}
-        for bucket in buckets.values():
-            mention_counts = defaultdict(int)
-            for mention in bucket["mentions"]:
-                mention_counts[mention.text] += 1
-            main_name = max(mention_counts.items(), key=lambda item: (item[1], len(item[0])))[0]
-            aliases = set(bucket["names"]) - {main_name}
-            merged[main_name] = (main_name, aliases, bucket["mentions"])
+            main_name, aliases, members = name_groups[name]
+            bucket_names, bucket_members = buckets[find(idx)]
+            bucket_names.update({main_name, *aliases})
+            bucket_members.extend(members)
+
+        merged: Dict[str, NameGroup] = {}
+        for bucket_names, bucket_members in buckets.values():
+            # 主名取提及最多的称呼，其次取较长的；仍并列时取最先出现的
+            main_id = max(bucket_members, key=lambda name_id: (counts[name_id], len(surface_names[name_id])))
+            main_name = surface_names[main_id]
+            aliases = bucket_names - {main_name}
+            merged[main_name] = (main_name, aliases, bucket_members)
         logger.info(f"别名合并后剩余 {len(merged)} 组（触发 {len(pairs)} 次合并）")
         return merged
 
@@ -0,0 +1,104 @@
+"""别名多模式匹配索引
+
+merge_characters 之后用 alias_map 一次性构建 Aho-Corasick 自动机，
+每个句子线性扫描一遍即可得到全部 (别名, 规范名, 偏移) 命中，
+供指代消解、关系抽取和对话归因共用，替代逐个别名的 `alias in sentence`。
+"""
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class AliasHit(NamedTuple):
+    """句内别名命中"""
+    alias: str
+    canonical: str
+    offset: int
+
+
+class AliasIndex:
+    """alias_map 的 Aho-Corasick 自动机"""
+
+    def __init__(self, alias_map: Dict[str, str]):
+        self.alias_map = alias_map
+
+        # 别名在 alias_map 中的次序：按人物返回时沿用逐个别名判断的顺序，结果与原实现一致
+        self._rank = {alias: rank for rank, alias in enumerate(alias_map)}
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[str, ...]] = [()]
+
+        for alias in alias_map:
+            if alias:
+                self._insert(alias)
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self._rank)
+
+    def _insert(self, alias: str) -> None:
+        state = 0
+        for char in alias:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = (alias,)
+
+    def _build_links(self) -> None:
+        """按层构建失败链接，并把失败链上的输出并入当前状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] += self._output[fail]
+                queue.append(next_state)
+
+    def find(self, text: str) -> List[AliasHit]:
+        """
+        扫描文本中的全部别名出现（包括相互重叠的别名）
+
+        Args:
+            text: 句子或任意片段
+
+        Returns:
+            命中列表，按别名结束位置排序
+        """
+        goto, fail, output, alias_map = self._goto, self._fail, self._output, self.alias_map
+        hits: List[AliasHit] = []
+        state = 0
+
+        for pos, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for alias in output[state]:
+                hits.append(AliasHit(alias, alias_map[alias], pos + 1 - len(alias)))
+
+        return hits
+
+    def characters(self, text: str) -> List[str]:
+        """文本中出现的人物（规范名，去重），顺序与按 alias_map 顺序逐个判断别名时相同"""
+        ranks: Dict[str, int] = {}
+        for hit in self.find(text):
+            rank = self._rank[hit.alias]
+            if hit.canonical not in ranks or rank < ranks[hit.canonical]:
+                ranks[hit.canonical] = rank
+        return sorted(ranks, key=ranks.__getitem__)
+
+    def first(self, text: str) -> Optional[str]:
+        """alias_map 中排在最前、且出现在文本中的别名对应的规范名"""
+        best = None
+        for hit in self.find(text):
+            if best is None or self._rank[hit.alias] < self._rank[best.alias]:
+                best = hit
+        return best.canonical if best else None
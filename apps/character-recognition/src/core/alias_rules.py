@@ -0,0 +1,115 @@
+"""别名抽取规则
+
+前缀、敬称、儿化音和描述性称呼共七条规则，在 AliasRecognizer 初始化时编译为一个组合正则：
+每条规则是一个带命名分组的前瞻断言，整个正则只在至少一条规则能匹配的位置命中（零宽），
+一次扫描即可得到所有规则在该位置的匹配。每条规则按各自的 re.finditer 语义（从左到右、互不重叠）
+取舍，因此结果与逐条规则分别扫描完全一致。
+"""
+import re
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# 模式1（X头/面/脸）中的常见非人名
+NON_PERSON_HEAD_WORDS = frozenset([
+    '念头', '里头', '外头', '上头', '下头', '前头', '后头',
+    '心头', '手头', '年头', '日头', '舌头', '骨头', '木头',
+    '石头', '拳头', '指头', '码头', '街头', '床头', '枕头',
+])
+
+# 模式3（X男/女）中不构成角色描述的指示、数量前缀（避免"那个男人"等）
+GENERIC_GENDER_PREFIXES = frozenset(['这个', '那个', '每个', '一个', '有个', '某个', '另一'])
+
+# 规则命中：(句内起点, 句内终点, 文本)
+RuleHit = Tuple[int, int, str]
+
+
+class AliasRule(NamedTuple):
+    """一条别名规则；accept 用于排除命中（被排除的命中同样占据位置，与 finditer 一致）"""
+    name: str
+    pattern: str
+    accept: Optional[Callable[["re.Match"], bool]] = None
+
+
+def _alternation(words: Sequence[str]) -> str:
+    """
+    词表的有序多选正则（保持列表顺序，先匹配到的词优先，与原规则一致）
+
+    前面加首字字符集的前瞻：大多数位置在字符集处即失败，不必逐个尝试词表中的词。
+    """
+    first_chars = ''.join(sorted({re.escape(word[0]) for word in words if word}))
+    alternation = '|'.join(re.escape(word) for word in words)
+    return f'(?=[{first_chars}])(?:{alternation})' if first_chars else f'(?:{alternation})'
+
+
+def build_rules(prefixes: Sequence[str], honorifics: Sequence[str]) -> List[AliasRule]:
+    """
+    按配置构建规则（顺序即输出顺序）
+
+    Args:
+        prefixes: 称呼前缀（settings.NAME_PREFIXES）
+        honorifics: 称呼后缀/敬称（settings.NAME_HONORIFICS）
+    """
+    return [
+        # 规则1: 前缀 + 核心名
+        AliasRule("prefix", f'{_alternation(prefixes)}[一-龥]{{1,3}}'),
+        # 规则2: 核心名 + 后缀敬称
+        AliasRule("honorific", f'[一-龥]{{1,3}}{_alternation(honorifics)}'),
+        # 规则3: 儿化音昵称
+        AliasRule("er", r'[一-龥]{1,2}儿'),
+        # 规则4: 描述性称呼
+        # 模式1: X头、X面、X脸（动物/物品 + 部位）
+        AliasRule(
+            "head", r'[一-龥]{2,4}(?:头|面|脸)',
+            lambda match: match.group("head") not in NON_PERSON_HEAD_WORDS
+        ),
+        # 模式2: 穿着描述 + 人物词（白大褂、黑衣人）
+        AliasRule("clothing", r'(?:白|黑|红|蓝|绿|黄|紫|灰|褐|青)色?(?:大褂|衣[人男女子]|裙[女子]|袍[人男]|服[男女])'),
+        # 模式3: 身体特征 + 男/女/人（花臂男、健硕男人、清冷女人）
+        AliasRule(
+            "gender", r'(?P<gender_prefix>[一-龥]{2,4})(?:男[人子]?|女[人子]?|[男女]的?)',
+            lambda match: match.group("gender_prefix") not in GENERIC_GENDER_PREFIXES
+        ),
+        # 模式4: 常见身份/职业词（店小二、老板、掌柜）
+        AliasRule("occupation", r'店小二|老板娘?|掌柜的?|伙计|小厮|丫鬟|婢女|家丁|护卫|侍卫'),
+    ]
+
+
+class AliasRuleScanner:
+    """所有别名规则的组合扫描器"""
+
+    def __init__(self, prefixes: Sequence[str], honorifics: Sequence[str]):
+        self.rules = build_rules(prefixes, honorifics)
+
+        # 门控：任一规则能在此处匹配；随后逐条规则用可选的前瞻分组记录匹配终点
+        gate = '|'.join(
+            re.sub(r'\(\?P<\w+>', '(?:', rule.pattern) for rule in self.rules
+        )
+        captures = ''.join(f'(?=(?P<{rule.name}>{rule.pattern})?)' for rule in self.rules)
+        self._pattern = re.compile(f'(?=(?:{gate})){captures}')
+
+    def scan(self, sentence: str) -> List[RuleHit]:
+        """
+        扫描一个句子
+
+        Args:
+            sentence: 句子
+
+        Returns:
+            命中列表：先按规则顺序，同一规则内按位置排列
+        """
+        rules = self.rules
+        hits: List[List[RuleHit]] = [[] for _ in rules]
+        # 每条规则下一次允许命中的起点（该规则上一次命中的终点）
+        resume = [0] * len(rules)
+
+        for match in self._pattern.finditer(sentence):
+            start = match.start()
+            for idx, rule in enumerate(rules):
+                end = match.end(rule.name)
+                if end < 0 or start < resume[idx]:
+                    continue
+                resume[idx] = end
+                if rule.accept is None or rule.accept(match):
+                    hits[idx].append((start, end, sentence[start:end]))
+
+        return [hit for rule_hits in hits for hit in rule_hits]
@@ -4,6 +4,7 @@ from loguru import logger
 
 from ..config import settings
 from ..models.character import Character
+from .alias_index import AliasIndex
 
 
 class CoreferenceResolver:
@@ -16,7 +17,8 @@ class CoreferenceResolver:
         self,
         sentences: List[str],
         characters: List[Character],
-        alias_map: Dict[str, str]
+        alias_map: Dict[str, str],
+        alias_index: Optional[AliasIndex] = None
     ) -> Dict[int, str]:
         """
         解析代词指代
@@ -25,11 +27,14 @@ class CoreferenceResolver:
             sentences: 句子列表
             characters: 人物列表
             alias_map: 别名映射
+            alias_index: 由 alias_map 构建的别名索引（与关系抽取共用），不提供时现场构建
             
         Returns:
             {sent_id: character_name} 代词所指人物
         """
         resolutions = {}
+        if alias_index is None:
+            alias_index = AliasIndex(alias_map)
         
         # 维护最近出现的人物（用于启发式）
         recent_chars = []
@@ -37,7 +42,7 @@ class CoreferenceResolver:
         for sent_id, sentence in enumerate(sentences):
             # 提取当前句中的人物
             current_chars = self._extract_characters_in_sentence(
-                sentence, alias_map
+                sentence, alias_index
             )
             
             # 更新最近出现列表
@@ -64,17 +69,10 @@ class CoreferenceResolver:
     def _extract_characters_in_sentence(
         self,
         sentence: str,
-        alias_map: Dict[str, str]
+        alias_index: AliasIndex
     ) -> List[str]:
         """提取句子中的人物"""
-        characters = []
-        
-        for alias, main_name in alias_map.items():
-            if alias in sentence:
-                if main_name not in characters:
-                    characters.append(main_name)
-        
-        return characters
+        return alias_index.characters(sentence)
     
     def _extract_pronouns(self, sentence: str) -> List[tuple]:
         """提取代词"""
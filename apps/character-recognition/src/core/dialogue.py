@@ -5,6 +5,7 @@ from loguru import logger
 
 from ..config import settings
 from ..models.character import Character
+from .alias_index import AliasIndex
 
 
 class DialogueAttributor:
@@ -28,7 +29,8 @@ class DialogueAttributor:
         self,
         sentences: List[str],
         characters: List[Character],
-        alias_map: Dict[str, str]
+        alias_map: Dict[str, str],
+        alias_index: Optional[AliasIndex] = None
     ) -> Dict[str, int]:
         """
         为对话分配说话者
@@ -37,18 +39,21 @@ class DialogueAttributor:
             sentences: 句子列表
             characters: 人物列表
             alias_map: 别名映射
+            alias_index: 由 alias_map 构建的别名索引，不提供时现场构建
             
         Returns:
             {character_name: quote_count} 人物台词统计
         """
         quote_counts = {char.name: 0 for char in characters}
+        if alias_index is None:
+            alias_index = AliasIndex(alias_map)
         
         for sentence in sentences:
             # 尝试三种模式
             speaker = (
-                self._match_pattern1(sentence, alias_map) or
-                self._match_pattern2(sentence, alias_map) or
-                self._match_pattern3(sentence, alias_map)
+                self._match_pattern1(sentence, alias_index) or
+                self._match_pattern2(sentence, alias_index) or
+                self._match_pattern3(sentence, alias_index)
             )
             
             if speaker and speaker in quote_counts:
@@ -63,35 +68,29 @@ class DialogueAttributor:
         
         return quote_counts
     
-    def _match_pattern1(self, sentence: str, alias_map: Dict[str, str]) -> Optional[str]:
+    def _match_pattern1(self, sentence: str, alias_index: AliasIndex) -> Optional[str]:
         """匹配模式1: "...", 人名 + 触发词"""
         match = self.pattern1.search(sentence)
         if match:
             speaker_text = match.group(2).strip()
             # 查找别名映射
-            for alias, main_name in alias_map.items():
-                if alias in speaker_text:
-                    return main_name
+            return alias_index.first(speaker_text)
         return None
     
-    def _match_pattern2(self, sentence: str, alias_map: Dict[str, str]) -> Optional[str]:
+    def _match_pattern2(self, sentence: str, alias_index: AliasIndex) -> Optional[str]:
         """匹配模式2: 人名 + 触发词 + ":"..."""
         match = self.pattern2.search(sentence)
         if match:
             speaker_text = match.group(1).strip()
             # 查找别名映射
-            for alias, main_name in alias_map.items():
-                if alias in speaker_text:
-                    return main_name
+            return alias_index.first(speaker_text)
         return None
     
-    def _match_pattern3(self, sentence: str, alias_map: Dict[str, str]) -> Optional[str]:
+    def _match_pattern3(self, sentence: str, alias_index: AliasIndex) -> Optional[str]:
         """匹配模式3: "..." —— 人名"""
         match = self.pattern3.search(sentence)
         if match:
             speaker_text = match.group(2).strip()
             # 查找别名映射
-            for alias, main_name in alias_map.items():
-                if alias in speaker_text:
-                    return main_name
+            return alias_index.first(speaker_text)
         return None
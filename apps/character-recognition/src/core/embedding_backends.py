@@ -0,0 +1,180 @@
+"""句向量后端
+
+别名语义合并只需要"一批文本 -> 归一化句向量"，后端通过 settings.EMBEDDING_BACKEND 选择：
+torch 通过 sentence-transformers 加载 EMBEDDING_MODEL；onnx 用 onnxruntime 运行
+export_embedding_onnx.py 导出的 int8 量化模型，worker 不需要加载 PyTorch。
+分批与按长度分桶由 AliasRecognizer 处理，后端每次收到的是长度相近的一批文本。
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+from loguru import logger
+
+from ..config import settings
+
+
+class EmbeddingBackend(ABC):
+    """句向量后端接口"""
+
+    name = "base"
+
+    @property
+    def model_id(self) -> str:
+        """模型标识：向量会随之变化，用作句向量缓存键与合并指纹的一部分"""
+        return settings.EMBEDDING_MODEL
+
+    def initialize(self) -> None:
+        """加载模型，失败时抛出异常"""
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        编码一批文本
+
+        Args:
+            texts: 文本列表（已按 token 预算截断）
+
+        Returns:
+            L2 归一化的句向量矩阵，shape 为 (len(texts), dim)
+        """
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """sentence-transformers（PyTorch）后端"""
+
+    name = "torch"
+
+    def __init__(self):
+        self.model = None
+
+    def initialize(self) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"正在加载句向量模型: {settings.EMBEDDING_MODEL}")
+        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        # 按配置的 token 预算截断与填充
+        self.model.max_seq_length = settings.EMBEDDING_MAX_LENGTH
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    ONNX Runtime 句向量后端（CPU，int8 动态量化）
+
+    模型由 export_embedding_onnx.py 导出，目录中包含 ONNX 模型、vocab.txt 和 config.json。
+    与 OnnxBertEngine 相同，中文 BERT 词表以单字为主，这里直接按字映射 token，
+    对最后一层隐状态按 attention mask 做平均池化（text2vec-base-chinese 的池化方式）后归一化。
+    """
+
+    name = "onnx"
+
+    def __init__(self):
+        self.session = None
+        self.vocab: Dict[str, int] = {}
+        self._input_names: List[str] = []
+
+    @property
+    def model_id(self) -> str:
+        # 量化模型与原模型的向量有差异，不能共用缓存；重新导出后文件变化，缓存随之失效
+        path = settings.EMBEDDING_ONNX_MODEL_PATH
+        try:
+            stat = os.stat(path)
+            return f"{settings.EMBEDDING_MODEL}:onnx-int8:{stat.st_size}:{int(stat.st_mtime)}"
+        except OSError:
+            return f"{settings.EMBEDDING_MODEL}:onnx-int8"
+
+    def initialize(self) -> None:
+        import onnxruntime as ort
+
+        model_path = settings.EMBEDDING_ONNX_MODEL_PATH
+        model_dir = os.path.dirname(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.EMBEDDING_ONNX_THREADS > 0:
+            options.intra_op_num_threads = settings.EMBEDDING_ONNX_THREADS
+        options.inter_op_num_threads = 1
+
+        logger.info(f"正在加载 ONNX 句向量模型: {model_path}")
+        session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        with open(os.path.join(model_dir, "vocab.txt"), encoding="utf-8") as f:
+            self.vocab = {line.rstrip("\n"): idx for idx, line in enumerate(f)}
+        with open(os.path.join(model_dir, "config.json"), encoding="utf-8") as f:
+            exported_from = json.load(f).get("model")
+        if exported_from and exported_from != settings.EMBEDDING_MODEL:
+            logger.warning(f"ONNX 句向量模型导出自 {exported_from}，与 EMBEDDING_MODEL 不一致")
+
+        self._input_names = [item.name for item in session.get_inputs()]
+        self.session = session
+        logger.info(f"✅ ONNX 句向量模型加载成功: intra-op 线程数 {settings.EMBEDDING_ONNX_THREADS or '默认'}")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        cls_id = self.vocab.get("[CLS]", 101)
+        sep_id = self.vocab.get("[SEP]", 102)
+        unk_id = self.vocab.get("[UNK]", 100)
+        pad_id = self.vocab.get("[PAD]", 0)
+
+        max_chars = max(1, settings.EMBEDDING_MAX_LENGTH - 2)
+        texts = [text[:max_chars] for text in texts]
+
+        # 批内文本长度相近，只需补齐到批内最长
+        seq_len = max(len(text) for text in texts) + 2
+        input_ids = np.full((len(texts), seq_len), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(texts), seq_len), dtype=np.int64)
+
+        for row, text in enumerate(texts):
+            ids = [self.vocab.get(char.lower(), unk_id) for char in text]
+            input_ids[row, :len(ids) + 2] = [cls_id, *ids, sep_id]
+            attention_mask[row, :len(ids) + 2] = 1
+
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self._input_names})[0]
+        return self.pool(hidden, attention_mask)
+
+    @staticmethod
+    def pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """按 attention mask 平均池化并做 L2 归一化"""
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+# 可选的句向量后端（settings.EMBEDDING_BACKEND）
+EMBEDDING_BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxEmbeddingBackend.name: OnnxEmbeddingBackend,
+}
+
+
+def create_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """
+    按名称创建句向量后端
+
+    Args:
+        name: 后端名称，默认取 settings.EMBEDDING_BACKEND
+
+    Returns:
+        句向量后端实例（尚未加载模型）
+    """
+    name = (name or settings.EMBEDDING_BACKEND).lower()
+    backend_cls = EMBEDDING_BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"未知的句向量后端: {name}，可选: {', '.join(EMBEDDING_BACKENDS)}")
+    return backend_cls()
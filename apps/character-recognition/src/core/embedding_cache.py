@@ -0,0 +1,241 @@
+"""别名合并上下文的句向量缓存
+
+缓存键为 (模型, EMBEDDING_MAX_LENGTH, 上下文文本) 的内容哈希，值为 float16 句向量。
+两级缓存：本地内存映射文件（定长槽位 + 键索引 + 槽位最近使用时间，条数上限 EMBEDDING_CACHE_SIZE，
+按最近使用时间淘汰）和可选的 Redis 共享层（复用 src/cache.py 的客户端）。
+"""
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from ..cache import cache_embeddings, fetch_embeddings
+from ..config import settings
+
+
+class EmbeddingStore:
+    """
+    本地句向量存储
+
+    vectors.f16 为 capacity × dim 的 float16 内存映射文件，index.json 记录 键 -> 槽位，
+    recency.f64 记录各槽位最近一次读写的时间（读取时直接写入内存映射，不重写索引），
+    写满后淘汰最近使用时间最早的槽位，其他进程的读取同样计入。
+    多个进程共用同一目录时，读取持有共享文件锁、写入持有排他文件锁（读取期间槽位不会被改写），
+    并在索引文件变化后重新读取；同一进程内的多个识别线程通过线程锁串行访问索引。
+    """
+
+    def __init__(self, directory: str, capacity: int):
+        self.directory = directory
+        self.capacity = max(1, capacity)
+        self._index_path = os.path.join(directory, "index.json")
+        self._vectors_path = os.path.join(directory, "vectors.f16")
+        self._recency_path = os.path.join(directory, "recency.f64")
+        self._lock_path = os.path.join(directory, ".lock")
+
+        self.dim: Optional[int] = None
+        self._slots: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._recency: Optional[np.memmap] = None
+        self._index_mtime = 0.0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._reload()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """读取已缓存的向量（float16）"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock, self._locked(fcntl.LOCK_SH):
+            self._reload()
+            if self._vectors is None:
+                return found
+
+            now = time.time()
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is not None:
+                    found[key] = np.array(self._vectors[slot])
+                    self._recency[slot] = now
+        return found
+
+    def put_many(self, entries: Dict[str, np.ndarray]) -> None:
+        """写入向量，超出容量时复用最近使用时间最早的槽位"""
+        if not entries:
+            return
+
+        dim = len(next(iter(entries.values())))
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            self._reload()
+            if self.dim != dim:
+                # 首次写入或模型维度变化：重建存储
+                self._create(dim)
+
+            now = time.time()
+            victims = None
+            for key, vector in entries.items():
+                slot = self._slots.get(key)
+                if slot is None:
+                    if len(self._slots) < self.capacity:
+                        slot = len(self._slots)
+                    else:
+                        if victims is None:
+                            victims = iter([victim for victim in self._eviction_order() if victim not in entries])
+                        victim = next(victims, None)
+                        if victim is None:
+                            # 本批条数超过容量，其余条目不再写入
+                            break
+                        slot = self._slots.pop(victim)
+                    self._slots[key] = slot
+                self._vectors[slot] = vector
+                self._recency[slot] = now
+
+            self._vectors.flush()
+            self._recency.flush()
+            self._save_index()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _eviction_order(self) -> List[str]:
+        """已缓存的键，按最近使用时间从早到晚排列"""
+        keys = list(self._slots)
+        slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(keys))
+        return [keys[idx] for idx in np.argsort(self._recency[slots], kind="stable")]
+
+    @contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        """跨进程文件锁：读取用 LOCK_SH，写入用 LOCK_EX"""
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _create(self, dim: int) -> None:
+        self.dim = dim
+        self._slots = {}
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="w+", shape=(self.capacity, dim))
+        self._recency = np.memmap(self._recency_path, dtype=np.float64, mode="w+", shape=(self.capacity,))
+
+    def _reload(self) -> None:
+        """索引文件被其他进程更新时重新读取"""
+        try:
+            mtime = os.stat(self._index_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._index_mtime:
+            return
+
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("capacity") != self.capacity:
+                return
+            vectors = np.memmap(
+                self._vectors_path, dtype=np.float16, mode="r+", shape=(self.capacity, index["dim"])
+            )
+            recency = np.memmap(self._recency_path, dtype=np.float64, mode="r+", shape=(self.capacity,))
+        except (OSError, ValueError, KeyError) as error:
+            logger.warning(f"读取本地句向量缓存失败: {error}")
+            return
+
+        self.dim = index["dim"]
+        self._slots = {key: slot for key, slot in index["entries"]}
+        self._vectors = vectors
+        self._recency = recency
+        self._index_mtime = mtime
+
+    def _save_index(self) -> None:
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity, "entries": list(self._slots.items())}, f)
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.stat(self._index_path).st_mtime
+
+
+class EmbeddingCache:
+    """两级句向量缓存"""
+
+    # Redis 读写失败后暂停访问 Redis 的秒数
+    REDIS_RETRY_INTERVAL = 60
+
+    def __init__(self, directory: Optional[str] = None, max_size: Optional[int] = None):
+        self.store = EmbeddingStore(
+            directory or settings.EMBEDDING_CACHE_DIR,
+            max_size if max_size is not None else settings.EMBEDDING_CACHE_SIZE
+        )
+        self._redis_retry_at = 0.0
+
+    def key(self, model: str, context: str) -> str:
+        """上下文缓存键：内容哈希"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (model, str(settings.EMBEDDING_MAX_LENGTH), context):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        批量查询缓存
+
+        Args:
+            keys: 缓存键列表（不重复）
+
+        Returns:
+            命中的 {key: float16 向量}
+        """
+        try:
+            found = self.store.get_many(keys)
+        except OSError as error:
+            logger.warning(f"读取本地句向量缓存失败: {error}")
+            found = {}
+        missing = [key for key in keys if key not in found]
+
+        if missing and self._redis_available():
+            cached = fetch_embeddings(missing)
+            if cached is None:
+                self._redis_failed()
+            else:
+                from_redis = {
+                    key: np.frombuffer(base64.b64decode(encoded), dtype=np.float16)
+                    for key, encoded in zip(missing, cached) if encoded
+                }
+                self._store_put(from_redis)
+                found.update(from_redis)
+
+        return found
+
+    def put_many(self, entries: Dict[str, np.ndarray]) -> None:
+        """批量写入两级缓存（向量须为 float16）"""
+        self._store_put(entries)
+
+        if entries and self._redis_available():
+            encoded = {
+                key: base64.b64encode(np.asarray(vector, dtype=np.float16).tobytes()).decode("ascii")
+                for key, vector in entries.items()
+            }
+            if not cache_embeddings(encoded):
+                self._redis_failed()
+
+    def _store_put(self, entries: Dict[str, np.ndarray]) -> None:
+        try:
+            self.store.put_many(entries)
+        except OSError as error:
+            logger.warning(f"写入本地句向量缓存失败: {error}")
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self) -> None:
+        if settings.ENABLE_CACHE and settings.REDIS_URL:
+            logger.debug(f"Redis 句向量缓存不可用，{self.REDIS_RETRY_INTERVAL} 秒后重试")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
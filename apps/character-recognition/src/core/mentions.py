@@ -0,0 +1,148 @@
+"""提及列式存储
+
+MentionTable 按列保存提及：称呼编号、句子编号、全文起点、置信度和来源编号各为一个 NumPy 数组，
+称呼和来源字符串存入驻留表。每条提及约 25 字节（CharacterMention 对象为数百字节）；
+人物合并和章节统计按称呼分组（bincount / 排序）计算，耗时随不同称呼数而不是提及数增长。
+行顺序即原提及列表的顺序，合并时的并列取舍与逐条处理提及时一致。
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from ..models.character import CharacterMention
+
+
+# 别名规则生成的提及不指定置信度和来源，沿用 CharacterMention 的默认值
+DEFAULT_CONFIDENCE = CharacterMention.model_fields["confidence"].default
+DEFAULT_SOURCE = CharacterMention.model_fields["source"].default
+
+
+class MentionTable:
+    """提及表（构建后不再修改）"""
+
+    def __init__(
+        self,
+        names: Sequence[str] = (),
+        name_ids: Optional[np.ndarray] = None,
+        sent_ids: Optional[np.ndarray] = None,
+        starts: Optional[np.ndarray] = None,
+        confidences: Optional[np.ndarray] = None,
+        sources: Sequence[str] = (),
+        source_ids: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            names: 称呼驻留表，name_ids 为其下标
+            name_ids / sent_ids / starts / confidences / source_ids: 等长的列，每行一次提及
+            sources: 来源驻留表，source_ids 为其下标
+        """
+        self.names: List[str] = list(names)
+        self.sources: List[str] = list(sources)
+        self.name_ids = _column(name_ids, np.int32)
+        self.sent_ids = _column(sent_ids, np.int32)
+        self.starts = _column(starts, np.int64)
+        self.confidences = _column(confidences, np.float64)
+        self.source_ids = _column(source_ids, np.int8)
+
+        self._sentences_by_name: Optional[List[np.ndarray]] = None
+
+    @classmethod
+    def from_mentions(cls, mentions: Iterable[CharacterMention]) -> "MentionTable":
+        """由 CharacterMention 列表构建"""
+        names: Dict[str, int] = {}
+        sources: Dict[str, int] = {}
+        rows = []
+        for mention in mentions:
+            name_id = names.setdefault(mention.text, len(names))
+            source_id = sources.setdefault(mention.source, len(sources))
+            rows.append((name_id, mention.sent_id, mention.start, mention.confidence, source_id))
+
+        columns = list(zip(*rows)) if rows else [()] * 5
+        return cls(
+            list(names),
+            np.array(columns[0]), np.array(columns[1]), np.array(columns[2]), np.array(columns[3]),
+            list(sources), np.array(columns[4])
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence["MentionTable"]) -> "MentionTable":
+        """按顺序拼接多个提及表，称呼与来源合并为同一个驻留表"""
+        names: Dict[str, int] = {}
+        sources: Dict[str, int] = {}
+        name_ids, source_ids = [], []
+
+        for table in tables:
+            name_map = np.array([names.setdefault(name, len(names)) for name in table.names], dtype=np.int32)
+            source_map = np.array([sources.setdefault(src, len(sources)) for src in table.sources], dtype=np.int8)
+            name_ids.append(name_map[table.name_ids] if len(table) else table.name_ids)
+            source_ids.append(source_map[table.source_ids] if len(table) else table.source_ids)
+
+        return cls(
+            list(names),
+            np.concatenate(name_ids) if tables else None,
+            np.concatenate([table.sent_ids for table in tables]) if tables else None,
+            np.concatenate([table.starts for table in tables]) if tables else None,
+            np.concatenate([table.confidences for table in tables]) if tables else None,
+            list(sources),
+            np.concatenate(source_ids) if tables else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.name_ids)
+
+    def to_mentions(self) -> List[CharacterMention]:
+        """转换为 CharacterMention 列表"""
+        names, sources = self.names, self.sources
+        return [
+            CharacterMention(
+                text=names[name_id],
+                start=start,
+                end=start + len(names[name_id]),
+                sent_id=sent_id,
+                confidence=confidence,
+                source=sources[source_id]
+            )
+            for name_id, sent_id, start, confidence, source_id in zip(
+                self.name_ids.tolist(), self.sent_ids.tolist(), self.starts.tolist(),
+                self.confidences.tolist(), self.source_ids.tolist()
+            )
+        ]
+
+    # ===== 按称呼分组的统计 =====
+    def name_counts(self) -> np.ndarray:
+        """每个称呼的提及次数"""
+        return np.bincount(self.name_ids, minlength=len(self.names))
+
+    def present_names(self) -> List[int]:
+        """有提及的称呼编号，按首次出现的先后排列"""
+        if not len(self):
+            return []
+        unique, first = np.unique(self.name_ids, return_index=True)
+        return unique[np.argsort(first, kind="stable")].tolist()
+
+    def min_starts(self) -> np.ndarray:
+        """每个称呼最早一次提及的全文起点（没有提及的称呼为 int64 最大值）"""
+        result = np.full(len(self.names), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(result, self.name_ids, self.starts)
+        return result
+
+    def sentence_ids(self, name_ids: Sequence[int]) -> np.ndarray:
+        """一组称呼的全部提及所在的句子编号（去重、升序）"""
+        if self._sentences_by_name is None:
+            order = np.lexsort((self.sent_ids, self.name_ids))
+            bounds = np.searchsorted(self.name_ids[order], np.arange(len(self.names) + 1))
+            sorted_sents = self.sent_ids[order]
+            self._sentences_by_name = [
+                sorted_sents[bounds[idx]:bounds[idx + 1]] for idx in range(len(self.names))
+            ]
+
+        parts = [self._sentences_by_name[name_id] for name_id in name_ids]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(parts))
+
+
+def _column(values: Optional[np.ndarray], dtype: type) -> np.ndarray:
+    if values is None:
+        return np.empty(0, dtype=dtype)
+    return np.asarray(values, dtype=dtype).reshape(-1)
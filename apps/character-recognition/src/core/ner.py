@@ -1,207 +1,330 @@
-"""基于 Jieba 的 NER 人名识别模块"""
+"""NER 人名识别模块"""
 import re
-from typing import Callable, List, Dict, Any, Optional, Tuple
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Sized, Tuple, Union
 from collections import defaultdict
+import numpy as np
 from loguru import logger
 
-from ..config import settings
 from ..models.character import CharacterMention
+from ..config import settings
+from .alias_index import AliasIndex
+from .mentions import MentionTable
+from .ner_cache import NERCache
+from .ner_engines import EntitySpan, NEREngine, create_engine, is_likely_name
 
 
-class NERRecognizer:
-    """基于 Jieba 的人名识别器"""
+# 句子分隔符
+SENTENCE_SPLIT_PATTERN = re.compile(r'[。！？；]')
+
+
+class NameHits:
+    """
+    候选人名命中记录
+
+    counts 为规则命中次数（同一个词被多条规则命中时累加，用于频次过滤和置信度），
+    positions 按名字紧凑存储每次出现的位置：array 中依次为 sent_id, start, sent_id, start...
+    cache_hits / cache_misses 为句子级 NER 缓存的命中与未命中句数。
+    """
 
     def __init__(self):
-        self.model = None
+        self.counts: Dict[str, int] = {}
+        self.positions: Dict[str, array] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, name: str, sent_id: int, start: int, weight: int) -> None:
+        """记录一次出现"""
+        if name not in self.counts:
+            self.counts[name] = 0
+            self.positions[name] = array('q')
+        self.counts[name] += weight
+        self.positions[name].extend((sent_id, start))
+
+    def merge(self, other: "NameHits", sent_offset: int = 0, char_offset: int = 0) -> None:
+        """合并另一个分片的命中记录，并把位置换算为全书编号"""
+        for name, count in other.counts.items():
+            if name not in self.counts:
+                self.counts[name] = 0
+                self.positions[name] = array('q')
+            self.counts[name] += count
+
+            shifted = array('q', other.positions[name])
+            for idx in range(0, len(shifted), 2):
+                shifted[idx] += sent_offset
+                shifted[idx + 1] += char_offset
+            self.positions[name].extend(shifted)
+
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+
+    def cache_stats(self) -> Dict[str, int]:
+        """NER 缓存命中统计，用于阶段数据"""
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+class NERRecognizer:
+    """
+    人名识别器
+
+    按 settings.NER_BATCH_SIZE 把句子分批交给 NER 引擎（Jieba / HanLP / 规则），
+    再把引擎返回的句内片段换算为全文位置并统计频次。
+    """
+
+    def __init__(self, engine: Optional[NEREngine] = None):
+        self.engine = engine or create_engine()
         self._initialized = False
 
-        # 动态角色名字典（运行时发现的角色名）
-        self.discovered_names = set()
-
-        # 通用中文人名模式识别规则
-        self.name_patterns = [
-            # 中文姓氏 + 名字模式
-            r'^[赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦尤许何吕施张孔曹严华金魏陶姜戚谢邹喻柏水窦章云苏潘葛奚范彭郎鲁韦昌马苗凤花方俞任袁柳唐罗薛伍余米贝姚孟顾尹姜邵湛汪祁毛禹狄米贝明臧计伏成戴谈宋茅庞熊纪舒屈项祝董梁杜][一-龯]{1,2}$',
-            # 常见称呼后缀模式
-            r'^[一-龯]{1,3}[娘父母儿子女哥姐弟妹][一-龯]*$',
-            # 重复姓氏模式（如：李李、王王）
-            r'^([赵钱孙李周吴郑王冯陈])\1$',
-        ]
-
-        # 中文姓氏（常见200个）
-        self.common_surnames = set([
-            "赵", "钱", "孙", "李", "周", "吴", "郑", "王", "冯", "陈",
-            "褚", "卫", "蒋", "沈", "韩", "杨", "朱", "秦", "尤", "许",
-            "何", "吕", "施", "张", "孔", "曹", "严", "华", "金", "魏",
-            "陶", "姜", "戚", "谢", "邹", "喻", "柏", "水", "窦", "章",
-            "云", "苏", "潘", "葛", "奚", "范", "彭", "郎", "鲁", "韦",
-            "昌", "马", "苗", "凤", "花", "方", "俞", "任", "袁", "柳",
-            "唐", "罗", "薛", "伍", "余", "米", "贝", "姚", "孟", "顾",
-            "尹", "姜", "邵", "湛", "汪", "祁", "毛", "禹", "狄", "米",
-            "贝", "明", "臧", "计", "伏", "成", "戴", "谈", "宋", "茅",
-            "庞", "熊", "纪", "舒", "屈", "项", "祝", "董", "梁", "杜",
-        ])
+        # 句子级结果缓存，未命中的句子才交给引擎
+        self.cache = NERCache() if settings.NER_CACHE_ENABLED else None
 
     def initialize(self):
-        """初始化 Jieba 分词器"""
+        """初始化 NER 引擎"""
         if self._initialized:
             return
 
-        try:
-            import jieba
-            import jieba.posseg as pseg
+        logger.info(f"正在初始化 NER 引擎: {self.engine.name}")
+        self.engine.initialize()
+        self._initialized = True
+
+    def recognize(
+        self,
+        text: Union[str, Iterable[str]],
+        callback: Optional[Callable] = None,
+        on_sentence: Optional[Callable[[int], None]] = None,
+        offsets: Optional[Sequence[int]] = None
+    ) -> List[CharacterMention]:
+        """
+        人名识别
 
-            logger.info("正在初始化通用 Jieba 分词器...")
+        Args:
+            text: 输入文本，或已分好的句子序列（可以是流式生成器）
+            callback: 进度回调函数
+            on_sentence: 逐句回调，参数为已处理的句子数
+            offsets: 每个句子在清洗后全文中的起始位置，见 count_names
 
-            # 优化 Jieba 设置以提高人名识别
-            # 调整分词粒度，有助于人名识别
-            jieba.enable_parallel(4)  # 启用并行分词
-            jieba.setLogLevel(jieba.logging.INFO)  # 设置日志级别
+        Returns:
+            List[CharacterMention]: 逐次出现的角色提及列表
+        """
+        if not self._initialized:
+            self.initialize()
 
-            # 初始化 Jieba（触发词典构建）
-            test_text = "测试初始化"
-            list(jieba.cut(test_text))
+        if callback:
+            callback(0, f"开始 {self.engine.name} 角色识别...")
 
-            self.model = jieba
-            self.posseg = pseg
-            self._initialized = True
+        hits = self.count_names(text, offsets=offsets, callback=callback, on_sentence=on_sentence)
 
-            logger.info("通用 Jieba 分词器初始化完成")
+        if callback:
+            callback(100, "角色识别完成")
 
-        except ImportError:
-            logger.error("Jieba 未安装，请运行: pip install jieba")
-            raise
-        except Exception as e:
-            logger.error(f"Jieba 初始化失败: {e}")
-            raise
+        mentions = self.build_mentions(hits)
 
-    def recognize(self, text: str, callback: Optional[Callable] = None) -> List[CharacterMention]:
+        logger.info(f"{self.engine.name} 识别完成，共 {len(mentions)} 次角色提及")
+        return mentions
+
+    def count_names(
+        self,
+        text: Union[str, Iterable[str]],
+        offsets: Optional[Sequence[int]] = None,
+        callback: Optional[Callable] = None,
+        on_sentence: Optional[Callable[[int], None]] = None,
+        book_state: Optional[Any] = None,
+        lexicon: Sequence[str] = ()
+    ) -> NameHits:
         """
-        使用 Jieba 进行人名识别
+        统计候选人名及其出现位置（不做频次过滤）
+
+        分片识别时各分片分别统计，汇总后再统一调用 build_mentions，
+        保证频次阈值作用在全书计数上，结果与串行一致。
 
         Args:
-            text: 输入文本
+            text: 输入文本，或已分好的句子序列（可以是流式生成器）
+            offsets: 每个句子在清洗后全文中的起始位置；流式处理时该序列与句子同步增长。
+                不提供时位置为句内偏移
             callback: 进度回调函数
+            on_sentence: 逐句回调，参数为已处理的句子数
+            book_state: 增量识别状态（src/incremental.BookState），提供时只识别没有历史结果的句子
+            lexicon: 本书的人名词典（src/lexicon.NameLexicon.names），只对需要识别且包含其中人名的句子
+                写入引擎的用户词典
 
         Returns:
-            List[CharacterMention]: 识别到的角色提及列表
+            NameHits，名字按首次出现顺序排列
         """
         if not self._initialized:
             self.initialize()
 
-        if callback:
-            callback(0, "开始 Jieba 角色识别...")
+        hits = NameHits()
+
+        # 分句处理，提高识别准确率；句子序列可能是流式生成器，总数未知
+        sentences = self._split_sentences(text) if isinstance(text, str) else text
+        total_sentences = len(sentences) if isinstance(sentences, Sized) else 0
 
-        mentions = []
-        character_counts = defaultdict(int)
+        # 攒满一个窗口再交给引擎；句子流是生成器时，第 i 句的偏移在取到该句时已就绪
+        window = self.engine.batch_window
+        batch: List[Tuple[int, str]] = []
+        consumed = 0
 
-        # 分句处理，提高识别准确率
-        sentences = self._split_sentences(text)
-        total_sentences = len(sentences)
+        lexicon_index = AliasIndex({name: name for name in lexicon}) if lexicon and self.engine.uses_lexicon else None
 
         for i, sentence in enumerate(sentences):
-            if not sentence.strip():
-                continue
+            consumed = i + 1
+            if sentence.strip():
+                batch.append((i, sentence))
+
+            if len(batch) >= window:
+                self._recognize_batch(batch, hits, offsets, book_state, lexicon_index)
+                batch = []
+
+                if on_sentence:
+                    on_sentence(consumed)
+                if callback and total_sentences:
+                    progress = int((i / total_sentences) * 100)
+                    callback(progress, f"处理第 {consumed}/{total_sentences} 句...")
+
+        if batch:
+            self._recognize_batch(batch, hits, offsets, book_state, lexicon_index)
+        if on_sentence and consumed:
+            on_sentence(consumed)
+
+        return hits
+
+    def _recognize_batch(
+        self,
+        batch: List[Tuple[int, str]],
+        hits: NameHits,
+        offsets: Optional[Sequence[int]],
+        book_state: Optional[Any] = None,
+        lexicon_index: Optional[AliasIndex] = None
+    ) -> None:
+        """识别一批 (sent_id, sentence)，把句内片段换算为全文位置后记入 hits"""
+        sentences = [sentence for _, sentence in batch]
+        if book_state is not None:
+            results = book_state.ner_spans(sentences, lambda missing: self._tag(missing, hits, lexicon_index))
+        else:
+            results = self._tag(sentences, hits, lexicon_index)
+
+        for (sent_id, _), spans in zip(batch, results):
+            base = offsets[sent_id] if offsets is not None else 0
+            for span in spans:
+                hits.add(span.text, sent_id, base + span.start, span.weight)
+
+    def _tag(
+        self,
+        sentences: List[str],
+        hits: NameHits,
+        lexicon_index: Optional[AliasIndex] = None
+    ) -> List[Sequence[EntitySpan]]:
+        """对句子执行 NER（有缓存时先查缓存）"""
+        matched = [self._lexicon_names(sentence, lexicon_index) for sentence in sentences]
+        if self.cache is None:
+            return self._run_engine(sentences, matched)
+        return self._recognize_cached(sentences, matched, hits)
+
+    def _recognize_cached(
+        self,
+        sentences: List[str],
+        matched: List[Tuple[str, ...]],
+        hits: NameHits
+    ) -> List[Sequence[EntitySpan]]:
+        """先查缓存，只把未命中的句子（批内去重）交给引擎；句中的词典人名计入缓存键"""
+        keys = [self.cache.key(self.engine, sentence, names) for sentence, names in zip(sentences, matched)]
+        unique_keys = list(dict.fromkeys(keys))
+
+        found, _ = self.cache.get_many(unique_keys)
+        missing = [key for key in unique_keys if key not in found]
+
+        if missing:
+            item_of = dict(zip(keys, zip(sentences, matched)))
+            computed = self._run_engine(
+                [item_of[key][0] for key in missing], [item_of[key][1] for key in missing]
+            )
+            entries = {key: tuple(spans) for key, spans in zip(missing, computed)}
+            self.cache.put_many(entries)
+            found.update(entries)
+
+        hits.cache_hits += len(keys) - len(missing)
+        hits.cache_misses += len(missing)
+
+        return [found[key] for key in keys]
+
+    def _run_engine(self, sentences: List[str], matched: List[Tuple[str, ...]]) -> List[Sequence[EntitySpan]]:
+        """
+        调用引擎识别
 
-            if callback and i % 10 == 0:
-                progress = int((i / total_sentences) * 100)
-                callback(progress, f"处理第 {i+1}/{total_sentences} 句...")
-
-            # 方法1：Jieba 词性标注识别人名
-            words_with_pos = self.posseg.cut(sentence)
-            for word, flag in words_with_pos:
-                if 'nr' in str(flag) and len(word) >= 2 and len(word) <= 4:
-                    character_counts[word] += 1
-                    self.discovered_names.add(word)  # 动态记录发现的人名
-
-            # 方法2：正则表达式识别对话中的角色
-            dialogue_matches = re.findall(r'([一-龯]{2,4})(?:说|道|笑|看|想|叫|喊|问|答|曰)', sentence)
-            for name in dialogue_matches:
-                if len(name) >= 2 and len(name) <= 4:
-                    character_counts[name] += 1
-                    self.discovered_names.add(name)  # 动态记录发现的人名
-
-            # 方法3：通用中文人名模式识别
-            words = list(self.model.cut(sentence))
-            for word in words:
-                if (len(word) >= 2 and len(word) <= 4 and
-                    re.match(r'^[一-龯]+$', word) and  # 纯中文字符
-                    word not in ['这个', '那个', '什么', '怎么', '为什么', '因为', '所以', '但是', '然后', '接着', '最后', '没有', '一样', '还有', '可以', '应该', '已经', '正在']):
-
-                    # 检查是否符合人名模式
-                    if self._is_likely_name(word):
-                        character_counts[word] += 1
-                        self.discovered_names.add(word)  # 动态记录发现的人名
+        不含词典人名的句子直接识别；含词典人名的句子另成一批，只启用其中出现的人名，
+        缩短修改引擎词典期间其他线程的等待。
+        """
+        results: List[Sequence[EntitySpan]] = [()] * len(sentences)
+        plain = [idx for idx, names in enumerate(matched) if not names]
+        seeded = [idx for idx, names in enumerate(matched) if names]
+
+        if plain:
+            for idx, spans in zip(plain, self.engine.recognize_batch([sentences[idx] for idx in plain])):
+                results[idx] = spans
+
+        if seeded:
+            names = sorted({name for idx in seeded for name in matched[idx]})
+            with self.engine.use_lexicon(names):
+                computed = self.engine.recognize_batch([sentences[idx] for idx in seeded])
+            for idx, spans in zip(seeded, computed):
+                results[idx] = spans
+
+        return results
+
+    @staticmethod
+    def _lexicon_names(sentence: str, lexicon_index: Optional[AliasIndex]) -> Tuple[str, ...]:
+        """句中出现的词典人名（去重、排序）"""
+        if lexicon_index is None:
+            return ()
+        return tuple(sorted({hit.alias for hit in lexicon_index.find(sentence)}))
+
+    def build_mentions(self, hits: NameHits) -> List[CharacterMention]:
+        """将命中记录转换为逐次出现的 CharacterMention 列表"""
+        return self.build_table(hits).to_mentions()
+
+    def build_table(self, hits: NameHits) -> MentionTable:
+        """
+        将命中记录转换为列式提及表
 
-        if callback:
-            callback(100, "角色识别完成")
+        频次不足 2 的名字不保留；置信度随出现频率提高。行顺序与 build_mentions 相同。
+        """
+        names: List[str] = []
+        positions: List[np.ndarray] = []
+        confidences: List[float] = []
 
-        # 转换为 CharacterMention 对象
-        for name, count in character_counts.items():
-            if count >= 2:  # 至少出现2次
-                importance = "高" if count > 10 else "中" if count > 3 else "低"
-
-                mention = CharacterMention(
-                    text=name,
-                    start_pos=0,  # Jieba 不提供位置信息
-                    end_pos=len(name),
-                    confidence=min(0.9, 0.5 + count * 0.01),  # 基于出现频率的置信度
-                    source="jieba_ner"
-                )
-                mentions.append(mention)
-
-        logger.info(f"Jieba 识别完成，共识别到 {len(mentions)} 个角色提及")
-        return mentions
+        for name, count in hits.counts.items():
+            if count < 2:  # 至少出现2次
+                continue
+            names.append(name)
+            positions.append(np.frombuffer(hits.positions[name], dtype=np.int64).reshape(-1, 2))
+            confidences.append(min(0.9, 0.5 + count * 0.01))  # 基于出现频率的置信度
+
+        if not names:
+            return MentionTable()
+
+        sizes = [len(rows) for rows in positions]
+        stacked = np.concatenate(positions)
+        return MentionTable(
+            names,
+            np.repeat(np.arange(len(names)), sizes),
+            stacked[:, 0],
+            stacked[:, 1],
+            np.repeat(confidences, sizes),
+            [self.engine.source],
+            np.zeros(len(stacked))
+        )
 
     def _is_likely_name(self, word: str) -> bool:
         """判断一个词是否可能是人名（通用规则）"""
-        if len(word) < 2 or len(word) > 4:
-            return False
-
-        # 规则1：检查是否符合预设的人名模式
-        for pattern in self.name_patterns:
-            if re.match(pattern, word):
-                return True
-
-        # 规则2：首字是常见姓氏
-        if word[0] in self.common_surnames:
-            return True
-
-        # 规则3：包含称呼后缀，但不是单纯的描述词
-        if word.endswith(('娘', '父', '母', '儿', '子', '哥', '姐', '弟', '妹', '公', '伯', '叔', '姨', '舅')):
-            # 排除明显不是人名的词
-            non_names = {'这个', '那个', '所有', '任何', '每个', '你们', '我们', '他们', '自己', '大家', '宝宝', '亲爱的', '朋友', '同学'}
-            if word not in non_names:
-                return True
-
-        # 规则4：避免常见的非人名词
-        non_human_words = {
-            '什么', '怎么', '为什么', '哪里', '什么时候', '哪个', '如何',
-            '工作', '学习', '生活', '时间', '地方', '东西', '事情', '问题',
-            '方法', '方式', '情况', '条件', '结果', '开始', '结束', '过程',
-            '今天', '明天', '昨天', '上午', '下午', '晚上', '早上', '中午', '晚上',
-            '这里', '那里', '哪里', '到处', '各处', '随处', '家中', '家里', '门外',
-            '地上', '天上', '水中', '口中', '眼中', '心中', '手里', '头里'
-        }
-        if word in non_human_words:
-            return False
-
-        # 规则5：连续的汉字，可能是人名
-        if re.match(r'^[一-龯]{2,4}$', word):
-            # 进一步检查，避免常见的功能词
-            common_function_words = {
-                '开始', '结束', '继续', '停止', '进行', '完成', '通过', '获得',
-                '实现', '达到', '满足', '超过', '少于', '等于', '大于', '小于'
-            }
-            if word not in common_function_words:
-                return True
-
-        return False
+        return is_likely_name(word)
 
     def _split_sentences(self, text: str) -> List[str]:
         """将文本分割为句子"""
         # 使用中文标点符号分割句子
-        sentences = re.split(r'[。！？；]', text)
+        sentences = SENTENCE_SPLIT_PATTERN.split(text)
         return [s.strip() for s in sentences if s.strip()]
 
     def get_character_statistics(self, text: str) -> Dict[str, Any]:
@@ -210,8 +333,10 @@ class NERRecognizer:
 
         # 统计角色出现次数
         character_stats = defaultdict(int)
+        confidences = {}
         for mention in mentions:
             character_stats[mention.text] += 1
+            confidences[mention.text] = mention.confidence
 
         # 生成统计结果
         results = []
@@ -222,8 +347,8 @@ class NERRecognizer:
                 "name": name,
                 "appearance_count": count,
                 "importance": importance,
-                "confidence": next(m.confidence for m in mentions if m.text == name),
-                "source": "jieba_ner"
+                "confidence": confidences[name],
+                "source": self.engine.source
             }
             results.append(result)
 
@@ -0,0 +1,109 @@
+"""句子级 NER 结果缓存
+
+缓存键为 (句子文本, 引擎名称, 引擎版本, 词典指纹, 句中出现的书籍词典人名) 的内容哈希，值为引擎返回的句内人名片段。
+书籍人名词典只影响包含其中人名的句子，其他句子在不同书籍、词典变化前后共用同一个键。
+片段使用句内偏移，与句子在书中的位置无关，因此不同书籍的相同句子、重新上传的同一本书都能复用。
+两级缓存：进程内 LRU 和 Redis（复用 src/cache.py 的客户端）。
+进程内 LRU 由执行池中的多个识别线程共用，读写在锁内进行；访问 Redis 时不持锁。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from ..cache import cache_ner_spans, fetch_ner_spans
+from ..config import settings
+from .ner_engines import EntitySpan, NEREngine
+
+
+class NERCache:
+    """两级句子级 NER 缓存"""
+
+    # Redis 读写失败后暂停访问 Redis 的秒数，避免每个批次都等待连接超时
+    REDIS_RETRY_INTERVAL = 60
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size if max_size is not None else settings.NER_CACHE_SIZE
+        self._entries: "OrderedDict[str, Tuple[EntitySpan, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis_retry_at = 0.0
+
+    def key(self, engine: NEREngine, sentence: str, lexicon_names: Sequence[str] = ()) -> str:
+        """句子缓存键：内容哈希；lexicon_names 为识别时启用的、句中出现的书籍词典人名"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (engine.name, engine.version, engine.fingerprint, "\x1f".join(lexicon_names), sentence):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Tuple[Dict[str, Tuple[EntitySpan, ...]], int]:
+        """
+        批量查询缓存
+
+        Args:
+            keys: 缓存键列表（不重复）
+
+        Returns:
+            (命中的 {key: 片段}, 其中来自 Redis 的条数)
+        """
+        found: Dict[str, Tuple[EntitySpan, ...]] = {}
+        missing: List[str] = []
+
+        with self._lock:
+            for key in keys:
+                spans = self._entries.get(key)
+                if spans is None:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = spans
+
+        redis_hits = 0
+        if missing and self._redis_available():
+            cached = fetch_ner_spans(missing)
+            if cached is None:
+                self._redis_failed()
+            else:
+                for key, raw in zip(missing, cached):
+                    if raw is not None:
+                        spans = tuple(EntitySpan(*item) for item in raw)
+                        self._remember(key, spans)
+                        found[key] = spans
+                        redis_hits += 1
+
+        return found, redis_hits
+
+    def put_many(self, entries: Dict[str, Tuple[EntitySpan, ...]]) -> None:
+        """批量写入两级缓存"""
+        for key, spans in entries.items():
+            self._remember(key, spans)
+
+        if entries and self._redis_available():
+            if not cache_ner_spans({key: [list(span) for span in spans] for key, spans in entries.items()}):
+                self._redis_failed()
+
+    def clear(self) -> None:
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, key: str, spans: Tuple[EntitySpan, ...]) -> None:
+        with self._lock:
+            self._entries[key] = spans
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self) -> None:
+        if settings.ENABLE_CACHE and settings.REDIS_URL:
+            logger.debug(f"Redis NER 缓存不可用，{self.REDIS_RETRY_INTERVAL} 秒后重试")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
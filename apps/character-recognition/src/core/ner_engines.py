@@ -0,0 +1,812 @@
+"""NER 引擎
+
+引擎只负责识别一批句子中的人名片段（句内偏移），分批、句子编号、全文偏移、
+频次统计和提及生成统一由 NERRecognizer 处理。引擎通过 settings.NER_ENGINE 选择。
+"""
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from loguru import logger
+
+from ..config import settings
+
+
+# 通用中文人名模式识别规则（模块加载时编译一次）
+NAME_PATTERNS = [
+    # 中文姓氏 + 名字模式
+    re.compile(r'^[赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦尤许何吕施张孔曹严华金魏陶姜戚谢邹喻柏水窦章云苏潘葛奚范彭郎鲁韦昌马苗凤花方俞任袁柳唐罗薛伍余米贝姚孟顾尹姜邵湛汪祁毛禹狄米贝明臧计伏成戴谈宋茅庞熊纪舒屈项祝董梁杜][一-龯]{1,2}$'),
+    # 常见称呼后缀模式
+    re.compile(r'^[一-龯]{1,3}[娘父母儿子女哥姐弟妹][一-龯]*$'),
+    # 重复姓氏模式（如：李李、王王）
+    re.compile(r'^([赵钱孙李周吴郑王冯陈])\1$'),
+]
+
+# 纯中文词
+CJK_WORD_PATTERN = re.compile(r'^[一-龯]+$')
+
+# 中文姓氏（常见200个）
+COMMON_SURNAMES = frozenset([
+    "赵", "钱", "孙", "李", "周", "吴", "郑", "王", "冯", "陈",
+    "褚", "卫", "蒋", "沈", "韩", "杨", "朱", "秦", "尤", "许",
+    "何", "吕", "施", "张", "孔", "曹", "严", "华", "金", "魏",
+    "陶", "姜", "戚", "谢", "邹", "喻", "柏", "水", "窦", "章",
+    "云", "苏", "潘", "葛", "奚", "范", "彭", "郎", "鲁", "韦",
+    "昌", "马", "苗", "凤", "花", "方", "俞", "任", "袁", "柳",
+    "唐", "罗", "薛", "伍", "余", "米", "贝", "姚", "孟", "顾",
+    "尹", "姜", "邵", "湛", "汪", "祁", "毛", "禹", "狄", "米",
+    "贝", "明", "臧", "计", "伏", "成", "戴", "谈", "宋", "茅",
+    "庞", "熊", "纪", "舒", "屈", "项", "祝", "董", "梁", "杜",
+])
+
+# 对话动词：候选名后紧跟以这些字开头的词时视为说话人
+DIALOGUE_VERBS = frozenset(["说", "道", "笑", "看", "想", "叫", "喊", "问", "答", "曰"])
+
+# 方法3 中直接排除的常见虚词
+STOP_WORDS = frozenset([
+    '这个', '那个', '什么', '怎么', '为什么', '因为', '所以', '但是', '然后',
+    '接着', '最后', '没有', '一样', '还有', '可以', '应该', '已经', '正在',
+])
+
+# 称呼后缀
+NAME_SUFFIXES = ('娘', '父', '母', '儿', '子', '哥', '姐', '弟', '妹', '公', '伯', '叔', '姨', '舅')
+
+# 带称呼后缀但明显不是人名的词
+NON_NAMES = frozenset([
+    '这个', '那个', '所有', '任何', '每个', '你们', '我们', '他们', '自己',
+    '大家', '宝宝', '亲爱的', '朋友', '同学',
+])
+
+# 常见的非人名词
+NON_HUMAN_WORDS = frozenset([
+    '什么', '怎么', '为什么', '哪里', '什么时候', '哪个', '如何',
+    '工作', '学习', '生活', '时间', '地方', '东西', '事情', '问题',
+    '方法', '方式', '情况', '条件', '结果', '开始', '结束', '过程',
+    '今天', '明天', '昨天', '上午', '下午', '晚上', '早上', '中午',
+    '这里', '那里', '到处', '各处', '随处', '家中', '家里', '门外',
+    '地上', '天上', '水中', '口中', '眼中', '心中', '手里', '头里',
+])
+
+# 常见功能词
+COMMON_FUNCTION_WORDS = frozenset([
+    '开始', '结束', '继续', '停止', '进行', '完成', '通过', '获得',
+    '实现', '达到', '满足', '超过', '少于', '等于', '大于', '小于',
+])
+
+
+@lru_cache(maxsize=65536)
+def is_likely_name(word: str) -> bool:
+    """判断一个词是否可能是人名（通用规则，结果只与词本身有关，可缓存）"""
+    if len(word) < 2 or len(word) > 4:
+        return False
+
+    # 规则1：检查是否符合预设的人名模式
+    for pattern in NAME_PATTERNS:
+        if pattern.match(word):
+            return True
+
+    # 规则2：首字是常见姓氏
+    if word[0] in COMMON_SURNAMES:
+        return True
+
+    # 规则3：包含称呼后缀，但不是单纯的描述词
+    if word.endswith(NAME_SUFFIXES) and word not in NON_NAMES:
+        return True
+
+    # 规则4：避免常见的非人名词
+    if word in NON_HUMAN_WORDS:
+        return False
+
+    # 规则5：连续的汉字（长度已在上面限定为 2~4），避免常见的功能词
+    if CJK_WORD_PATTERN.match(word) and word not in COMMON_FUNCTION_WORDS:
+        return True
+
+    return False
+
+
+class EntitySpan(NamedTuple):
+    """句内人名片段；weight 为命中的规则数，用于频次统计"""
+    text: str
+    start: int
+    end: int
+    weight: int = 1
+
+
+# 规则引擎和 HanLP 结果共用的非人名词
+EXCLUDE_WORDS = frozenset([
+    "这个", "那个", "什么", "怎么", "为什么", "如何",
+    "现在", "以前", "后来", "当时", "今天", "明天", "昨天",
+    "我们", "你们", "他们", "她们", "它们",
+    "自己", "别人", "大家", "所有",
+])
+
+# 常见名字用字
+NAME_CHARS = frozenset("文武德明华英国建立志强勇刚伟强秀兰芳丽娟红梅")
+
+
+def is_valid_name(name: str) -> bool:
+    """判断是否是有效的名字（长度与常见非人名词检查）"""
+    if len(name) < settings.NAME_MIN_LENGTH or len(name) > settings.NAME_MAX_LENGTH:
+        return False
+    return name not in EXCLUDE_WORDS
+
+
+class NEREngine(ABC):
+    """
+    NER 引擎接口
+
+    recognize_batch 接收一批句子，返回与之一一对应的人名片段列表。
+    batch_window 为 NERRecognizer 每次交给引擎的句子数，引擎可以在窗口内自行重排和分批。
+    """
+
+    name = "base"
+    version = "1"
+
+    # 是否使用书籍人名词典（见 src/lexicon.py）
+    uses_lexicon = False
+
+    @property
+    def source(self) -> str:
+        """提及来源标记"""
+        return f"{self.name}_ner"
+
+    @property
+    def batch_window(self) -> int:
+        return max(1, settings.NER_BATCH_SIZE)
+
+    @property
+    def fingerprint(self) -> str:
+        """词典 / 模型指纹：影响识别结果的外部资源变化时随之变化，用作缓存键的一部分"""
+        return ""
+
+    def initialize(self) -> None:
+        """加载模型或词典"""
+
+    @contextmanager
+    def use_lexicon(self, names: Sequence[str]) -> Iterator[None]:
+        """
+        识别期间启用书籍人名词典中的人名；默认引擎不使用词典
+
+        使用词典的引擎须保证：不包含这些人名的句子，识别结果与未启用词典时相同。
+        NERRecognizer 只对包含词典人名的句子启用词典，并把句中的词典人名计入缓存键。
+        """
+        yield
+
+    @staticmethod
+    def _file_fingerprint(path: str, *extra: str) -> str:
+        """文件路径、大小和修改时间组成的指纹"""
+        try:
+            stat = os.stat(path)
+            parts = [path, str(stat.st_size), str(int(stat.st_mtime))]
+        except OSError:
+            parts = [path]
+        return ":".join([*parts, *extra])
+
+    @abstractmethod
+    def recognize_batch(self, sentences: List[str]) -> List[List[EntitySpan]]:
+        """
+        识别一批句子中的人名
+
+        Args:
+            sentences: 句子列表
+
+        Returns:
+            每个句子的人名片段列表（句内偏移）
+        """
+
+
+class _DictionaryLock:
+    """
+    Jieba 词典的读写锁
+
+    Jieba 词典是进程内全局状态：分词可以多个线程同时进行（共享），
+    写入书籍人名到分词结束、恢复原词典期间独占，避免其他请求看到临时加入的人名。
+    持有独占锁的线程内分词不再等待共享锁；有线程等待独占锁时，新的共享请求排在其后。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._waiting_writers = 0
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        if self._writer == threading.get_ident():
+            yield
+            return
+
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
+
+
+_JIEBA_DICT_LOCK = _DictionaryLock()
+
+
+class JiebaEngine(NEREngine):
+    """基于 Jieba 词性标注与通用规则的人名识别"""
+
+    name = "jieba"
+    version = "1"
+    uses_lexicon = True
+
+    def __init__(self):
+        self.model = None
+        self.posseg = None
+        self._dict_fingerprint = ""
+
+    @property
+    def fingerprint(self) -> str:
+        return self._dict_fingerprint
+
+    def initialize(self) -> None:
+        """初始化 Jieba 分词器"""
+        if self.model is not None:
+            return
+
+        try:
+            import jieba
+            import jieba.posseg as pseg
+
+            logger.info("正在初始化通用 Jieba 分词器...")
+
+            # Jieba 自带的并行模式按行把文本分发到子进程，逐句调用时只会增加 IPC 开销；
+            # 大文本的并行由分片识别（src/parallel.py）负责，这里默认关闭
+            if settings.JIEBA_PARALLEL > 1:
+                jieba.enable_parallel(settings.JIEBA_PARALLEL)
+            jieba.setLogLevel(jieba.logging.INFO)  # 设置日志级别
+
+            # 初始化 Jieba（触发词典构建）
+            test_text = "测试初始化"
+            list(jieba.cut(test_text))
+
+            self.model = jieba
+            self.posseg = pseg
+            self._dict_fingerprint = self._file_fingerprint(
+                jieba.dt.dictionary or os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME),
+                jieba.__version__
+            )
+
+            logger.info("通用 Jieba 分词器初始化完成")
+
+        except ImportError:
+            logger.error("Jieba 未安装，请运行: pip install jieba")
+            raise
+        except Exception as e:
+            logger.error(f"Jieba 初始化失败: {e}")
+            raise
+
+    @contextmanager
+    def use_lexicon(self, names: Sequence[str]) -> Iterator[None]:
+        """
+        识别期间把书籍人名以 nr 词性加入 Jieba 用户词典，结束后恢复原词典
+
+        已在词典中的词保持不变。词频总数保持不变，不包含这些人名的句子分词结果与未启用词典时完全一致。
+        持有独占锁期间其他线程的 Jieba 识别会等待，调用方应只对包含这些人名的句子启用词典。
+        """
+        if not names or self.model is None:
+            yield
+            return
+
+        with _JIEBA_DICT_LOCK.exclusive():
+            added = self._add_words(names)
+            try:
+                yield
+            finally:
+                self._remove_words(added)
+
+    def _add_words(self, names: Sequence[str]) -> List[Tuple[str, List[str], Optional[str]]]:
+        """加入用户词，返回恢复所需的 (词, 新增的前缀, 原词性)"""
+        tokenizer = self.model.dt
+        pos_tokenizer = self.posseg.dt
+        pos_tokenizer.makesure_userdict_loaded()
+
+        added = []
+        total = tokenizer.total
+        for name in names:
+            if tokenizer.FREQ.get(name):
+                continue
+            prefixes = [name[:idx] for idx in range(1, len(name) + 1) if name[:idx] not in tokenizer.FREQ]
+            added.append((name, prefixes, pos_tokenizer.word_tag_tab.get(name)))
+            tokenizer.add_word(name, tag='nr')
+        # 路径概率按 log(词频) - log(总数) 计算，总数不变时其他句子的切分不受影响
+        tokenizer.total = total
+
+        # 词性表在 posseg 首次分词时才同步，这里立即同步，恢复时才能一并撤销
+        pos_tokenizer.makesure_userdict_loaded()
+        return added
+
+    def _remove_words(self, added: List[Tuple[str, List[str], Optional[str]]]) -> None:
+        """撤销 _add_words 的修改（jieba.del_word 会强制拆分该词，不能用于恢复）"""
+        tokenizer = self.model.dt
+        word_tag_tab = self.posseg.dt.word_tag_tab
+
+        for name, prefixes, tag in reversed(added):
+            tokenizer.FREQ[name] = 0
+            for prefix in prefixes:
+                tokenizer.FREQ.pop(prefix, None)
+            if tag is None:
+                word_tag_tab.pop(name, None)
+            else:
+                word_tag_tab[name] = tag
+
+    def recognize_batch(self, sentences: List[str]) -> List[List[EntitySpan]]:
+        with _JIEBA_DICT_LOCK.shared():
+            return [self._recognize_sentence(sentence) for sentence in sentences]
+
+    def _recognize_sentence(self, sentence: str) -> List[EntitySpan]:
+        spans = []
+
+        # 单次分词：词性标注结果同时供三种规则使用，分词偏移即提及位置
+        tokens = [(pair.word, pair.flag) for pair in self.posseg.cut(sentence)]
+        last = len(tokens) - 1
+        pos = 0
+
+        for idx, (word, flag) in enumerate(tokens):
+            start = pos
+            pos += len(word)
+
+            if not 2 <= len(word) <= 4:
+                continue
+
+            weight = 0
+
+            # 方法1：Jieba 词性标注识别人名
+            if 'nr' in flag:
+                weight += 1
+
+            if CJK_WORD_PATTERN.match(word):
+                # 方法2：对话动词前的候选词视为说话人
+                if idx < last and tokens[idx + 1][0][:1] in DIALOGUE_VERBS:
+                    weight += 1
+
+                # 方法3：通用中文人名模式识别
+                if word not in STOP_WORDS and is_likely_name(word):
+                    weight += 1
+
+            if weight:
+                spans.append(EntitySpan(word, start, pos, weight))
+
+        return spans
+
+
+class RuleEngine(NEREngine):
+    """基于姓氏和常见名字用字的规则识别（无模型依赖）"""
+
+    name = "rules"
+    version = "1"
+
+    def __init__(self):
+        self.common_surnames = COMMON_SURNAMES
+        # 规则1: 姓 + 1-2字名
+        self.surname_pattern = re.compile('[' + ''.join(sorted(COMMON_SURNAMES)) + '][一-龥]{1,2}')
+        # 规则2: 2-3字连续中文（可能是名字）
+        self.word_pattern = re.compile(r'[一-龥]{2,3}')
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{settings.NAME_MIN_LENGTH}-{settings.NAME_MAX_LENGTH}"
+
+    def recognize_batch(self, sentences: List[str]) -> List[List[EntitySpan]]:
+        return [self._recognize_sentence(sentence) for sentence in sentences]
+
+    def _recognize_sentence(self, sentence: str) -> List[EntitySpan]:
+        spans = []
+        seen = set()
+
+        for match in self.surname_pattern.finditer(sentence):
+            name = match.group(0)
+            if is_valid_name(name) and (name, match.start()) not in seen:
+                seen.add((name, match.start()))
+                spans.append(EntitySpan(name, match.start(), match.end()))
+
+        for match in self.word_pattern.finditer(sentence):
+            name = match.group(0)
+            if is_valid_name(name) and self._looks_like_name(name) and (name, match.start()) not in seen:
+                seen.add((name, match.start()))
+                spans.append(EntitySpan(name, match.start(), match.end()))
+
+        return spans
+
+    def _looks_like_name(self, text: str) -> bool:
+        """判断文本是否看起来像名字"""
+        # 如果第一个字是常见姓氏，很可能是名字
+        if text[0] in self.common_surnames:
+            return True
+
+        # 如果包含常见名字用字
+        return any(c in NAME_CHARS for c in text)
+
+
+class BucketedBertEngine(NEREngine):
+    """
+    BERT 类模型引擎的公共部分
+
+    一次接收 NER_BATCH_SIZE * NER_BUCKET_BATCHES 个句子，超长句子先切分为子句，
+    所有子句按长度排序后每 NER_BATCH_SIZE 个组成一个批次送入模型，
+    同一批次内长度相近，padding 最少。模型不可用时降级为规则识别。
+    """
+
+    # BERT 模型最大序列长度 126 tokens，中文约 1 字 = 1 token，保守按 100 字切分
+    MAX_LENGTH = 100
+
+    PERSON_TYPES = frozenset(['PERSON', 'PER', 'NR', 'nr'])
+
+    def __init__(self):
+        self.model = None
+        self._fallback = RuleEngine()
+
+    @property
+    def batch_window(self) -> int:
+        return max(1, settings.NER_BATCH_SIZE) * max(1, settings.NER_BUCKET_BATCHES)
+
+    @property
+    def source(self) -> str:
+        return f"{self.name}_ner" if self.model is not None else self._fallback.source
+
+    @property
+    def fingerprint(self) -> str:
+        # 模型不可用时实际执行的是规则识别
+        if self.model is None:
+            return f"{self._fallback.source}:{self._fallback.fingerprint}"
+        return f"{self._model_fingerprint()}:{settings.NAME_MIN_LENGTH}-{settings.NAME_MAX_LENGTH}"
+
+    def _model_fingerprint(self) -> str:
+        """已加载模型的指纹"""
+        return ""
+
+    def recognize_batch(self, sentences: List[str]) -> List[List[EntitySpan]]:
+        if self.model is None:
+            return self._fallback.recognize_batch(sentences)
+
+        spans: List[List[EntitySpan]] = [[] for _ in sentences]
+
+        # (句子下标, 子句在原句中的偏移, 子句)
+        pieces: List[Tuple[int, int, str]] = []
+        for sent_idx, sentence in enumerate(sentences):
+            for piece, offset in self._split_long_sentence(sentence, self.MAX_LENGTH):
+                pieces.append((sent_idx, offset, piece))
+
+        # 按长度分桶：排序后相邻的子句组成一个批次
+        pieces.sort(key=lambda item: len(item[2]))
+        batch_size = max(1, settings.NER_BATCH_SIZE)
+
+        for batch_start in range(0, len(pieces), batch_size):
+            batch = pieces[batch_start:batch_start + batch_size]
+            try:
+                results = self._predict([piece for _, _, piece in batch])
+            except Exception as e:
+                logger.error(f"NER 模型识别出错: {e}")
+                continue
+
+            for (sent_idx, offset, piece), persons in zip(batch, results):
+                for text, start, end in persons:
+                    if is_valid_name(text):
+                        spans[sent_idx].append(EntitySpan(text, start + offset, end + offset))
+
+        for sentence_spans in spans:
+            sentence_spans.sort(key=lambda span: span.start)
+
+        return spans
+
+    @abstractmethod
+    def _predict(self, texts: List[str]) -> List[List[Tuple[str, int, int]]]:
+        """
+        对一个批次做推理
+
+        Args:
+            texts: 长度相近的子句列表
+
+        Returns:
+            每个子句中的人名 (text, start, end) 列表
+        """
+
+    @staticmethod
+    def _split_long_sentence(sentence: str, max_length: int) -> List[Tuple[str, int]]:
+        """
+        将超长句子切分为多个子句
+
+        Returns:
+            [(子句, 在原句中的偏移量), ...]
+        """
+        if len(sentence) <= max_length:
+            return [(sentence, 0)]
+
+        sub_sentences = []
+        # 优先在逗号、顿号等处切分
+        split_chars = ['，', '、', '；', '：', '！', '？']
+
+        start = 0
+        while start < len(sentence):
+            end = start + max_length
+
+            if end >= len(sentence):
+                sub_sentences.append((sentence[start:], start))
+                break
+
+            best_split = end
+            for i in range(end, start + max_length // 2, -1):
+                if sentence[i] in split_chars:
+                    best_split = i + 1
+                    break
+
+            sub_sentences.append((sentence[start:best_split], start))
+            start = best_split
+
+        return sub_sentences
+
+
+class HanLPEngine(BucketedBertEngine):
+    """HanLP BERT NER 引擎（TensorFlow）"""
+
+    name = "hanlp"
+    version = "1"
+
+    def initialize(self) -> None:
+        """延迟初始化 HanLP 本地模型"""
+        if self.model is not None:
+            return
+
+        try:
+            # 强制使用 TF Keras 兼容模式，避免 Keras3/TF2.16 不兼容
+            os.environ.setdefault("TF_USE_LEGACY_KERAS", "1")
+            os.environ.setdefault("KERAS_BACKEND", "tensorflow")
+
+            import tensorflow as tf  # noqa: F401
+            import keras
+            # 兼容 Keras 3 移除 AbstractRNNCell
+            tf_layers = tf.keras.layers
+            if not hasattr(tf_layers, "AbstractRNNCell"):
+                tf_layers.AbstractRNNCell = tf_layers.Layer
+            if not hasattr(keras.layers, "AbstractRNNCell"):
+                keras.layers.AbstractRNNCell = keras.layers.Layer
+            # 旧版本中 HanLP 会从 keras._tf_keras 获取 AbstractRNNCell，若模块不存在则忽略
+            try:
+                import importlib
+                legacy_layers = importlib.import_module("keras._tf_keras.keras.layers")
+            except ModuleNotFoundError:
+                legacy_layers = tf_layers
+            if not hasattr(legacy_layers, "AbstractRNNCell"):
+                legacy_layers.AbstractRNNCell = legacy_layers.Layer
+
+            import hanlp
+            import hanlp.pretrained.ner as ner_models
+
+            # 配置 HanLP 镜像站（国内访问更快）
+            os.environ['HANLP_URL'] = 'https://ftp.hankcs.com/hanlp/'
+            mirror = os.environ['HANLP_URL']
+            if hasattr(hanlp, 'HANLP_URL'):
+                try:
+                    hanlp.HANLP_URL = mirror  # type: ignore[attr-defined]
+                except Exception:
+                    pass
+            try:
+                from hanlp.utils import io_util
+                if hasattr(io_util, 'HANLP_URL'):
+                    io_util.HANLP_URL = mirror  # type: ignore[attr-defined]
+            except Exception:
+                pass
+
+            logger.info(f"正在加载 NER 模型: {settings.NER_MODEL}")
+
+            # settings.NER_MODEL = "hanlp.pretrained.ner.MSRA_NER_BERT_BASE_ZH"
+            model_name = settings.NER_MODEL.split('.')[-1]
+            model_obj = self._rewrite_url(getattr(ner_models, model_name), mirror)
+
+            # devices=-1 表示使用 CPU
+            self.model = hanlp.load(model_obj, devices=-1)
+            logger.info("✅ HanLP NER 模型加载成功")
+
+        except Exception as e:
+            logger.warning(f"NER 模型加载失败: {e}，将仅使用规则识别")
+            import traceback
+            logger.debug(traceback.format_exc())
+            self.model = None
+
+    def _model_fingerprint(self) -> str:
+        return settings.NER_MODEL
+
+    def _predict(self, texts: List[str]) -> List[List[Tuple[str, int, int]]]:
+        return [self._parse_result(result) for result in self.model(texts)]
+
+    @staticmethod
+    def _rewrite_url(obj: Any, mirror: str) -> Any:
+        """镜像 URL 重写（避免访问 file.hankcs.com）"""
+        prefix = "https://file.hankcs.com/hanlp/"
+        if isinstance(obj, str) and obj.startswith(prefix):
+            return obj.replace(prefix, mirror)
+        if isinstance(obj, dict) and isinstance(obj.get("url"), str) and obj["url"].startswith(prefix):
+            return {**obj, "url": obj["url"].replace(prefix, mirror)}
+        return obj
+
+    def _parse_result(self, result: Any) -> List[Tuple[str, int, int]]:
+        """
+        解析模型返回结果
+
+        BERT BASE 返回实体列表 [('张三', 'NR', 0, 2), ...]，
+        部分模型返回 {'entities': [...]} 或 {'ner': [...]}。
+        """
+        if isinstance(result, dict):
+            result = result.get('entities', result.get('ner', []))
+
+        persons = []
+        for entity in result or []:
+            if not isinstance(entity, (list, tuple)) or len(entity) < 2:
+                continue
+            text, entity_type = entity[0], entity[1]
+            if entity_type not in self.PERSON_TYPES:
+                continue
+            start = entity[2] if len(entity) > 2 else 0
+            end = entity[3] if len(entity) > 3 else start + len(text)
+            persons.append((text, start, end))
+
+        return persons
+
+
+class OnnxBertEngine(BucketedBertEngine):
+    """
+    ONNX Runtime BERT NER 引擎（CPU，int8 动态量化）
+
+    模型由 export_ner_onnx.py 导出，目录中包含 ONNX 模型、vocab.txt 和带 id2label 的 config.json。
+    中文 BERT 的词表以单字为主，这里直接按字映射 token，token 下标即句内字符偏移，
+    不需要加载 transformers 分词器，也不会在 worker 启动时引入 TensorFlow / PyTorch。
+    """
+
+    name = "onnx"
+    version = "1"
+
+    def __init__(self):
+        super().__init__()
+        self.vocab: Dict[str, int] = {}
+        self.id2label: Dict[int, str] = {}
+        self._input_names: List[str] = []
+
+    def initialize(self) -> None:
+        """加载 ONNX 模型、词表和标签表"""
+        if self.model is not None:
+            return
+
+        model_path = settings.NER_ONNX_MODEL_PATH
+        model_dir = os.path.dirname(model_path)
+
+        try:
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if settings.NER_ONNX_THREADS > 0:
+                options.intra_op_num_threads = settings.NER_ONNX_THREADS
+            # 单个批次内只有一条计算路径，inter-op 并行没有收益
+            options.inter_op_num_threads = 1
+
+            logger.info(f"正在加载 ONNX NER 模型: {model_path}")
+            session = ort.InferenceSession(
+                model_path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+
+            with open(os.path.join(model_dir, "vocab.txt"), encoding="utf-8") as f:
+                self.vocab = {line.rstrip("\n"): idx for idx, line in enumerate(f)}
+            with open(os.path.join(model_dir, "config.json"), encoding="utf-8") as f:
+                self.id2label = {int(k): v for k, v in json.load(f)["id2label"].items()}
+
+            self._input_names = [item.name for item in session.get_inputs()]
+            self.model = session
+            logger.info(
+                f"✅ ONNX NER 模型加载成功: {len(self.id2label)} 个标签, "
+                f"intra-op 线程数 {settings.NER_ONNX_THREADS or '默认'}"
+            )
+
+        except Exception as e:
+            logger.warning(f"ONNX NER 模型加载失败: {e}，将仅使用规则识别")
+            self.model = None
+
+    def _model_fingerprint(self) -> str:
+        return self._file_fingerprint(settings.NER_ONNX_MODEL_PATH)
+
+    def _predict(self, texts: List[str]) -> List[List[Tuple[str, int, int]]]:
+        cls_id = self.vocab.get("[CLS]", 101)
+        sep_id = self.vocab.get("[SEP]", 102)
+        unk_id = self.vocab.get("[UNK]", 100)
+        pad_id = self.vocab.get("[PAD]", 0)
+
+        # 同一批次已按长度分桶，只需补齐到批内最长
+        seq_len = max(len(text) for text in texts) + 2
+        input_ids = np.full((len(texts), seq_len), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(texts), seq_len), dtype=np.int64)
+
+        for row, text in enumerate(texts):
+            ids = [self.vocab.get(char.lower(), unk_id) for char in text]
+            input_ids[row, :len(ids) + 2] = [cls_id, *ids, sep_id]
+            attention_mask[row, :len(ids) + 2] = 1
+
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+        logits = self.model.run(None, {name: feeds[name] for name in self._input_names})[0]
+        label_ids = logits.argmax(axis=-1)
+
+        return [
+            self._decode(text, [self.id2label[int(label)] for label in label_ids[row, 1:len(text) + 1]])
+            for row, text in enumerate(texts)
+        ]
+
+    def _decode(self, text: str, labels: List[str]) -> List[Tuple[str, int, int]]:
+        """按 BIO / BIOES 标签解码人名片段"""
+        persons = []
+        start = -1
+
+        for idx, label in enumerate(labels + ["O"]):
+            prefix, _, entity_type = label.partition("-")
+            is_person = entity_type in self.PERSON_TYPES
+
+            # 当前片段在非人名标签或新片段开头处结束
+            if start >= 0 and (not is_person or prefix in ("B", "S")):
+                persons.append((text[start:idx], start, idx))
+                start = -1
+
+            if is_person:
+                if start < 0:
+                    start = idx
+                if prefix in ("E", "S"):
+                    persons.append((text[start:idx + 1], start, idx + 1))
+                    start = -1
+
+        return persons
+
+
+# 可选的 NER 引擎（settings.NER_ENGINE）
+NER_ENGINES: Dict[str, Type[NEREngine]] = {
+    JiebaEngine.name: JiebaEngine,
+    HanLPEngine.name: HanLPEngine,
+    OnnxBertEngine.name: OnnxBertEngine,
+    RuleEngine.name: RuleEngine,
+}
+
+
+def create_engine(name: Optional[str] = None) -> NEREngine:
+    """
+    按名称创建 NER 引擎
+
+    Args:
+        name: 引擎名称，默认取 settings.NER_ENGINE
+
+    Returns:
+        NER 引擎实例
+    """
+    name = (name or settings.NER_ENGINE).lower()
+    engine_cls = NER_ENGINES.get(name)
+    if engine_cls is None:
+        raise ValueError(f"未知的 NER 引擎: {name}，可选: {', '.join(NER_ENGINES)}")
+    return engine_cls()
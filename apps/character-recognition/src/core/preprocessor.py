@@ -1,7 +1,87 @@
 """文本预处理模块"""
 import re
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 from loguru import logger
+from pydantic import BaseModel
+
+from ..config import settings
+
+
+class Chapter(BaseModel):
+    """章节信息（字符范围基于清洗后文本，句子范围左闭右开）"""
+    index: int
+    title: str
+    start: int
+    end: int
+    sent_start: int
+    sent_end: int
+
+
+class ChapterIndexer:
+    """
+    章节索引器
+
+    逐句喂入 (sent_id, sentence, start, end)，在句子中查找独占一行的章节标题，
+    结束时补齐各章的字符范围与句子范围。整体预处理和流式预处理共用同一套逻辑。
+    """
+
+    # 独占一行的章节标题：第X章/回/节/卷 或 Chapter N，标题行不超过 30 字
+    # 章/回/节/卷之后须是空白、标题分隔符或行尾（排除“第三回合”“第一节课”），
+    # 以句末标点结尾的行是正文而非标题
+    HEADING_PATTERN = re.compile(
+        r'^[ \t\u3000]*('
+        r'第[0-9０-９零〇一二两三四五六七八九十百千万]+[章回节卷](?=[ \t\u3000：:、·—]|$)'
+        r'|[Cc][Hh][Aa][Pp][Tt][Ee][Rr][ \t]*[0-9IVXLCDMivxlcdm]+'
+        r')[^\n]{0,30}(?<![。！？”])$',
+        re.MULTILINE
+    )
+
+    def __init__(self):
+        self.chapters: List[Chapter] = []
+        self._current: Optional[dict] = None
+
+    def feed(self, sent_id: int, sentence: str, start: int, end: int) -> None:
+        """处理一个句子；start/end 为句子在清洗后文本中的边界"""
+        # 句子是边界内文本去除首尾空白的结果，且边界末尾不会有多余空白
+        content_start = end - len(sentence)
+
+        matches = list(self.HEADING_PATTERN.finditer(sentence))
+
+        # 第一个标题之前的正文作为无标题的序章
+        if self._current is None and not (matches and matches[0].start() == 0):
+            self._open("", 0, sent_id)
+
+        for match in matches:
+            self._close(content_start + match.start(), sent_id)
+            title = match.group(0).strip().rstrip("。！？；")
+            self._open(title, content_start + match.start(), sent_id)
+
+    def finish(self, total_sentences: int, text_length: int) -> List[Chapter]:
+        """结束索引，返回章节表"""
+        self._close(text_length, total_sentences)
+        return self.chapters
+
+    def _open(self, title: str, start: int, sent_start: int) -> None:
+        self._current = {"title": title, "start": start, "sent_start": sent_start}
+
+    def _close(self, end: int, sent_end: int) -> None:
+        current = self._current
+        if current is None:
+            return
+        self._current = None
+
+        # 没有任何句子的无标题序章直接丢弃
+        if not current["title"] and sent_end <= current["sent_start"]:
+            return
+
+        self.chapters.append(Chapter(
+            index=len(self.chapters),
+            title=current["title"],
+            start=current["start"],
+            end=end,
+            sent_start=current["sent_start"],
+            sent_end=sent_end
+        ))
 
 
 class TextPreprocessor:
@@ -34,17 +114,161 @@ class TextPreprocessor:
         logger.info(f"预处理完成: {len(sentences)} 个句子, {len(cleaned)} 字符")
         
         return cleaned, sentences, bounds
-    
+
+    @staticmethod
+    def sentence_offsets(sentences: List[str], bounds: List[Tuple[int, int]]) -> List[int]:
+        """
+        句子内容在清洗后文本中的起始位置
+
+        句子是边界内文本去除首尾空白的结果，边界末尾不会有多余空白，
+        因此起始位置为 end - len(sentence)。
+        """
+        return [end - len(sentence) for sentence, (_, end) in zip(sentences, bounds)]
+
+    def build_chapters(
+        self,
+        sentences: List[str],
+        bounds: List[Tuple[int, int]],
+        text_length: int
+    ) -> List[Chapter]:
+        """
+        章节检测：根据 第X章 / Chapter N 标题生成章节表
+
+        Args:
+            sentences: 句子列表
+            bounds: 句子边界
+            text_length: 清洗后文本长度
+
+        Returns:
+            章节表，每章包含标题、字符范围和句子范围
+        """
+        indexer = ChapterIndexer()
+        for sent_id, (sentence, (start, end)) in enumerate(zip(sentences, bounds)):
+            indexer.feed(sent_id, sentence, start, end)
+
+        chapters = indexer.finish(len(sentences), text_length)
+        logger.info(f"章节检测完成: {len(chapters)} 个章节")
+
+        return chapters
+
+    def iter_sentences(
+        self,
+        source: Union[str, TextIO, Iterable[str]],
+        chunk_size: Optional[int] = None
+    ) -> Iterator[Tuple[str, int, int]]:
+        """
+        流式预处理：按块读取输入，逐句产出，不构建完整的清洗文本
+
+        只在句末标点之后切分待处理缓冲区，清洗规则不会跨越句末标点，
+        因此跨块的句子和空白都能被正确处理，结果与 preprocess 完全一致。
+        每块只扫描新读入的部分；没有句末标点的块先暂存，遇到标点时一次拼接，
+        长段无标点文本的耗时仍与长度成正比。
+
+        Args:
+            source: 原始文本、文件对象或文本块迭代器
+            chunk_size: 每次读取的字符数
+
+        Yields:
+            (sentence, global_start, global_end)，边界为清洗后文本中的位置
+        """
+        chunk_size = chunk_size or settings.PREPROCESS_CHUNK_SIZE
+
+        pending: List[str] = []
+        offset = 0
+        is_first = True
+
+        for chunk in self._iter_chunks(source, chunk_size):
+            # 找到新块中最后一个句末标点，之前的部分可以安全处理（句末标点为单个字符，不会跨块）
+            cut = 0
+            for match in self.sentence_pattern.finditer(chunk):
+                cut = match.end()
+            if not cut:
+                pending.append(chunk)
+                continue
+
+            piece = "".join(pending) + chunk[:cut]
+            pending = [chunk[cut:]]
+            cleaned_length, sentences, bounds = self.preprocess_fragment(
+                piece, is_first=is_first, is_last=False
+            )
+            is_first = False
+
+            for sentence, (start, end) in zip(sentences, bounds):
+                yield sentence, offset + start, offset + end
+            offset += cleaned_length
+
+        # 处理最后一段（可能没有结束标点）
+        _, sentences, bounds = self.preprocess_fragment("".join(pending), is_first=is_first, is_last=True)
+        for sentence, (start, end) in zip(sentences, bounds):
+            yield sentence, offset + start, offset + end
+
+    def preprocess_fragment(
+        self,
+        text: str,
+        is_first: bool,
+        is_last: bool
+    ) -> Tuple[int, List[str], List[Tuple[int, int]]]:
+        """
+        预处理全文中的一个片段
+
+        片段必须在句末标点之后切分。各片段依次拼接的清洗结果与整体清洗一致，
+        只有首个片段去除开头空白、最后一个片段去除结尾空白。
+
+        Args:
+            text: 原始文本片段
+            is_first: 是否为全文第一个片段
+            is_last: 是否为全文最后一个片段
+
+        Returns:
+            cleaned_length: 片段清洗后的长度
+            sentences: 句子列表
+            bounds: 句子边界（相对于片段清洗后的文本）
+        """
+        cleaned = self._normalize_text(text)
+        if is_first:
+            cleaned = cleaned.lstrip()
+        if is_last:
+            cleaned = cleaned.rstrip()
+
+        sentences, bounds = self._split_sentences(cleaned)
+        return len(cleaned), sentences, bounds
+
+    def _iter_chunks(
+        self,
+        source: Union[str, TextIO, Iterable[str]],
+        chunk_size: int
+    ) -> Iterator[str]:
+        """将不同类型的输入统一为文本块迭代器"""
+        if isinstance(source, str):
+            for start in range(0, len(source), chunk_size):
+                yield source[start:start + chunk_size]
+        elif hasattr(source, "read"):
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            yield from source
+
     def _clean_text(self, text: str) -> str:
         """
         清洗文本
-        
+
         Args:
             text: 原始文本
-            
+
         Returns:
             清洗后的文本
         """
+        return self._normalize_text(text).strip()
+
+    def _normalize_text(self, text: str) -> str:
+        """
+        统一换行、空白和引号（不去除首尾空白）
+
+        各条规则都不会跨越句末标点，因此可以对按句末标点切分的片段单独执行。
+        """
         # 统一换行符
         text = text.replace('\r\n', '\n').replace('\r', '\n')
         
@@ -56,7 +280,7 @@ class TextPreprocessor:
         text = text.replace('"', '"').replace('"', '"')
         text = text.replace(''', "'").replace(''', "'")
         
-        return text.strip()
+        return text
     
     def _split_sentences(self, text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
         """
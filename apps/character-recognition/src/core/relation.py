@@ -1,10 +1,12 @@
 """人物关系抽取模块"""
-from typing import List, Dict
-from collections import defaultdict
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
 from loguru import logger
 
 from ..config import settings
 from ..models.character import Character, Relation
+from .alias_index import AliasIndex
 
 
 class RelationExtractor:
@@ -17,7 +19,10 @@ class RelationExtractor:
         self,
         sentences: List[str],
         characters: List[Character],
-        alias_map: Dict[str, str]
+        alias_map: Dict[str, str],
+        alias_index: Optional[AliasIndex] = None,
+        window: Optional[int] = None,
+        decay: Optional[float] = None
     ) -> List[Relation]:
         """
         抽取人物关系
@@ -26,70 +31,132 @@ class RelationExtractor:
             sentences: 句子列表
             characters: 人物列表
             alias_map: 别名映射
+            alias_index: 由 alias_map 构建的别名索引（与指代消解共用），不提供时现场构建
+            window: 跨句共现窗口，默认 settings.MAX_CONTEXT_DISTANCE
+            decay: 跨句共现的距离衰减系数，默认 settings.RELATION_DISTANCE_DECAY
             
         Returns:
             关系列表
         """
-        # 统计共现
-        cooccurrence = defaultdict(int)
-        dialogue_pairs = defaultdict(int)
+        if alias_index is None:
+            alias_index = AliasIndex(alias_map)
+        window = settings.MAX_CONTEXT_DISTANCE if window is None else window
+        decay = settings.RELATION_DISTANCE_DECAY if decay is None else decay
         
-        # 按句子窗口统计共现
-        for i, sentence in enumerate(sentences):
-            chars_in_sent = self._extract_characters(sentence, alias_map)
-            
-            # 句内共现
-            for j, char1 in enumerate(chars_in_sent):
-                for char2 in chars_in_sent[j+1:]:
-                    pair = tuple(sorted([char1, char2]))
-                    cooccurrence[pair] += 1
-            
-            # 跨句共现（窗口大小为 MAX_CONTEXT_DISTANCE）
-            if i < len(sentences) - 1:
-                for offset in range(1, settings.MAX_CONTEXT_DISTANCE + 1):
-                    if i + offset >= len(sentences):
-                        break
-                    
-                    next_chars = self._extract_characters(
-                        sentences[i + offset], alias_map
-                    )
-                    
-                    for char1 in chars_in_sent:
-                        for char2 in next_chars:
-                            if char1 != char2:
-                                pair = tuple(sorted([char1, char2]))
-                                cooccurrence[pair] += 1
+        # 句子 × 人物关联矩阵（每个句子只扫描一次）
+        names, indptr, columns = self._build_incidence(sentences, alias_index)
+        
+        # 窗口内共现（句内 + 跨 window 句，跨句按 decay^距离 加权）
+        pairs, weights, first_sentences = self._window_cooccurrence(
+            indptr, columns, len(names), window, decay
+        )
         
         # 构建关系列表
         relations = []
         
-        for (char1, char2), weight in cooccurrence.items():
+        for code, weight, first_sentence in zip(pairs.tolist(), weights.tolist(), first_sentences.tolist()):
             if weight >= settings.MIN_RELATION_WEIGHT:
-                relations.append(Relation(
+                char1, char2 = sorted([names[code // len(names)], names[code % len(names)]])
+                relations.append((first_sentence, Relation(
                     from_char=char1,
                     to_char=char2,
                     relation_type="共现",
                     weight=weight
-                ))
+                )))
         
-        # 按权重排序
-        relations.sort(key=lambda r: r.weight, reverse=True)
+        # 按权重排序，权重相同时按首次共现的位置
+        relations.sort(key=lambda item: (-item[1].weight, item[0], item[1].from_char, item[1].to_char))
+        relations = [relation for _, relation in relations]
         
         logger.info(f"关系抽取完成: {len(relations)} 个关系")
         
         return relations
     
+    def _build_incidence(
+        self,
+        sentences: List[str],
+        alias_index: AliasIndex
+    ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        构建稀疏的句子 × 人物关联矩阵（CSR 形式）
+        
+        Returns:
+            names: 人物编号到规范名
+            indptr: 第 i 句的人物编号为 columns[indptr[i]:indptr[i + 1]]
+            columns: 人物编号
+        """
+        char_ids: Dict[str, int] = {}
+        columns: List[int] = []
+        indptr = [0]
+        
+        for sentence in sentences:
+            for name in self._extract_characters(sentence, alias_index):
+                columns.append(char_ids.setdefault(name, len(char_ids)))
+            indptr.append(len(columns))
+        
+        return list(char_ids), np.array(indptr, dtype=np.int64), np.array(columns, dtype=np.int64)
+    
+    def _window_cooccurrence(
+        self,
+        indptr: np.ndarray,
+        columns: np.ndarray,
+        n_chars: int,
+        window: int,
+        decay: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        按距离逐条带状对角线统计共现：距离 d 的贡献为第 i 句与第 i + d 句人物的两两组合
+        
+        Returns:
+            pairs: 无序人物对编码 min * n_chars + max
+            weights: 加权共现次数
+            first_sentences: 每对人物首次共现的句子编号
+        """
+        n_sentences = len(indptr) - 1
+        rows = np.repeat(np.arange(n_sentences), np.diff(indptr))
+        entries = np.arange(len(columns))
+        
+        codes, weights, firsts = [], [], []
+        for distance in range(window + 1):
+            if distance == 0:
+                # 句内：同一句中排在后面的人物
+                start, stop = entries + 1, indptr[rows + 1]
+            else:
+                target = rows + distance
+                valid = target < n_sentences
+                target = np.where(valid, target, 0)
+                start = np.where(valid, indptr[target], 0)
+                stop = np.where(valid, indptr[target + 1], 0)
+            
+            left, right = self._expand_ranges(start, stop)
+            char1, char2 = columns[left], columns[right]
+            keep = char1 != char2
+            
+            codes.append(np.minimum(char1, char2)[keep] * n_chars + np.maximum(char1, char2)[keep])
+            weights.append(np.full(int(keep.sum()), decay ** distance))
+            firsts.append(rows[left][keep])
+        
+        codes = np.concatenate(codes)
+        pairs, inverse = np.unique(codes, return_inverse=True)
+        pair_weights = np.bincount(inverse, weights=np.concatenate(weights), minlength=len(pairs))
+        first_sentences = np.full(len(pairs), n_sentences, dtype=np.int64)
+        np.minimum.at(first_sentences, inverse, np.concatenate(firsts))
+        
+        return pairs, pair_weights, first_sentences
+    
+    @staticmethod
+    def _expand_ranges(start: np.ndarray, stop: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """把每个元素 p 与区间 [start[p], stop[p]) 中的元素逐一配对"""
+        counts = np.maximum(stop - start, 0)
+        left = np.repeat(np.arange(len(start)), counts)
+        group_begin = np.repeat(np.cumsum(counts) - counts, counts)
+        right = start[left] + np.arange(len(left)) - group_begin
+        return left, right
+    
     def _extract_characters(
         self,
         sentence: str,
-        alias_map: Dict[str, str]
+        alias_index: AliasIndex
     ) -> List[str]:
         """提取句子中的人物"""
-        characters = []
-        
-        for alias, main_name in alias_map.items():
-            if alias in sentence:
-                if main_name not in characters:
-                    characters.append(main_name)
-        
-        return characters
+        return alias_index.characters(sentence)
@@ -0,0 +1,193 @@
+"""API 识别执行池
+/api/recognize 与 Redis 不可用时的内存模式任务在有界的线程池（或进程池）中执行，不阻塞事件循环，
+/health 与任务状态查询在识别大文本期间保持响应。
+同时执行数为 RECOGNIZE_CONCURRENCY，另有 RECOGNIZE_QUEUE_SIZE 个等待位；超出时立即拒绝，
+由 API 返回 429/503 并附带 Retry-After。
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from .config import settings
+
+
+class ExecutorSaturated(Exception):
+    """执行池已满（或已关闭），调用方应稍后重试"""
+
+    def __init__(self, retry_after: int, message: str = "识别任务过多，请稍后重试"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RecognitionExecutor:
+    """有界识别执行池：同时执行 max_workers 个，最多再排队 max_queue 个"""
+
+    def __init__(
+        self,
+        kind: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        min_retry_after: Optional[int] = None
+    ):
+        """
+        Args:
+            kind: thread / process，默认取 settings.RECOGNIZE_EXECUTOR
+            max_workers: 同时执行数，默认取 settings.RECOGNIZE_CONCURRENCY
+            max_queue: 等待位数，默认取 settings.RECOGNIZE_QUEUE_SIZE
+            min_retry_after: Retry-After 的最小秒数，默认取 settings.RECOGNIZE_RETRY_AFTER
+        """
+        self.kind = (kind or settings.RECOGNIZE_EXECUTOR).lower()
+        if self.kind not in ("thread", "process"):
+            raise ValueError(f"未知的识别执行池类型: {self.kind}，可选: thread, process")
+
+        self.max_workers = max(1, max_workers if max_workers is not None else settings.RECOGNIZE_CONCURRENCY)
+        self.max_queue = max(0, max_queue if max_queue is not None else settings.RECOGNIZE_QUEUE_SIZE)
+        self.min_retry_after = max(1, min_retry_after if min_retry_after is not None else settings.RECOGNIZE_RETRY_AFTER)
+
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0  # 已接收、尚未结束的任务数（执行中 + 排队中）
+        self._closed = False
+
+        # 统计：完成 / 拒绝次数与任务耗时的指数移动平均（用于估算 Retry-After）
+        self.completed = 0
+        self.rejected = 0
+        self._avg_seconds = 0.0
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.kind == "process"
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "asyncio.Future[Any]":
+        """
+        提交任务（须在事件循环中调用）
+
+        Args:
+            fn: 在执行池中运行的函数；进程池模式下须可序列化
+            *args / **kwargs: 函数参数
+
+        Returns:
+            可 await 的结果；任务被接收后，即使调用方取消等待也会执行完毕并释放位置
+
+        Raises:
+            ExecutorSaturated: 执行池已满或已关闭
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            if self._closed or self._pending >= self.capacity:
+                self.rejected += 1
+                raise ExecutorSaturated(self._estimate_retry_after())
+            self._pending += 1
+
+        try:
+            future = self._get_pool().submit(_timed, partial(fn, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(_strip_timing(future), loop=loop)
+
+    def stats(self) -> Dict[str, Any]:
+        """执行池状态（/api/stats）"""
+        with self._lock:
+            pending = self._pending
+        return {
+            "kind": self.kind,
+            "concurrency": self.max_workers,
+            "queue_size": self.max_queue,
+            "running": min(pending, self.max_workers),
+            "queued": max(pending - self.max_workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_seconds": round(self._avg_seconds, 3),
+        }
+
+    def shutdown(self) -> None:
+        """拒绝新任务并关闭执行池（等待执行中的任务结束）"""
+        with self._lock:
+            self._closed = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"创建识别执行池: {self.kind}, 并发 {self.max_workers}, 等待位 {self.max_queue}")
+                if self.uses_processes:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_process_worker)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="recognize")
+            return self._pool
+
+    def _release(self, future: Optional[Future]) -> None:
+        seconds = None
+        if future is not None and not future.cancelled() and future.exception() is None:
+            seconds = future.result()[1]
+
+        with self._lock:
+            self._pending -= 1
+            if seconds is not None:
+                self.completed += 1
+                self._avg_seconds = seconds if self.completed == 1 else 0.8 * self._avg_seconds + 0.2 * seconds
+
+    def _estimate_retry_after(self) -> int:
+        """按平均耗时估算排在最前的等待任务开始执行所需的秒数"""
+        waves = max(self._pending - self.max_workers + 1, 1) / self.max_workers
+        return max(self.min_retry_after, math.ceil(self._avg_seconds * waves))
+
+
+def _timed(fn: Callable[[], Any]) -> Any:
+    """执行任务并返回 (结果, 耗时)"""
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def _strip_timing(future: Future) -> Future:
+    """把 (结果, 耗时) 的 Future 转换为只含结果的 Future"""
+    stripped: Future = Future()
+
+    def _copy(done: Future) -> None:
+        if done.cancelled():
+            # stripped 已处于运行状态，无法再 cancel，以异常形式通知等待方
+            stripped.set_exception(CancelledError())
+        elif done.exception() is not None:
+            stripped.set_exception(done.exception())
+        else:
+            stripped.set_result(done.result()[0])
+
+    stripped.set_running_or_notify_cancel()
+    future.add_done_callback(_copy)
+    return stripped
+
+
+# ===== 进程池模式 =====
+# 子进程内复用的识别器，由进程池 initializer 创建并加载模型
+_process_recognizer = None
+
+
+def _init_process_worker() -> None:
+    global _process_recognizer
+
+    from .recognizer import CharacterRecognizer
+
+    _process_recognizer = CharacterRecognizer()
+    _process_recognizer.initialize()
+
+
+def recognize_in_process(request: Any) -> Any:
+    """在进程池子进程中识别（进度回调无法跨进程传递，不上报逐句进度）"""
+    return _process_recognizer.recognize(request)
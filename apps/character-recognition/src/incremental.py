@@ -0,0 +1,235 @@
+"""增量识别
+按 book_id 保存上一次识别的中间产物：每个句子的 NER 片段和别名提及（按句子内容哈希索引）、
+以及人物合并分组。同一本书再次提交时，只对新增或改动的句子执行 NER 和别名识别；
+句子序列与配置完全不变时直接复用合并分组。
+
+书籍人名词典（src/lexicon.py）不计入配置指纹：词典每次识别后都会刷新，
+它只作用于本次需要重新识别的句子，未改动的句子沿用上一次的结果。
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .cache import cache_book_state, fetch_book_state
+from .config import settings
+from .core import AliasRecognizer, NERRecognizer
+from .core.ner_engines import EntitySpan
+from .models.character import CharacterMention
+
+
+# 持久化格式版本，格式变化时旧数据自动失效
+STATE_VERSION = "1"
+
+
+def _digest(*parts: str, size: int = 12) -> str:
+    digest = hashlib.blake2b(digest_size=size)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def state_fingerprint(ner_recognizer: NERRecognizer, alias_recognizer: AliasRecognizer) -> str:
+    """影响逐句结果的配置指纹：NER 引擎与别名规则变化时旧的中间产物全部失效"""
+    engine = ner_recognizer.engine
+    return _digest(
+        STATE_VERSION,
+        engine.name, engine.version, engine.fingerprint,
+        alias_recognizer.RULES_VERSION,
+        json.dumps([settings.NAME_PREFIXES, settings.NAME_HONORIFICS], ensure_ascii=False),
+        size=16
+    )
+
+
+class BookState:
+    """
+    一本书的增量识别状态
+
+    ner / aliases 以句子内容哈希为键，保存句内偏移的结果，与句子在书中的位置无关，
+    因此插入、删除或追加章节后，未改动的句子仍能命中。只保留本次出现的句子。
+    """
+
+    def __init__(self, book_id: str, fingerprint: str, previous: Optional[Dict[str, Any]] = None):
+        self.book_id = book_id
+        self.fingerprint = fingerprint
+
+        # 配置变化时丢弃旧状态
+        if not previous or previous.get("fingerprint") != fingerprint:
+            previous = {}
+        self._previous_ner: Dict[str, list] = previous.get("ner", {})
+        self._previous_aliases: Dict[str, list] = previous.get("aliases", {})
+        self._previous_merge: Optional[Dict[str, Any]] = previous.get("merge")
+
+        self.ner: Dict[str, Tuple[EntitySpan, ...]] = {}
+        self.aliases: Dict[str, List[Tuple[str, int, int]]] = {}
+        self.order: List[str] = []
+        self.merge: Optional[Dict[str, Any]] = None
+
+        self.reused_sentences = 0
+        self.recomputed_sentences = 0
+        self.merge_reused = False
+
+    @property
+    def has_previous(self) -> bool:
+        """是否有可复用的上一次结果"""
+        return bool(self._previous_ner or self._previous_aliases)
+
+    @staticmethod
+    def sentence_key(sentence: str) -> str:
+        return _digest(sentence)
+
+    def ner_spans(
+        self,
+        sentences: List[str],
+        compute: Callable[[List[str]], List[Sequence[EntitySpan]]]
+    ) -> List[Sequence[EntitySpan]]:
+        """
+        获取一批句子的 NER 片段，只对没有历史结果的句子调用 compute
+
+        Args:
+            sentences: 句子列表
+            compute: 对未命中句子执行 NER 的函数
+
+        Returns:
+            与 sentences 一一对应的句内片段
+        """
+        keys = [self.sentence_key(sentence) for sentence in sentences]
+        results: List[Optional[Sequence[EntitySpan]]] = [None] * len(keys)
+        missing: List[int] = []
+
+        for idx, key in enumerate(keys):
+            spans = self.ner.get(key)
+            if spans is None and key in self._previous_ner:
+                spans = tuple(EntitySpan(*item) for item in self._previous_ner[key])
+                self.ner[key] = spans
+            if spans is None:
+                missing.append(idx)
+            else:
+                results[idx] = spans
+
+        self.reused_sentences += len(keys) - len(missing)
+        self.recomputed_sentences += len(missing)
+
+        if missing:
+            computed = compute([sentences[idx] for idx in missing])
+            for idx, spans in zip(missing, computed):
+                self.ner[keys[idx]] = tuple(spans)
+                results[idx] = spans
+
+        return results
+
+    def alias_mentions(
+        self,
+        sentence: str,
+        sent_id: int,
+        offset: int,
+        compute: Callable[[str, int], List[CharacterMention]]
+    ) -> List[CharacterMention]:
+        """
+        获取一个句子的别名提及，没有历史结果时调用 compute(sentence, sent_id) 识别
+
+        同时按顺序记录句子哈希，用于判断合并分组能否复用。
+        """
+        spans = self.alias_spans(
+            sentence, lambda text: [(m.text, m.start, m.end) for m in compute(text, sent_id)]
+        )
+        return [
+            CharacterMention(text=text, start=start + offset, end=end + offset, sent_id=sent_id)
+            for text, start, end in spans
+        ]
+
+    def alias_spans(
+        self,
+        sentence: str,
+        compute: Callable[[str], List[Tuple[str, int, int]]]
+    ) -> List[Tuple[str, int, int]]:
+        """
+        获取一个句子的别名片段 (文本, 句内起点, 句内终点)，没有历史结果时调用 compute(sentence) 识别
+
+        同时按顺序记录句子哈希，用于判断合并分组能否复用。
+        """
+        key = self.sentence_key(sentence)
+        self.order.append(key)
+
+        spans = self.aliases.get(key)
+        if spans is None:
+            spans = self._previous_aliases.get(key)
+            if spans is None:
+                spans = compute(sentence)
+            self.aliases[key] = spans
+
+        return spans
+
+    def absorb(self, shard: Dict[str, Any]) -> None:
+        """合并分片子进程中记录的逐句结果（分片识别首次处理一本书时使用）"""
+        self.ner.update((key, tuple(EntitySpan(*item) for item in spans)) for key, spans in shard["ner"].items())
+        self.aliases.update(shard["aliases"])
+        self.order.extend(shard["order"])
+        self.recomputed_sentences += len(shard["order"])
+
+    def export_sentences(self) -> Dict[str, Any]:
+        """导出逐句结果（分片子进程返回给主进程）"""
+        return {
+            "ner": {key: [list(span) for span in spans] for key, spans in self.ner.items()},
+            "aliases": self.aliases,
+            "order": self.order,
+        }
+
+    def merge_key(self, threshold: float, embedding_model: str, alias_min_count: int = 1) -> str:
+        """
+        合并输入的指纹：句子序列、阈值、句向量模型（未使用语义合并时为空）
+        和别名最少出现次数都不变时合并结果不变
+        """
+        return _digest(str(threshold), embedding_model, str(alias_min_count), *self.order, size=16)
+
+    def previous_merge_groups(self, key: str) -> Optional[List[Tuple[str, List[str]]]]:
+        """上一次的合并分组（仅当合并输入完全一致时返回）"""
+        if self._previous_merge and self._previous_merge.get("key") == key:
+            return [(main, aliases) for main, aliases in self._previous_merge["groups"]]
+        return None
+
+    def record_merge(self, key: str, characters: Iterable[Any], reused: bool) -> None:
+        """记录本次的合并分组"""
+        self.merge = {
+            "key": key,
+            "groups": [[c.canonical_name, list(c.aliases)] for c in characters],
+        }
+        self.merge_reused = reused
+
+    def statistics(self) -> Dict[str, Any]:
+        """增量识别统计，用于阶段数据"""
+        return {
+            "book_id": self.book_id,
+            "reused_sentences": self.reused_sentences,
+            "recomputed_sentences": self.recomputed_sentences,
+            "merge_reused": self.merge_reused,
+        }
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "ner": {key: [list(span) for span in spans] for key, spans in self.ner.items()},
+            "aliases": self.aliases,
+            "merge": self.merge,
+        }
+
+
+def load_book_state(
+    book_id: str,
+    ner_recognizer: NERRecognizer,
+    alias_recognizer: AliasRecognizer
+) -> BookState:
+    """读取一本书的增量识别状态；没有历史数据时返回空状态"""
+    fingerprint = state_fingerprint(ner_recognizer, alias_recognizer)
+    state = BookState(book_id, fingerprint, fetch_book_state(book_id))
+    if state.has_previous:
+        logger.info(f"读取增量识别状态: book_id={book_id}")
+    return state
+
+
+def save_book_state(state: BookState) -> None:
+    """保存一本书的增量识别状态"""
+    cache_book_state(state.book_id, state.to_payload())
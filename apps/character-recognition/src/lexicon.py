@@ -0,0 +1,90 @@
+"""书籍人名词典
+按 book_id 保存一本书识别出的人物名（提及次数不少于 NAME_LEXICON_MIN_MENTIONS）。
+再次识别同一本书时，对需要重新识别且包含这些名字的句子，NER 期间把名字以 nr 词性写入
+Jieba 用户词典（结束后恢复），提高新增章节中已知人物的召回，且不会影响其他书籍。
+词典随请求创建、持久化到 Redis；进程内只按 LRU 保留最近使用的 NAME_LEXICON_CACHE_SIZE 本书。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .cache import cache_name_lexicon, fetch_name_lexicon
+from .config import settings
+from .core.ner_engines import is_likely_name, is_valid_name
+
+
+# 进程内最近使用的书籍词典：book_id -> 人名元组
+_recent: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+class NameLexicon:
+    """一本书的人名词典（每个请求一个实例）"""
+
+    def __init__(self, book_id: Optional[str], names: Sequence[str] = ()):
+        self.book_id = book_id
+        self.names: Tuple[str, ...] = tuple(names)
+        self._loaded = frozenset(self.names)
+
+    @property
+    def changed(self) -> bool:
+        """与读取时相比是否有变化"""
+        return frozenset(self.names) != self._loaded
+
+    def update(self, characters: Iterable[Any]) -> None:
+        """
+        用本次识别保留下来的人物刷新词典
+
+        Args:
+            characters: 按提及次数降序排列的人物列表，取提及次数不少于 NAME_LEXICON_MIN_MENTIONS 的
+                前 NAME_LEXICON_MAX_NAMES 个像人名的规范名
+        """
+        names = []
+        for character in characters:
+            if character.mentions < settings.NAME_LEXICON_MIN_MENTIONS:
+                break
+            name = character.canonical_name
+            if name not in names and is_valid_name(name) and is_likely_name(name):
+                names.append(name)
+                if len(names) >= settings.NAME_LEXICON_MAX_NAMES:
+                    break
+        self.names = tuple(names)
+
+
+def load_lexicon(book_id: Optional[str]) -> NameLexicon:
+    """读取一本书的人名词典：先查进程内 LRU，再查 Redis；没有 book_id 时返回空词典"""
+    if not book_id or not settings.NAME_LEXICON_ENABLED:
+        return NameLexicon(book_id)
+
+    with _recent_lock:
+        names = _recent.get(book_id)
+        if names is not None:
+            _recent.move_to_end(book_id)
+
+    if names is None:
+        names = tuple(fetch_name_lexicon(book_id) or ())
+        _remember(book_id, names)
+        if names:
+            logger.info(f"读取人名词典: book_id={book_id}, {len(names)} 个人名")
+
+    return NameLexicon(book_id, names)
+
+
+def save_lexicon(lexicon: NameLexicon) -> None:
+    """词典有变化时保存到进程内 LRU 和 Redis"""
+    if not lexicon.book_id or not settings.NAME_LEXICON_ENABLED or not lexicon.changed:
+        return
+
+    _remember(lexicon.book_id, lexicon.names)
+    cache_name_lexicon(lexicon.book_id, list(lexicon.names))
+
+
+def _remember(book_id: str, names: Tuple[str, ...]) -> None:
+    with _recent_lock:
+        _recent[book_id] = names
+        _recent.move_to_end(book_id)
+        while len(_recent) > settings.NAME_LEXICON_CACHE_SIZE:
+            _recent.popitem(last=False)
@@ -0,0 +1,73 @@
+"""ONNX 导出工具
+export_ner_onnx.py 与 export_embedding_onnx.py 共用：导出 HuggingFace BERT 模型并做 int8 动态量化。
+torch / transformers / onnxruntime.quantization 只在导出时导入，服务运行时不依赖。
+"""
+import json
+import os
+from typing import Any, Callable, Dict
+
+from loguru import logger
+
+
+def export_quantized(
+    model_name: str,
+    output_dir: str,
+    model_class: str,
+    sample_text: str,
+    output_name: str,
+    config: Callable[[Any], Dict[str, Any]]
+) -> str:
+    """
+    导出 ONNX 模型并做 int8 动态量化，同时保存词表和 config.json
+
+    Args:
+        model_name: HuggingFace 上的模型
+        output_dir: 输出目录
+        model_class: transformers 中的模型类名，如 AutoModel / AutoModelForTokenClassification
+        sample_text: 用于追踪计算图的示例句子
+        output_name: 模型输出名，如 logits / last_hidden_state
+        config: 根据加载的模型生成运行时配置（与 {"model": model_name} 一并写入 config.json）
+
+    Returns:
+        量化后模型路径
+    """
+    import torch
+    import transformers
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    int8_path = os.path.join(output_dir, "model.int8.onnx")
+
+    logger.info(f"正在加载模型: {model_name}")
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+    model = getattr(transformers, model_class).from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer([sample_text], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + [output_name]}
+
+    logger.info(f"正在导出 ONNX: {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    logger.info(f"正在进行 int8 动态量化: {int8_path}")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+    # 运行时只需要词表和 config.json
+    tokenizer.save_vocabulary(output_dir)
+    with open(os.path.join(output_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, **config(model)}, f, ensure_ascii=False, indent=2)
+
+    logger.info("✅ 导出完成")
+    return int8_path
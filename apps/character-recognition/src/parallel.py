@@ -0,0 +1,251 @@
+"""分片并行识别
+把整本书按章节（或按大小）切成若干分片，在进程池中并行执行预处理、NER 计数和别名识别，
+再在主进程中汇总各分片的计数，交给全局的 merge_characters。
+"""
+
+import multiprocessing
+import threading
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .config import settings
+from .core import AliasHits, AliasRecognizer, ChapterIndexer, NERRecognizer, TextPreprocessor
+from .core.ner import NameHits
+from .incremental import BookState
+
+
+_shard_pool: Optional[ProcessPoolExecutor] = None
+_shard_pool_lock = threading.Lock()
+
+# 子进程内复用的识别组件，由进程池 initializer 创建
+_worker_components: Optional[Tuple[TextPreprocessor, NERRecognizer, AliasRecognizer]] = None
+
+
+def get_shard_pool() -> ProcessPoolExecutor:
+    """
+    获取分片识别进程池；进程池在多个任务间复用，而不是每个请求重新创建。
+
+    执行池的多个线程可能同时发起分片识别，创建过程在锁内进行。
+    调用方进程通常已有多个线程（uvicorn、执行池、心跳），子进程用 forkserver（不支持时用 spawn）
+    启动，而不是直接 fork 当前进程。
+    """
+    global _shard_pool
+
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            logger.info(f"创建分片识别进程池: {settings.SHARD_WORKERS} 个进程 ({method})")
+            _shard_pool = ProcessPoolExecutor(
+                max_workers=settings.SHARD_WORKERS,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_shard_worker
+            )
+
+        return _shard_pool
+
+
+def shutdown_shard_pool() -> None:
+    """关闭分片识别进程池"""
+    global _shard_pool
+
+    with _shard_pool_lock:
+        pool, _shard_pool = _shard_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _discard_shard_pool(pool: ProcessPoolExecutor) -> None:
+    """子进程异常退出（如被 OOM killer 杀死）后进程池不再可用：丢弃，下一次请求重新创建"""
+    global _shard_pool
+
+    with _shard_pool_lock:
+        if _shard_pool is not pool:
+            return
+        _shard_pool = None
+    logger.warning("分片识别进程池已损坏，下一次分片识别时重新创建")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def split_shards(text: str, max_chars: int) -> List[str]:
+    """
+    将原始文本切分为分片
+
+    只在句末标点之后切分（保证各分片的预处理结果可以直接拼接），
+    优先选择不超过 max_chars 的最后一个章节边界，找不到时退化为按大小切分。
+
+    Args:
+        text: 原始文本
+        max_chars: 单个分片的最大字符数
+
+    Returns:
+        分片列表，依次拼接等于原文
+    """
+    sentence_pattern = TextPreprocessor().sentence_pattern
+
+    # 章节边界：章节标题之前最后一个句末标点之后
+    chapter_cuts: List[int] = []
+    search_from = 0
+    for heading in ChapterIndexer.HEADING_PATTERN.finditer(text):
+        cut = _last_boundary(sentence_pattern, text, search_from, heading.start())
+        if cut > 0:
+            chapter_cuts.append(cut)
+        search_from = heading.start()
+
+    shards: List[str] = []
+    start = 0
+    while len(text) - start > max_chars:
+        limit = start + max_chars
+
+        idx = bisect_right(chapter_cuts, limit) - 1
+        if idx >= 0 and chapter_cuts[idx] > start:
+            cut = chapter_cuts[idx]
+        else:
+            cut = _last_boundary(sentence_pattern, text, start, limit)
+
+        if cut <= start:
+            # 超长句子：只能在下一个句末标点之后切分
+            match = sentence_pattern.search(text, limit)
+            if not match:
+                break
+            cut = match.end()
+
+        shards.append(text[start:cut])
+        start = cut
+
+    shards.append(text[start:])
+    return shards
+
+
+def _last_boundary(pattern, text: str, start: int, end: int) -> int:
+    """text[start:end] 中最后一个句末标点之后的位置，找不到返回 -1"""
+    cut = -1
+    for match in pattern.finditer(text, start, end):
+        cut = match.end()
+    return cut
+
+
+def _init_shard_worker() -> None:
+    """进程池 initializer：每个子进程只加载一次 Jieba 词典"""
+    global _worker_components
+
+    ner_recognizer = NERRecognizer()
+    ner_recognizer.initialize()
+    _worker_components = (TextPreprocessor(), ner_recognizer, AliasRecognizer())
+
+
+def _recognize_shard(
+    shard: str,
+    is_first: bool,
+    is_last: bool,
+    record: bool = False,
+    lexicon: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    在子进程中处理一个分片：预处理、NER 计数、别名识别
+
+    record 为 True 时同时记录逐句结果（增量识别状态），随结果返回主进程；
+    lexicon 为本书的人名词典，识别期间写入子进程的 Jieba 用户词典。
+    """
+    if _worker_components is None:
+        _init_shard_worker()
+
+    preprocessor, ner_recognizer, alias_recognizer = _worker_components
+    cleaned_length, sentences, bounds = preprocessor.preprocess_fragment(
+        shard, is_first=is_first, is_last=is_last
+    )
+    offsets = preprocessor.sentence_offsets(sentences, bounds)
+
+    # 别名只计数，提及由主进程按全书计数生成，避免大量提及对象在进程间序列化
+    alias_hits = AliasHits()
+    state = BookState("", "") if record else None
+    for sent_id, sentence in enumerate(sentences):
+        if state is None:
+            spans = alias_recognizer.sentence_alias_spans(sentence)
+        else:
+            spans = state.alias_spans(sentence, alias_recognizer.sentence_alias_spans)
+        alias_hits.add_spans(spans, sent_id, offsets[sent_id])
+
+    result = {
+        "cleaned_length": cleaned_length,
+        "sentences": sentences,
+        "bounds": bounds,
+        "name_hits": ner_recognizer.count_names(
+            sentences, offsets=offsets, book_state=state, lexicon=lexicon
+        ),
+        "alias_hits": alias_hits,
+    }
+    if state is not None:
+        result["book_state"] = state.export_sentences()
+    return result
+
+
+def recognize_sharded(
+    text: str,
+    on_shard: Optional[Callable[[int, int], None]] = None,
+    book_state: Optional[BookState] = None,
+    lexicon: Sequence[str] = ()
+) -> Tuple[List[str], List[Tuple[int, int]], int, NameHits, AliasHits]:
+    """
+    分片并行执行预处理、NER 计数和别名识别，并按原文顺序汇总
+
+    Args:
+        text: 原始文本
+        on_shard: 每完成一个分片回调 (已处理句子数, 已处理原文字符数)
+        book_state: 增量识别状态；提供时各分片记录逐句结果并按顺序汇入
+        lexicon: 本书的人名词典
+
+    Returns:
+        sentences: 全书句子列表
+        bounds: 全书句子边界（清洗后文本中的位置）
+        cleaned_length: 清洗后文本长度
+        name_hits: 汇总后的候选人名命中记录（按全书首次出现顺序）
+        alias_hits: 汇总后的别名命中记录（sent_id 和位置已换算为全书编号）
+    """
+    shards = split_shards(text, settings.SHARD_MAX_CHARS)
+    logger.info(f"分片识别: {len(shards)} 个分片, 文本长度 {len(text)}")
+
+    sentences: List[str] = []
+    bounds: List[Tuple[int, int]] = []
+    name_hits = NameHits()
+    alias_hits = AliasHits()
+    offset = 0
+    raw_consumed = 0
+
+    pool = get_shard_pool()
+    try:
+        futures = [
+            pool.submit(
+                _recognize_shard, shard, idx == 0, idx == len(shards) - 1, book_state is not None, tuple(lexicon)
+            )
+            for idx, shard in enumerate(shards)
+        ]
+
+        # 按分片顺序归并，保证句子编号、提及顺序和计数顺序与串行一致
+        for shard, future in zip(shards, futures):
+            result = future.result()
+            sent_offset = len(sentences)
+
+            sentences.extend(result["sentences"])
+            bounds.extend((start + offset, end + offset) for start, end in result["bounds"])
+
+            name_hits.merge(result["name_hits"], sent_offset=sent_offset, char_offset=offset)
+
+            alias_hits.merge(result["alias_hits"], sent_offset=sent_offset, char_offset=offset)
+
+            if book_state is not None:
+                book_state.absorb(result["book_state"])
+
+            offset += result["cleaned_length"]
+
+            raw_consumed += len(shard)
+            if on_shard:
+                on_shard(len(sentences), raw_consumed)
+    except BrokenProcessPool:
+        _discard_shard_pool(pool)
+        raise
+
+    return sentences, bounds, offset, name_hits, alias_hits
@@ -0,0 +1,198 @@
+"""任务进度上报
+识别过程中的进度写入 task_manager（任务状态）与 cache_meta（兼容旧接口的元数据），
+阶段产物与最终结果写入 Redis 缓存。
+
+逐句进度按时间与进度增量合并：距上次写入不足 PROGRESS_PUBLISH_INTERVAL_MS 毫秒、
+且进度增长不足 PROGRESS_PUBLISH_DELTA 个百分点时不写入，只计数；开始、阶段切换、
+最后一句以及完成/失败总是立即写入。每次写入只包含与上次写入不同的字段。
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .cache import cache_meta, cache_result, cache_stage
+from .config import settings
+from .task_manager import TaskStatus, task_manager
+
+
+class ProgressReporter:
+    """统一管理进度上报与 Redis 缓存"""
+
+    STAGE_PROGRESS = {
+        "preprocess": 10,
+        "ner": 60,
+        "merge": 70,
+        "coreference": 78,
+        "relations": 92,
+        "result": 96,
+    }
+
+    STAGE_MESSAGES = {
+        "preprocess": "文本预处理完成",
+        "ner": "人名识别中",
+        "merge": "别名合并完成",
+        "coreference": "指代消解完成",
+        "relations": "关系抽取完成",
+        "result": "结果组装完成",
+    }
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.total_sentences = 0
+        self.processed_sentences = 0
+        self.progress = 0
+        self.status = TaskStatus.PROCESSING
+        self.message = ""
+        self.incremental: Optional[Dict[str, Any]] = None
+
+        # 上次写入的字段值，只写入发生变化的字段
+        self._published: Dict[str, Any] = {}
+        self._published_at = 0.0
+        self._published_progress = 0
+
+        # 写入 / 合并跳过的进度更新次数
+        self.published_updates = 0
+        self.suppressed_updates = 0
+
+    def start(self) -> None:
+        self._publish(progress=0, message="开始识别角色")
+
+    def on_sentence(self, processed: int, total: int) -> None:
+        self.total_sentences = max(self.total_sentences, total)
+        self.processed_sentences = max(self.processed_sentences, processed)
+
+        progress = self._calc_sentence_progress()
+        if not self._should_publish_sentence(progress):
+            self.suppressed_updates += 1
+            return
+
+        message = f"逐句识别中 ({self.processed_sentences}/{self.total_sentences})"
+        self._publish(progress=progress, message=message)
+
+    def on_stage(self, stage: str, payload: Dict[str, Any]) -> None:
+        # 写入阶段产物缓存
+        cache_stage(self.task_id, stage, payload or {})
+
+        if stage == "preprocess":
+            self.total_sentences = payload.get("total_sentences", self.total_sentences)
+        elif stage == "incremental":
+            self.incremental = payload
+
+        target_progress = self.STAGE_PROGRESS.get(stage)
+        message = self.STAGE_MESSAGES.get(stage, "识别中")
+
+        if target_progress is not None:
+            self._publish(progress=target_progress, message=message)
+
+    def complete(self, result: Dict[str, Any]) -> None:
+        cache_result(self.task_id, result)
+        self.status = TaskStatus.COMPLETED
+        self._publish(
+            status=TaskStatus.COMPLETED,
+            progress=100,
+            message="识别完成",
+            result=result
+        )
+
+    def fail(self, error: str) -> None:
+        self.status = TaskStatus.FAILED
+        self._publish(
+            status=TaskStatus.FAILED,
+            progress=self.progress,
+            message="识别失败",
+            error=error
+        )
+
+    def retry(self, error: str) -> None:
+        """本次执行失败，任务已重新入队等待重试"""
+        self.status = TaskStatus.PENDING
+        self._publish(
+            status=TaskStatus.PENDING,
+            progress=self.progress,
+            message="识别失败，等待重试",
+            error=error
+        )
+
+    def meta_snapshot(self) -> Dict[str, Any]:
+        snapshot = {
+            "status": self.status.value if isinstance(self.status, TaskStatus) else self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "processed_sentences": self.processed_sentences,
+            "total_sentences": self.total_sentences,
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        # 增量识别时附带复用 / 重新识别的句子数
+        if self.incremental:
+            snapshot["incremental"] = self.incremental
+        return snapshot
+
+    def publish_stats(self) -> Dict[str, int]:
+        """进度写入统计"""
+        return {"published": self.published_updates, "suppressed": self.suppressed_updates}
+
+    def _calc_sentence_progress(self) -> int:
+        if not self.total_sentences:
+            return max(self.progress, self.STAGE_PROGRESS["preprocess"])
+
+        ratio = min(self.processed_sentences / self.total_sentences, 1)
+        span = self.STAGE_PROGRESS["ner"] - self.STAGE_PROGRESS["preprocess"]
+        return max(self.progress, self.STAGE_PROGRESS["preprocess"] + int(ratio * span))
+
+    def _should_publish_sentence(self, progress: int) -> bool:
+        """逐句进度是否需要立即写入"""
+        if self.total_sentences and self.processed_sentences >= self.total_sentences:
+            return True
+        if progress - self._published_progress >= settings.PROGRESS_PUBLISH_DELTA:
+            return True
+        return (time.monotonic() - self._published_at) * 1000 >= settings.PROGRESS_PUBLISH_INTERVAL_MS
+
+    def _publish(
+        self,
+        *,
+        status: TaskStatus = TaskStatus.PROCESSING,
+        progress: Optional[int] = None,
+        message: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        if progress is not None:
+            self.progress = max(self.progress, progress)
+
+        self.status = status or self.status
+        if message is not None:
+            self.message = message
+
+        fields = {
+            "status": self.status.value if isinstance(self.status, TaskStatus) else self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": error,
+            "processed_sentences": self.processed_sentences,
+            "total_sentences": self.total_sentences,
+        }
+        changed = {
+            key: value for key, value in fields.items()
+            if key not in self._published or self._published[key] != value
+        }
+        if not changed and result is None:
+            self.suppressed_updates += 1
+            return
+
+        task_manager.update_task(
+            self.task_id,
+            status=TaskStatus(changed["status"]) if "status" in changed else None,
+            progress=changed.get("progress"),
+            message=changed.get("message"),
+            total_sentences=changed.get("total_sentences"),
+            processed_sentences=changed.get("processed_sentences"),
+            result=result,
+            error=error
+        )
+
+        cache_meta(self.task_id, {**changed, "updated_at": datetime.utcnow().isoformat()})
+
+        self._published.update(changed)
+        self._published_at = time.monotonic()
+        self._published_progress = self.progress
+        self.published_updates += 1
@@ -1,7 +1,10 @@
 """主识别器"""
 import re
+import threading
 import time
-from typing import Callable, Dict, Any, Optional
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
 from loguru import logger
 
 from .config import settings
@@ -11,12 +14,20 @@ from .models import (
     RecognitionStatistics
 )
 from .core import (
+    Chapter,
+    MentionTable,
+    ChapterIndexer,
     TextPreprocessor,
     NERRecognizer,
     AliasRecognizer,
+    AliasHits,
+    AliasIndex,
     CoreferenceResolver,
     RelationExtractor
 )
+from .incremental import BookState, load_book_state, save_book_state
+from .lexicon import NameLexicon, load_lexicon, save_lexicon
+from .parallel import recognize_sharded
 
 
 class CharacterRecognizer:
@@ -31,22 +42,25 @@ class CharacterRecognizer:
         self.relation_extractor = RelationExtractor()
         
         self._initialized = False
+        # API 执行池中的多个线程可能同时触发首次初始化
+        self._init_lock = threading.Lock()
     
     def initialize(self):
         """延迟初始化（加载模型）"""
-        if self._initialized:
-            return
-        
-        logger.info("正在初始化人物识别器...")
-        
-        # 初始化 NER 模型
-        self.ner_recognizer.initialize()
-        
-        # 初始化句向量模型
-        self.alias_recognizer.initialize()
-        
-        self._initialized = True
-        logger.info("人物识别器初始化完成")
+        with self._init_lock:
+            if self._initialized:
+                return
+
+            logger.info("正在初始化人物识别器...")
+
+            # 初始化 NER 模型
+            self.ner_recognizer.initialize()
+
+            # 初始化句向量模型
+            self.alias_recognizer.initialize()
+
+            self._initialized = True
+            logger.info("人物识别器初始化完成")
     
     def recognize(
         self,
@@ -73,59 +87,127 @@ class CharacterRecognizer:
         options = request.options
         
         logger.info(f"开始识别人物，文本长度: {len(text)}")
-        
-        # 1. 文本预处理
-        cleaned_text, sentences, bounds = self.preprocessor.preprocess(text)
-        total_sentences = len(sentences)
 
-        if on_stage:
-            on_stage("preprocess", {
-                "text_length": len(text),
-                "cleaned_length": len(cleaned_text),
-                "total_sentences": total_sentences
-            })
-        
-        # 2. NER 识别人名
-        name_mentions = self.ner_recognizer.recognize(
-            sentences,
-            on_sentence=lambda processed: on_sentence(processed, total_sentences) if on_sentence else None
-        )
+        # 同一本书上一次识别出的人名，NER 期间写入 Jieba 用户词典；不属于任何书籍时为空词典
+        book_id = self._book_id(request)
+        lexicon = load_lexicon(book_id)
 
-        if on_stage:
-            on_stage("ner", {"mentions": len(name_mentions), "total_sentences": total_sentences})
+        # 增量识别：读取同一本书上一次的逐句结果
+        book_state = None
+        if book_id and settings.INCREMENTAL_ENABLED:
+            book_state = load_book_state(book_id, self.ner_recognizer, self.alias_recognizer)
         
-        # 3. 识别别名和称呼（始终执行，作为 NER 的补充）
-        # NER 只识别标准人名，别名识别可以捕获"山羊头"、"白大褂"等特殊称呼
-        alias_mentions = self.alias_recognizer.recognize_aliases(sentences)
-        logger.info(f"规则化的别名识别完成: {len(alias_mentions)} 个提及")
+        # 聚合模式下出现次数不足的别名称呼不生成提及
+        alias_min_count = self._alias_min_count()
 
-        if on_stage:
-            on_stage("aliases", {
-                "alias_mentions": len(alias_mentions),
-                "total_sentences": total_sentences
-            })
+        # 1~3. 预处理、NER 与别名识别
+        # 有历史结果时只需识别改动的句子，不再分片
+        if self._use_sharding(text) and not (book_state and book_state.has_previous):
+            sentences, chapters, name_mentions, alias_mentions = self._recognize_sharded(
+                text, on_sentence, on_stage, book_state, lexicon, alias_min_count
+            )
+            total_sentences = len(sentences)
+        elif self._use_streaming(text):
+            sentences, chapters, name_mentions, alias_mentions = self._recognize_streaming(
+                text, on_sentence, on_stage, book_state, lexicon, alias_min_count
+            )
+            total_sentences = len(sentences)
+        else:
+            # 1. 文本预处理与章节检测
+            cleaned_text, sentences, bounds = self.preprocessor.preprocess(text)
+            chapters = self.preprocessor.build_chapters(sentences, bounds, len(cleaned_text))
+            total_sentences = len(sentences)
+
+            if on_stage:
+                on_stage("preprocess", {
+                    "text_length": len(text),
+                    "cleaned_length": len(cleaned_text),
+                    "total_sentences": total_sentences,
+                    "chapters": len(chapters)
+                })
+
+            # 2. NER 识别人名（逐次出现的提及，位置为清洗后全文偏移）
+            offsets = self.preprocessor.sentence_offsets(sentences, bounds)
+            name_hits = self.ner_recognizer.count_names(
+                sentences,
+                offsets=offsets,
+                on_sentence=lambda processed: on_sentence(processed, total_sentences) if on_sentence else None,
+                book_state=book_state,
+                lexicon=lexicon.names
+            )
+            name_mentions = self.ner_recognizer.build_table(name_hits)
+
+            if on_stage:
+                on_stage("ner", {
+                    "mentions": len(name_mentions),
+                    "total_sentences": total_sentences,
+                    "cache": name_hits.cache_stats()
+                })
+
+            # 3. 识别别名和称呼（始终执行，作为 NER 的补充）
+            # NER 只识别标准人名，别名识别可以捕获"山羊头"、"白大褂"等特殊称呼
+            alias_hits = AliasHits()
+            for sent_id, sentence in enumerate(sentences):
+                self._count_sentence_aliases(sentence, sent_id, offsets[sent_id], alias_hits, book_state)
+            alias_mentions = self.alias_recognizer.build_table(alias_hits, alias_min_count)
+            logger.info(f"规则化的别名识别完成: {len(alias_mentions)} 个提及")
+
+            if on_stage:
+                on_stage("aliases", {
+                    "alias_mentions": len(alias_mentions),
+                    "alias_forms": len(alias_hits),
+                    "total_sentences": total_sentences
+                })
         
-        # 4. 合并所有提及
-        all_mentions = name_mentions + alias_mentions
+        # 4. 合并所有提及（列式提及表）
+        all_mentions = MentionTable.concat([name_mentions, alias_mentions])
         
         # 5. 实体合并
         threshold = options.similarity_threshold or settings.SIMILARITY_THRESHOLD
+
+        # 句子序列与配置都没变时直接复用上一次的合并分组
+        merge_groups = None
+        if book_state is not None:
+            merge_key = book_state.merge_key(
+                threshold, self.alias_recognizer.embedding_model_id, alias_min_count
+            )
+            merge_groups = book_state.previous_merge_groups(merge_key)
+
+        merge_stats: Dict[str, int] = {}
         characters, alias_map = self.alias_recognizer.merge_characters(
             mentions=all_mentions,
             sentences=sentences,
             book_id=request.book_id,
-            threshold=threshold
+            threshold=threshold,
+            merge_groups=merge_groups,
+            merge_stats=merge_stats
         )
 
+        if book_state is not None:
+            book_state.record_merge(merge_key, characters, reused=merge_groups is not None)
+            save_book_state(book_state)
+            logger.info(
+                f"增量识别: 复用 {book_state.reused_sentences} 句, "
+                f"重新识别 {book_state.recomputed_sentences} 句"
+            )
+            if on_stage:
+                on_stage("incremental", book_state.statistics())
+
         if on_stage:
             on_stage("merge", {
                 "characters": len(characters),
-                "alias_map_size": len(alias_map)
+                "alias_map_size": len(alias_map),
+                "string_pairs": merge_stats
             })
         
+        # 别名索引只构建一次，指代消解和关系抽取共用
+        alias_index = None
+        if options.enable_coreference or options.enable_relations:
+            alias_index = AliasIndex(alias_map)
+
         # 6. 指代消解（可选）
         if options.enable_coreference:
-            self.coreference_resolver.resolve(sentences, characters, alias_map)
+            self.coreference_resolver.resolve(sentences, characters, alias_map, alias_index)
             if on_stage:
                 on_stage("coreference", {"characters": len(characters)})
 
@@ -133,7 +215,7 @@ class CharacterRecognizer:
         relations = []
         if options.enable_relations:
             relations = self.relation_extractor.extract_relations(
-                sentences, characters, alias_map
+                sentences, characters, alias_map, alias_index
             )
             if on_stage:
                 on_stage("relations", {"relations": len(relations)})
@@ -141,6 +223,15 @@ class CharacterRecognizer:
         # 8. 过滤和排序
         characters = self._filter_characters(characters, options)
         characters = sorted(characters, key=lambda c: c.mentions, reverse=True)
+
+        # 更新本书的人名词典，供下一次识别使用
+        lexicon.update(characters)
+        save_lexicon(lexicon)
+
+        if on_stage:
+            on_stage("chapters", {
+                "chapters": self._chapter_statistics(chapters, all_mentions, alias_map, characters)
+            })
         
         # 9. 构建响应（使用新的数据库格式）
         processing_time = time.time() - start_time
@@ -171,6 +262,216 @@ class CharacterRecognizer:
         
         return response
     
+    def _use_sharding(self, text: str) -> bool:
+        """是否使用分片并行识别（需配置进程数，且文本超过 SHARD_MIN_LENGTH）"""
+        if settings.SHARD_WORKERS <= 0:
+            return False
+        return len(text) >= settings.SHARD_MIN_LENGTH
+
+    @staticmethod
+    def _book_id(request: RecognitionRequest) -> Optional[str]:
+        """请求所属的书籍；未提供 book_id 或为默认值 DEFAULT_BOOK_ID 时返回 None，不读写按书保存的状态"""
+        if not request.book_id or request.book_id == settings.DEFAULT_BOOK_ID:
+            return None
+        return request.book_id
+
+    @staticmethod
+    def _alias_min_count() -> int:
+        """
+        别名称呼的最少出现次数：聚合模式（settings.ALIAS_AGGREGATION_ENABLED）下不足该次数的称呼不生成提及
+
+        关闭时为 1，结果与逐句生成提及完全一致。
+        """
+        if not settings.ALIAS_AGGREGATION_ENABLED:
+            return 1
+        return max(1, settings.ALIAS_MIN_COUNT)
+
+    def _count_sentence_aliases(
+        self,
+        sentence: str,
+        sent_id: int,
+        offset: int,
+        hits: AliasHits,
+        book_state: Optional[BookState]
+    ) -> None:
+        """识别单个句子的别名并计入 hits；增量识别时优先复用历史结果"""
+        if book_state is None:
+            spans = self.alias_recognizer.sentence_alias_spans(sentence)
+        else:
+            spans = book_state.alias_spans(sentence, self.alias_recognizer.sentence_alias_spans)
+        hits.add_spans(spans, sent_id, offset)
+
+    def _recognize_sharded(
+        self,
+        text: str,
+        on_sentence: Optional[Callable[[int, int], None]] = None,
+        on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        book_state: Optional[BookState] = None,
+        lexicon: Optional[NameLexicon] = None,
+        alias_min_count: int = 1
+    ) -> Tuple[List[str], List[Chapter], MentionTable, MentionTable]:
+        """
+        分片并行执行预处理、NER 和别名识别
+
+        各分片在进程池中独立处理，主进程按顺序归并句子与计数，
+        NER 的频次过滤作用在汇总后的全书计数上，结果与串行路径一致。
+        提供 book_state 时各分片同时记录逐句结果，供下一次增量识别使用。
+        """
+        def report(processed: int, raw_consumed: int) -> None:
+            if on_sentence:
+                estimated = int(processed * len(text) / max(raw_consumed, 1))
+                on_sentence(processed, max(processed, estimated))
+
+        sentences, bounds, cleaned_length, name_hits, alias_hits = recognize_sharded(
+            text, on_shard=report, book_state=book_state, lexicon=lexicon.names if lexicon else ()
+        )
+        chapters = self.preprocessor.build_chapters(sentences, bounds, cleaned_length)
+        name_mentions = self.ner_recognizer.build_table(name_hits)
+        alias_mentions = self.alias_recognizer.build_table(alias_hits, alias_min_count)
+        total_sentences = len(sentences)
+        logger.info(f"分片识别完成: {total_sentences} 个句子, {len(name_mentions)} 个人名提及")
+
+        if on_stage:
+            on_stage("preprocess", {
+                "text_length": len(text),
+                "cleaned_length": cleaned_length,
+                "total_sentences": total_sentences,
+                "chapters": len(chapters),
+                "sharded": True
+            })
+            on_stage("ner", {
+                "mentions": len(name_mentions),
+                "total_sentences": total_sentences,
+                "cache": name_hits.cache_stats()
+            })
+            on_stage("aliases", {
+                "alias_mentions": len(alias_mentions),
+                "alias_forms": len(alias_hits),
+                "total_sentences": total_sentences
+            })
+
+        return sentences, chapters, name_mentions, alias_mentions
+
+    def _use_streaming(self, text: str) -> bool:
+        """是否使用流式预处理（文本超过 STREAMING_MIN_LENGTH）"""
+        return len(text) >= settings.STREAMING_MIN_LENGTH
+
+    def _recognize_streaming(
+        self,
+        text: str,
+        on_sentence: Optional[Callable[[int, int], None]] = None,
+        on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        book_state: Optional[BookState] = None,
+        lexicon: Optional[NameLexicon] = None,
+        alias_min_count: int = 1
+    ) -> Tuple[List[str], List[Chapter], MentionTable, MentionTable]:
+        """
+        流式执行预处理、NER 和别名识别
+
+        预处理按块产出句子，NER 逐句消费同一个流，别名识别和章节检测在同一遍中完成，
+        不再构建完整的清洗文本和句子边界列表。
+
+        API 请求的原始文本已整体载入内存，这里节省的只是清洗文本与句子边界的副本，
+        原始文本本身的内存无法节省；从文件读取时可直接把文件对象传给 iter_sentences。
+        """
+        sentences: List[str] = []
+        offsets: List[int] = []
+        chapter_indexer = ChapterIndexer()
+        alias_hits = AliasHits()
+        consumed = {"chars": 0}
+
+        def sentence_stream() -> Iterator[str]:
+            for sent_id, (sentence, start, end) in enumerate(
+                self.preprocessor.iter_sentences(text)
+            ):
+                sentences.append(sentence)
+                offsets.append(end - len(sentence))
+                chapter_indexer.feed(sent_id, sentence, start, end)
+                self._count_sentence_aliases(sentence, sent_id, offsets[-1], alias_hits, book_state)
+                consumed["chars"] = end
+                yield sentence
+
+        def report(processed: int) -> None:
+            # 总句数未知，按已消费字符比例估算
+            if on_sentence:
+                estimated = int(processed * len(text) / max(consumed["chars"], 1))
+                on_sentence(processed, max(processed, estimated))
+
+        # offsets 与句子流同步增长，NER 取到第 i 句时第 i 个偏移已就绪
+        name_hits = self.ner_recognizer.count_names(
+            sentence_stream(), offsets=offsets, on_sentence=report, book_state=book_state,
+            lexicon=lexicon.names if lexicon else ()
+        )
+        name_mentions = self.ner_recognizer.build_table(name_hits)
+        alias_mentions = self.alias_recognizer.build_table(alias_hits, alias_min_count)
+        total_sentences = len(sentences)
+        chapters = chapter_indexer.finish(total_sentences, consumed["chars"])
+        logger.info(f"流式预处理完成: {total_sentences} 个句子, {consumed['chars']} 字符")
+
+        if on_stage:
+            on_stage("preprocess", {
+                "text_length": len(text),
+                "cleaned_length": consumed["chars"],
+                "total_sentences": total_sentences,
+                "chapters": len(chapters),
+                "streaming": True
+            })
+            on_stage("ner", {
+                "mentions": len(name_mentions),
+                "total_sentences": total_sentences,
+                "cache": name_hits.cache_stats()
+            })
+            on_stage("aliases", {
+                "alias_mentions": len(alias_mentions),
+                "alias_forms": len(alias_hits),
+                "total_sentences": total_sentences
+            })
+
+        return sentences, chapters, name_mentions, alias_mentions
+
+    def _chapter_statistics(
+        self,
+        chapters: List[Chapter],
+        mentions: MentionTable,
+        alias_map: Dict[str, str],
+        characters: list
+    ) -> List[Dict[str, Any]]:
+        """
+        按章节统计人物提及次数
+
+        章节表覆盖全部句子且按句子范围有序，直接用提及的 sent_id 二分定位章节，
+        再按 (章节, 人物) 分组计数，无需重新扫描文本。
+        """
+        if not chapters:
+            return []
+
+        kept_names = [c.canonical_name for c in characters]
+        char_index = {name: idx for idx, name in enumerate(kept_names)}
+
+        # 称呼 -> 保留的人物编号（-1 表示不统计）
+        name_to_char = np.array(
+            [char_index.get(alias_map.get(name), -1) for name in mentions.names] or [-1], dtype=np.int64
+        )
+        char_ids = name_to_char[mentions.name_ids]
+        starts = np.array([chapter.sent_start for chapter in chapters], dtype=np.int64)
+        chapter_ids = np.searchsorted(starts, mentions.sent_ids, side="right") - 1
+
+        valid = (char_ids >= 0) & (chapter_ids >= 0)
+        pair_codes = chapter_ids[valid] * len(kept_names) + char_ids[valid]
+        pairs, first_seen, counts = np.unique(pair_codes, return_index=True, return_counts=True)
+
+        # 每章内按次数降序，次数相同的人物按章内首次出现的先后排列
+        order = np.lexsort((first_seen, -counts, pairs // max(len(kept_names), 1)))
+        chapter_counts: List[Dict[str, int]] = [{} for _ in chapters]
+        for pair, count in zip(pairs[order].tolist(), counts[order].tolist()):
+            chapter_idx, char_idx = divmod(pair, len(kept_names))
+            chapter_counts[chapter_idx][kept_names[char_idx]] = count
+
+        return [
+            {**chapter.dict(), "characters": counts_of_chapter}
+            for chapter, counts_of_chapter in zip(chapters, chapter_counts)
+        ]
+
     def _filter_characters(
         self,
         characters: list,
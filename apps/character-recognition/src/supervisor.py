@@ -0,0 +1,287 @@
+"""预派生（prefork）Worker 进程池
+父进程只加载一次模型（Jieba 词典、句向量模型等），随后 fork 出 N 个子进程处理任务；
+子进程以写时复制（copy-on-write）方式共享父进程中的模型内存，不再各自加载。
+
+fork 前调用 gc.freeze()：父进程中已有的对象移入永久代，子进程的垃圾回收不再改写这些对象的头部，
+共享页不会因此被复制。父进程不处理任务、不启动线程，只负责重启退出的子进程、汇报各子进程的内存与在途任务。
+"""
+import gc
+import os
+import signal
+import time
+import uuid
+from multiprocessing.sharedctypes import RawArray
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .config import settings
+
+
+# 每个槽位在共享数组中的字段：在途任务数、已完成任务数
+_SLOT_FIELDS = 2
+
+# 运行时间短于该秒数即退出的子进程视为连续崩溃，按指数退避延迟重启
+_QUICK_EXIT_SECONDS = 60
+
+
+class ChildSlot:
+    """子进程槽位：子进程通过它上报在途任务（共享内存，父进程直接读取）"""
+
+    def __init__(self, index: int, counters: Any):
+        self.index = index
+        self.child_id = ""
+        self.pid = 0
+        self.started_at = 0.0
+        self.restarts = 0
+        self.quick_exits = 0
+        self.restart_at = 0.0
+        self._counters = counters
+
+    def task_started(self) -> None:
+        self._counters[self.index * _SLOT_FIELDS] += 1
+
+    def task_finished(self) -> None:
+        self._counters[self.index * _SLOT_FIELDS] -= 1
+        self._counters[self.index * _SLOT_FIELDS + 1] += 1
+
+    @property
+    def in_flight(self) -> int:
+        return self._counters[self.index * _SLOT_FIELDS]
+
+    @property
+    def completed(self) -> int:
+        return self._counters[self.index * _SLOT_FIELDS + 1]
+
+    def _reset_in_flight(self) -> None:
+        self._counters[self.index * _SLOT_FIELDS] = 0
+
+
+class WorkerSupervisor:
+    """预派生子进程的监督者"""
+
+    def __init__(
+        self,
+        child_main: Callable[[ChildSlot], None],
+        processes: int,
+        on_child_exit: Optional[Callable[[ChildSlot, int], None]] = None,
+        on_report: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            child_main: 子进程入口（在 fork 出的子进程中执行，返回后子进程退出）
+            processes: 子进程数
+            on_child_exit: 子进程退出后在父进程中调用，参数为槽位与退出码（被信号终止时为负的信号值）
+            on_report: 定期汇报时在父进程中调用，参数为 report() 的结果
+        """
+        self.child_main = child_main
+        self.on_child_exit = on_child_exit
+        self.on_report = on_report
+        self.counters = RawArray("q", max(1, processes) * _SLOT_FIELDS)
+        self.slots = [ChildSlot(idx, self.counters) for idx in range(max(1, processes))]
+        self.stopping = False
+        self._stop_signals = 0
+
+    # ===== 父进程主循环 =====
+    def run(self) -> None:
+        """启动全部子进程并持续监督，收到 SIGTERM / SIGINT 后通知子进程退出并等待其结束"""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        # 模型已在父进程中加载：冻结现有对象，避免子进程 GC 触发共享页复制
+        gc.disable()
+        gc.freeze()
+        self.spawn_all()
+
+        next_report = time.monotonic() + settings.WORKER_REPORT_INTERVAL
+        while self.poll():
+            if time.monotonic() >= next_report:
+                report = self.report()
+                if self.on_report is not None:
+                    self.on_report(report)
+                next_report = time.monotonic() + settings.WORKER_REPORT_INTERVAL
+            time.sleep(0.5)
+
+        logger.info("所有 Worker 子进程已退出")
+
+    def spawn_all(self) -> None:
+        for slot in self.slots:
+            self._spawn(slot)
+
+    def poll(self) -> bool:
+        """
+        回收已退出的子进程并按需重启
+
+        Returns:
+            是否仍有子进程在运行（或等待重启）
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            slot = next((slot for slot in self.slots if slot.pid == pid), None)
+            if slot is not None:
+                self._on_exit(slot, os.waitstatus_to_exitcode(status))
+
+        now = time.monotonic()
+        for slot in self.slots:
+            if not slot.pid and not self.stopping and slot.restart_at <= now:
+                self._spawn(slot)
+
+        return any(slot.pid for slot in self.slots) or not self.stopping
+
+    def stop(self, sig: int = signal.SIGTERM) -> None:
+        """通知全部子进程退出（子进程处理完当前任务后退出）"""
+        self.stopping = True
+        for slot in self.slots:
+            if slot.pid:
+                try:
+                    os.kill(slot.pid, sig)
+                except ProcessLookupError:
+                    pass
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各子进程状态：RSS / PSS（MB，PSS 按共享页平摊）、在途任务数、已完成任务数与重启次数"""
+        stats = []
+        for slot in self.slots:
+            memory = _process_memory_mb(slot.pid) if slot.pid else {}
+            stats.append({
+                "slot": slot.index,
+                "pid": slot.pid,
+                "child_id": slot.child_id,
+                "rss_mb": memory.get("rss"),
+                "pss_mb": memory.get("pss"),
+                "in_flight": slot.in_flight,
+                "completed": slot.completed,
+                "restarts": slot.restarts,
+                "uptime": round(time.monotonic() - slot.started_at) if slot.pid else 0,
+            })
+        return stats
+
+    def report(self) -> Dict[str, Any]:
+        """记录并返回进程池状态（父进程内存与各子进程状态）"""
+        children = self.stats()
+        parent = _process_memory_mb(os.getpid())
+        logger.info(
+            f"Worker 进程池: 父进程 RSS {parent.get('rss')} MB, "
+            f"在途任务 {sum(item['in_flight'] for item in children)}, "
+            f"已完成 {sum(item['completed'] for item in children)}"
+        )
+        for item in children:
+            logger.info(
+                f"  子进程 {item['slot']} (pid {item['pid']}): RSS {item['rss_mb']} MB, PSS {item['pss_mb']} MB, "
+                f"在途 {item['in_flight']}, 已完成 {item['completed']}, 重启 {item['restarts']} 次"
+            )
+        return {
+            "node": os.uname().nodename,
+            "pid": os.getpid(),
+            "parent_rss_mb": parent.get("rss"),
+            "children": children,
+            "reported_at": time.time(),
+        }
+
+    # ===== 内部实现 =====
+    def _spawn(self, slot: ChildSlot) -> None:
+        slot.child_id = f"{os.uname().nodename}:{os.getpid()}:{slot.index}:{uuid.uuid4().hex[:6]}"
+        slot._reset_in_flight()
+
+        pid = os.fork()
+        if pid == 0:
+            # 子进程：恢复默认信号处理与垃圾回收，执行入口后直接退出，不回到监督循环
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                gc.enable()
+                self.child_main(slot)
+            except SystemExit as exit_error:
+                code = exit_error.code if isinstance(exit_error.code, int) else 1
+            except BaseException as error:
+                logger.exception(f"Worker 子进程 {slot.index} 异常退出: {error}")
+                code = 1
+            finally:
+                os._exit(code)
+
+        slot.pid = pid
+        slot.started_at = time.monotonic()
+        logger.info(f"启动 Worker 子进程 {slot.index}: pid {pid}")
+
+    def _on_exit(self, slot: ChildSlot, code: int) -> None:
+        uptime = time.monotonic() - slot.started_at
+        slot.pid = 0
+        slot._reset_in_flight()
+
+        if self.on_child_exit is not None:
+            try:
+                self.on_child_exit(slot, code)
+            except Exception as error:
+                logger.error(f"处理 Worker 子进程退出失败: {error}")
+
+        if self.stopping:
+            logger.info(f"Worker 子进程 {slot.index} 已退出 (code {code})")
+            return
+
+        # 启动后很快退出时逐次加长重启间隔，避免崩溃循环
+        slot.restarts += 1
+        slot.quick_exits = slot.quick_exits + 1 if uptime < _QUICK_EXIT_SECONDS else 0
+        delay = 0.0
+        if slot.quick_exits:
+            delay = min(settings.WORKER_RESTART_DELAY * 2 ** min(slot.quick_exits - 1, 10), settings.WORKER_RESTART_DELAY_MAX)
+        slot.restart_at = time.monotonic() + delay
+        logger.warning(f"Worker 子进程 {slot.index} 意外退出 (code {code})，{delay:.1f}s 后重启")
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stop_signals += 1
+        # 第二次收到退出信号时强制结束子进程
+        sig = signal.SIGTERM if self._stop_signals == 1 else signal.SIGKILL
+        logger.info(f"收到退出信号 {signum}，通知 Worker 子进程退出...")
+        self.stop(sig)
+
+
+def pool_size(requested: int) -> int:
+    """
+    计算子进程数
+
+    Args:
+        requested: 配置的进程数；大于 0 时直接使用，0 表示按 CPU 核数与可用内存自动计算
+
+    Returns:
+        子进程数（至少为 1）
+    """
+    if requested > 0:
+        return requested
+
+    size = os.cpu_count() or 1
+    available = _available_memory_mb()
+    if available is not None and settings.WORKER_CHILD_MEMORY_MB > 0:
+        size = min(size, int(available // settings.WORKER_CHILD_MEMORY_MB))
+    return max(1, size)
+
+
+def _available_memory_mb() -> Optional[float]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _process_memory_mb(pid: int) -> Dict[str, float]:
+    """读取进程的 RSS 与 PSS（Linux /proc；其他平台返回空字典）"""
+    memory: Dict[str, float] = {}
+    for path, fields in ((f"/proc/{pid}/status", {"VmRSS:": "rss"}), (f"/proc/{pid}/smaps_rollup", {"Pss:": "pss"})):
+        try:
+            with open(path) as f:
+                for line in f:
+                    name = line.split(":", 1)[0] + ":"
+                    if name in fields:
+                        memory[fields[name]] = round(int(line.split()[1]) / 1024, 1)
+        except (OSError, ValueError):
+            continue
+    return memory
@@ -49,6 +49,9 @@ class TaskManager:
 
     通过Redis存储实现跨进程任务状态共享，解决API进程与Worker进程的状态同步问题。
     当Redis不可用时，自动降级到内存模式（仅支持单进程）。
+
+    任务信息以 Hash 存储（每个字段一个 JSON 编码的值），更新时只写入变化的字段，
+    不需要先读取整条任务记录。
     """
 
     def __init__(self):
@@ -77,33 +80,44 @@ class TaskManager:
             logger.warning("Redis 未配置，使用内存模式（仅支持单进程）")
 
     def _task_key(self, task_id: str) -> str:
-        """任务信息的Redis key"""
+        """任务信息的Redis key（Hash）"""
+        return f"{settings.CACHE_PREFIX}:task:{task_id}:state"
+
+    def _legacy_task_key(self, task_id: str) -> str:
+        """旧版本以 JSON 字符串保存的任务信息（只读，兼容升级前创建的任务）"""
         return f"{settings.CACHE_PREFIX}:task:{task_id}:info"
 
     def _callback_key(self, task_id: str) -> str:
         """回调URL的Redis key"""
         return f"{settings.CACHE_PREFIX}:task:{task_id}:callback"
 
-    def _serialize_task(self, task: TaskInfo) -> str:
-        """序列化任务信息"""
-        data = task.dict()
-        # 转换datetime为ISO格式字符串
-        for field in ['created_at', 'started_at', 'completed_at']:
-            if data.get(field):
-                data[field] = data[field].isoformat()
-        # 转换Enum为字符串
-        data['status'] = task.status.value
-        return json.dumps(data, ensure_ascii=False)
+    def _encode_fields(self, fields: Dict[str, Any]) -> Dict[str, str]:
+        """把任务字段编码为 Hash 字段值（JSON）"""
+        encoded = {}
+        for field, value in fields.items():
+            # 转换datetime为ISO格式字符串、Enum为字符串
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, TaskStatus):
+                value = value.value
+            encoded[field] = json.dumps(value, ensure_ascii=False)
+        return encoded
+
+    def _decode_fields(self, raw: Dict[str, str]) -> TaskInfo:
+        """由 Hash 字段还原任务信息"""
+        return self._build_task({field: json.loads(value) for field, value in raw.items()})
 
     def _deserialize_task(self, data_str: str) -> TaskInfo:
-        """反序列化任务信息"""
-        data = json.loads(data_str)
+        """反序列化旧版本的 JSON 任务信息"""
+        return self._build_task(json.loads(data_str))
+
+    def _build_task(self, data: Dict[str, Any]) -> TaskInfo:
         # 转换ISO字符串为datetime
         for field in ['created_at', 'started_at', 'completed_at']:
             if data.get(field):
                 data[field] = datetime.fromisoformat(data[field])
-        # 转换字符串为Enum
-        data['status'] = TaskStatus(data['status'])
+        # 转换字符串为Enum（Worker 先于 API 写入时 Hash 中可能还没有状态）
+        data['status'] = TaskStatus(data.get('status', TaskStatus.PROCESSING.value))
         return TaskInfo(**data)
 
     def create_task(self, callback_url: Optional[str] = None) -> str:
@@ -126,18 +140,20 @@ class TaskManager:
 
         if self._use_redis and self._redis_client:
             try:
-                # 存储到Redis
+                # 存储到Redis（任务信息与回调URL在同一个 pipeline 中写入）
                 key = self._task_key(task_id)
-                self._redis_client.set(
-                    key,
-                    self._serialize_task(task_info),
-                    ex=settings.CACHE_TTL
-                )
+                pipeline = self._redis_client.pipeline(transaction=False)
+                # 空字段不写入（started_at 等由 update_task 用 HSETNX 首次写入）
+                fields = {field: value for field, value in task_info.dict().items() if value is not None}
+                pipeline.hset(key, mapping=self._encode_fields(fields))
+                pipeline.expire(key, settings.CACHE_TTL)
 
                 # 存储回调URL
                 if callback_url:
                     callback_key = self._callback_key(task_id)
-                    self._redis_client.set(callback_key, callback_url, ex=settings.CACHE_TTL)
+                    pipeline.set(callback_key, callback_url, ex=settings.CACHE_TTL)
+
+                pipeline.execute()
 
                 logger.info(f"✅ 创建任务 (Redis): {task_id}")
             except RedisError as error:
@@ -166,8 +182,11 @@ class TaskManager:
         """
         if self._use_redis and self._redis_client:
             try:
-                key = self._task_key(task_id)
-                data = self._redis_client.get(key)
+                fields = self._redis_client.hgetall(self._task_key(task_id))
+                if fields:
+                    return self._decode_fields(fields)
+
+                data = self._redis_client.get(self._legacy_task_key(task_id))
                 if data:
                     return self._deserialize_task(data)
                 return None
@@ -192,6 +211,9 @@ class TaskManager:
         """
         更新任务状态
 
+        Redis 模式下只写入传入的字段（单个 pipeline，不读取现有记录）；
+        内存模式下修改内存中的任务记录。
+
         Args:
             task_id: 任务ID
             status: 新状态
@@ -202,6 +224,43 @@ class TaskManager:
             result: 最终结果
             error: 错误信息
         """
+        if self._use_redis and self._redis_client:
+            fields: Dict[str, Any] = {}
+            if status:
+                fields["status"] = status
+                if status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
+                    fields["completed_at"] = datetime.now()
+            if progress is not None:
+                fields["progress"] = progress
+            if message:
+                fields["message"] = message
+            if total_sentences is not None:
+                fields["total_sentences"] = total_sentences
+            if processed_sentences is not None:
+                fields["processed_sentences"] = processed_sentences
+            if result:
+                fields["result"] = result
+            if error:
+                fields["error"] = error
+
+            try:
+                key = self._task_key(task_id)
+                pipeline = self._redis_client.pipeline(transaction=False)
+                if fields:
+                    pipeline.hset(key, mapping=self._encode_fields(fields))
+                # 任务记录不存在时（支持Worker进程场景）补齐必填字段
+                pipeline.hsetnx(key, "task_id", json.dumps(task_id))
+                pipeline.hsetnx(key, "created_at", json.dumps(datetime.now().isoformat()))
+                if status == TaskStatus.PROCESSING:
+                    pipeline.hsetnx(key, "started_at", json.dumps(datetime.now().isoformat()))
+                pipeline.expire(key, settings.CACHE_TTL)
+                pipeline.execute()
+                logger.debug(f"更新任务 (Redis) {task_id}: {', '.join(fields)}")
+                return
+            except RedisError as error:
+                logger.error(f"Redis更新失败: {error}")
+                # fallback到内存
+
         # 获取现有任务
         task = self.get_task(task_id)
         if not task:
@@ -240,22 +299,8 @@ class TaskManager:
             task.error = error
 
         # 保存更新
-        if self._use_redis and self._redis_client:
-            try:
-                key = self._task_key(task_id)
-                self._redis_client.set(
-                    key,
-                    self._serialize_task(task),
-                    ex=settings.CACHE_TTL
-                )
-                logger.debug(f"更新任务 (Redis) {task_id}: status={status}, progress={progress}")
-            except RedisError as error:
-                logger.error(f"Redis更新失败: {error}")
-                # fallback到内存
-                self._memory_tasks[task_id] = task
-        else:
-            self._memory_tasks[task_id] = task
-            logger.debug(f"更新任务 (内存) {task_id}: status={status}, progress={progress}")
+        self._memory_tasks[task_id] = task
+        logger.debug(f"更新任务 (内存) {task_id}: status={status}, progress={progress}")
 
     def cleanup_old_tasks(self, max_age_hours: int = 24):
         """
@@ -35,7 +35,7 @@ def start_api():
 
 
 def start_worker():
-    """启动 Worker"""
+    """启动 Worker（WORKER_PROCESSES 不为 1 时在该进程中运行预派生进程池的监督者）"""
     from worker import main as worker_main
     logger.info("🚀 启动 Worker...")
     worker_main()
@@ -59,6 +59,7 @@ def main():
     logger.info(f"API 地址: http://{settings.HOST}:{settings.PORT}")
     logger.info(f"Redis: {settings.REDIS_URL}")
     logger.info(f"模式: {'开发模式' if settings.DEBUG else '生产模式'}")
+    logger.info(f"Worker 进程数: {settings.WORKER_PROCESSES or '自动'}（大于 1 时预派生子进程共享模型内存）")
     logger.info(f"环境变量:")
     logger.info(f"  - HANLP_URL: {os.environ.get('HANLP_URL', '未设置')}")
     logger.info(f"  - TF_USE_LEGACY_KERAS: {os.environ.get('TF_USE_LEGACY_KERAS', '未设置')}")
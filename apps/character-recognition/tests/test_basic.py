@@ -24,6 +24,115 @@ def test_preprocessor():
     assert sentences[2] == "这是第三句？"
 
 
+def test_preprocessor_streaming():
+    """测试流式预处理与整体预处理结果一致"""
+    preprocessor = TextPreprocessor()
+    
+    text = "  第一句\r\n话。  \t第二句！\r\n\n\n\n第三句？ 没有结束标点的尾巴  "
+    _, sentences, bounds = preprocessor.preprocess(text)
+    
+    # 用极小的块大小，确保句子和换行会跨块
+    for chunk_size in (1, 2, 5, 1024):
+        streamed = list(preprocessor.iter_sentences(text, chunk_size=chunk_size))
+        assert [s for s, _, _ in streamed] == sentences
+        assert [(start, end) for _, start, end in streamed] == bounds
+
+
+def test_build_chapters():
+    """测试章节检测"""
+    preprocessor = TextPreprocessor()
+    
+    text = "楔子一句。\n第一章 初遇\n雅芙来了。她笑了。\nChapter 2\n王强走了。"
+    cleaned, sentences, bounds = preprocessor.preprocess(text)
+    chapters = preprocessor.build_chapters(sentences, bounds, len(cleaned))
+    
+    assert [c.title for c in chapters] == ["", "第一章 初遇", "Chapter 2"]
+    assert [(c.sent_start, c.sent_end) for c in chapters] == [(0, 1), (1, 3), (3, 4)]
+    assert cleaned[chapters[1].start:].startswith("第一章")
+    assert chapters[-1].end == len(cleaned)
+
+    # 以“第N回/节/卷”开头的正文句子不是标题
+    text = "第一章 初遇\n第三回合，他又输了。\n第一节课下课后，张三走了。\n第二卷烟被他点燃。\n第二回：重逢\n王强来了。"
+    cleaned, sentences, bounds = preprocessor.preprocess(text)
+    chapters = preprocessor.build_chapters(sentences, bounds, len(cleaned))
+    assert [c.title for c in chapters] == ["第一章 初遇", "第二回：重逢"]
+
+
+def test_split_shards():
+    """测试分片切分：只在句末标点之后切分，且优先在章节边界切分"""
+    from src.parallel import split_shards
+    
+    text = "第一章 开始\n甲说话了。乙也说话了。\n第二章 继续\n丙来了。丁走了。"
+    shards = split_shards(text, max_chars=25)
+    
+    assert "".join(shards) == text
+    assert shards[1].lstrip().startswith("第二章")
+    
+    preprocessor = TextPreprocessor()
+    _, sentences, _ = preprocessor.preprocess(text)
+    shard_sentences = []
+    for idx, shard in enumerate(shards):
+        _, part, _ = preprocessor.preprocess_fragment(
+            shard, is_first=idx == 0, is_last=idx == len(shards) - 1
+        )
+        shard_sentences.extend(part)
+    assert shard_sentences == sentences
+
+
+def test_sharded_matches_serial(monkeypatch):
+    """测试分片并行识别：不同分片数下结果与串行识别完全一致（启用指代消解、关系与对话），进程池损坏后重新创建"""
+    pytest.importorskip("jieba")
+    import os
+    from concurrent.futures.process import BrokenProcessPool
+    from src import parallel
+    from src.config import settings
+    from src.recognizer import CharacterRecognizer
+
+    # 分片子进程由 forkserver 启动，从环境变量读取配置
+    for name, value in (("ENABLE_CACHE", False), ("NER_ENGINE", "jieba")):
+        monkeypatch.setattr(settings, name, value)
+        monkeypatch.setenv(name, str(value).lower())
+    monkeypatch.setattr(settings, "INCREMENTAL_ENABLED", False)
+    monkeypatch.setattr(settings, "NAME_LEXICON_ENABLED", False)
+    monkeypatch.setattr(settings, "SHARD_MIN_LENGTH", 0)
+
+    body = (
+        "司徒雅芙看着窗外，王强走了进来。\"你好。\"王强笑着说道。"
+        "雅芙回答道：\"你也好。\"他们俩是好朋友。老张在门口喊了一声，月儿跑了出去。\n"
+    )
+    text = "".join(f"第{idx}章 相遇{idx}\n" + body * (idx + 2) for idx in range(1, 9))
+    request = RecognitionRequest(
+        text=text,
+        options=RecognitionOptions(enable_coreference=True, enable_relations=True, enable_dialogue=True)
+    )
+
+    def run():
+        result = recognizer.recognize(request).dict()
+        result["statistics"].pop("processing_time", None)
+        return result
+
+    recognizer = CharacterRecognizer()
+    monkeypatch.setattr(settings, "SHARD_WORKERS", 0)
+    expected = run()
+    assert expected["characters"] and expected["relations"]
+
+    monkeypatch.setattr(settings, "SHARD_WORKERS", 2)
+    try:
+        for shards in (8, 16, 48):
+            monkeypatch.setattr(settings, "SHARD_MAX_CHARS", len(text) // shards + 1)
+            assert len(parallel.split_shards(text, settings.SHARD_MAX_CHARS)) >= min(shards, 8)
+            assert run() == expected
+
+        # 子进程异常退出后进程池损坏：本次识别失败，下一次重新创建进程池
+        with pytest.raises(BrokenProcessPool):
+            parallel.get_shard_pool().submit(os._exit, 1).result()
+        with pytest.raises(BrokenProcessPool):
+            run()
+        assert run() == expected
+    finally:
+        parallel.shutdown_shard_pool()
+
+
 def test_alias_recognizer():
     """测试别名识别"""
     recognizer = AliasRecognizer()
@@ -44,6 +153,791 @@ def test_alias_recognizer():
     assert recognizer.normalize_name("月儿") == "月"
 
 
+def test_ner_mention_positions():
+    """测试 NER 输出逐次出现的提及及其全文位置"""
+    pytest.importorskip("jieba")
+    from src.core.ner import NERRecognizer
+    
+    preprocessor = TextPreprocessor()
+    cleaned, sentences, bounds = preprocessor.preprocess("王强走了进来。\n王强笑着说道。雅芙看着王强。")
+    offsets = preprocessor.sentence_offsets(sentences, bounds)
+    
+    mentions = NERRecognizer().recognize(sentences, offsets=offsets)
+    wang = [m for m in mentions if m.text == "王强"]
+    
+    assert [m.sent_id for m in wang] == [0, 1, 2]
+    assert all(cleaned[m.start:m.end] == m.text for m in mentions)
+
+
+def test_ner_engine_batching():
+    """测试 HanLP 引擎按长度分桶批量推理，并按原句顺序返回结果"""
+    from src.config import settings
+    from src.core.ner import NERRecognizer
+    from src.core.ner_engines import HanLPEngine
+
+    batches = []
+
+    def fake_model(texts):
+        batches.append([len(t) for t in texts])
+        return [[("王强", "NR", t.find("王强"), t.find("王强") + 2)] if "王强" in t else [] for t in texts]
+
+    engine = HanLPEngine()
+    engine.model = fake_model
+    sentences = ["王强" + "走" * n + "。" for n in (9, 1, 5, 3)]
+
+    old_batch_size = settings.NER_BATCH_SIZE
+    settings.NER_BATCH_SIZE = 2
+    try:
+        recognizer = NERRecognizer(engine=engine)
+        mentions = recognizer.recognize(sentences, offsets=[0, 100, 200, 300])
+    finally:
+        settings.NER_BATCH_SIZE = old_batch_size
+
+    assert batches == [[4, 6], [8, 12]]
+    assert [(m.sent_id, m.start, m.source) for m in mentions] == [
+        (0, 0, "hanlp_ner"), (1, 100, "hanlp_ner"), (2, 200, "hanlp_ner"), (3, 300, "hanlp_ner")
+    ]
+
+
+def test_onnx_ner_decode():
+    """测试 ONNX 引擎按字构造输入并解码 BIO 标签"""
+    import numpy as np
+    from src.core.ner_engines import OnnxBertEngine
+
+    class FakeSession:
+        def run(self, _, feeds):
+            self.feeds = feeds
+            # 批内按长度排序，短句在前；标签 0=O, 1=B-PER, 2=I-PER
+            tags = [[0, 1, 2, 0, 0, 0, 0, 0, 0], [0, 1, 2, 0, 0, 1, 2, 0, 0]]
+            return [np.eye(3)[np.array(tags)]]
+
+    engine = OnnxBertEngine()
+    engine.model = FakeSession()
+    engine.vocab = {"[PAD]": 0, "[UNK]": 100, "[CLS]": 101, "[SEP]": 102, "王": 1}
+    engine.id2label = {0: "O", 1: "B-PER", 2: "I-PER"}
+    engine._input_names = ["input_ids", "attention_mask"]
+
+    assert engine.recognize_batch(["王强看见雅芙。", "王强。"]) == [
+        [("王强", 0, 2, 1), ("雅芙", 4, 6, 1)],
+        [("王强", 0, 2, 1)],
+    ]
+    assert engine.model.feeds["input_ids"][0].tolist() == [101, 1, 100, 100, 102, 0, 0, 0, 0]
+
+
+def test_ner_sentence_cache():
+    """测试句子级 NER 缓存：重复句子不再交给引擎，结果不变"""
+    from src.core.ner import NERRecognizer
+    from src.core.ner_cache import NERCache
+    from src.core.ner_engines import RuleEngine
+
+    class CountingEngine(RuleEngine):
+        calls = 0
+
+        def recognize_batch(self, sentences):
+            CountingEngine.calls += len(sentences)
+            return super().recognize_batch(sentences)
+
+    recognizer = NERRecognizer(engine=CountingEngine())
+    recognizer.cache = NERCache(max_size=10)
+    recognizer.cache._redis_failed()  # 只测试进程内缓存
+    sentences = ["王强走了进来。", "王强笑着说道。", "王强走了进来。"]
+
+    first = recognizer.count_names(sentences, offsets=[0, 7, 14])
+    second = recognizer.count_names(sentences, offsets=[0, 7, 14])
+
+    assert CountingEngine.calls == 2
+    assert first.cache_stats() == {"hits": 1, "misses": 2}
+    assert second.cache_stats() == {"hits": 3, "misses": 0}
+    assert second.positions == first.positions
+
+
+def test_incremental_book_state():
+    """测试增量识别：只重新识别改动的句子，结果与全量识别一致"""
+    import json
+    from src.core.ner import NERRecognizer
+    from src.core.ner_engines import RuleEngine
+    from src.incremental import BookState
+
+    ner = NERRecognizer(engine=RuleEngine())
+    ner.cache = None
+    aliases = AliasRecognizer()
+
+    def run(sentences, state):
+        offsets = [idx * 100 for idx in range(len(sentences))]
+        hits = ner.count_names(sentences, offsets=offsets, book_state=state)
+        mentions = [
+            (m.text, m.sent_id, m.start)
+            for sent_id, sentence in enumerate(sentences)
+            for m in state.alias_mentions(sentence, sent_id, offsets[sent_id], aliases.recognize_sentence_aliases)
+        ]
+        return hits.positions, mentions
+
+    old = ["老张走了进来。", "王叔看了看大小姐。"]
+    new = ["楔子。", "老张走了进来。", "王叔看了看大小姐。", "月儿笑着说道。"]
+
+    first = BookState("b1", "fp")
+    run(old, first)
+    payload = json.loads(json.dumps(first.to_payload()))
+
+    state = BookState("b1", "fp", payload)
+    assert run(new, state) == run(new, BookState("b1", "fp"))
+    assert (state.reused_sentences, state.recomputed_sentences) == (2, 2)
+
+    # 配置指纹变化时历史结果失效
+    assert not BookState("b1", "other", payload).has_previous
+
+
+def test_name_lexicon_seeds_jieba():
+    """测试书籍人名词典：识别期间写入 Jieba 用户词典，结束后恢复原词典"""
+    pytest.importorskip("jieba")
+    from src.core.ner_engines import JiebaEngine
+
+    engine = JiebaEngine()
+    engine.initialize()
+    sentence = "司徒雅芙看着窗外。"
+    other = "王强笑着说道。"
+    before = engine.recognize_batch([sentence, other])
+    total = engine.model.dt.total
+
+    with engine.use_lexicon(["司徒雅芙"]):
+        assert engine.recognize_batch([sentence])[0][0][:3] == ("司徒雅芙", 0, 4)
+        # 不含词典人名的句子结果不变
+        assert engine.recognize_batch([other]) == before[1:]
+        assert engine.model.dt.total == total
+
+    assert "司徒雅芙" not in engine.posseg.dt.word_tag_tab
+    assert engine.recognize_batch([sentence, other]) == before
+
+
+def test_name_lexicon_keeps_incremental_reuse(monkeypatch):
+    """测试书籍人名词典刷新后，同一本书原样重新提交时全部句子都复用上一次的结果"""
+    pytest.importorskip("jieba")
+    from src import incremental, lexicon
+    from src.config import settings
+    from src.recognizer import CharacterRecognizer
+
+    states, lexicons = {}, {}
+    monkeypatch.setattr(incremental, "fetch_book_state", states.get)
+    monkeypatch.setattr(incremental, "cache_book_state", states.__setitem__)
+    monkeypatch.setattr(lexicon, "fetch_name_lexicon", lexicons.get)
+    monkeypatch.setattr(lexicon, "cache_name_lexicon", lexicons.__setitem__)
+    monkeypatch.setattr(lexicon, "_recent", lexicon.OrderedDict())
+    monkeypatch.setattr(settings, "NER_ENGINE", "jieba")
+    monkeypatch.setattr(settings, "INCREMENTAL_ENABLED", True)
+    monkeypatch.setattr(settings, "NAME_LEXICON_MIN_MENTIONS", 2)
+
+    text = "司徒雅芙看着窗外。" * 3 + "王强笑着说道：“你好。”" * 3 + "雅芙和王强一起出门了。"
+    recognizer = CharacterRecognizer()
+    recognizer.initialize()
+    recognizer.ner_recognizer.cache = None
+
+    stats = []
+    for _ in range(3):
+        recognizer.recognize(
+            RecognitionRequest(text=text, book_id="b1"),
+            on_stage=lambda stage, payload: stats.append(payload) if stage == "incremental" else None
+        )
+
+    assert lexicons["b1"]
+    assert all(item["recomputed_sentences"] == 0 for item in stats[1:])
+    assert stats[-1]["reused_sentences"] == stats[0]["reused_sentences"] + stats[0]["recomputed_sentences"]
+
+    # 未提供 book_id 的请求不读写增量识别状态
+    recognizer.recognize(RecognitionRequest(text=text, book_id=settings.DEFAULT_BOOK_ID))
+    assert list(states) == ["b1"]
+
+
+def test_name_lexicon_requires_book_id(monkeypatch):
+    """测试未提供 book_id 的请求不读写书籍人名词典，不同文本互不写入对方的人名"""
+    pytest.importorskip("jieba")
+    from src import lexicon
+    from src.config import settings
+    from src.recognizer import CharacterRecognizer
+
+    lexicons = {}
+    monkeypatch.setattr(lexicon, "fetch_name_lexicon", lexicons.get)
+    monkeypatch.setattr(lexicon, "cache_name_lexicon", lexicons.__setitem__)
+    monkeypatch.setattr(lexicon, "_recent", lexicon.OrderedDict())
+    monkeypatch.setattr(settings, "NER_ENGINE", "jieba")
+    monkeypatch.setattr(settings, "NAME_LEXICON_MIN_MENTIONS", 2)
+
+    recognizer = CharacterRecognizer()
+    recognizer.initialize()
+    recognizer.ner_recognizer.cache = None
+
+    def run(text):
+        result = recognizer.recognize(RecognitionRequest(text=text, book_id=settings.DEFAULT_BOOK_ID))
+        return [(c["canonical_name"], c["mentions"]) for c in result.characters]
+
+    first = "司徒雅芙看着窗外。" * 3 + "雅芙笑了。" * 3
+    second = "司徒雅芙和王强一起出门了。王强笑着说道：“你好。”" * 2
+    expected = run(second)
+    run(first)
+    assert run(second) == expected
+    assert not lexicons and not lexicon._recent
+
+
+def test_alias_rule_scanner():
+    """测试组合扫描器与逐条规则 finditer 的结果一致（包括跨规则重叠和被排除的命中）"""
+    import re
+    from src.core.alias_rules import AliasRuleScanner
+
+    scanner = AliasRuleScanner(["老", "小"], ["姑", "哥", "姑娘"])
+    sentence = "老王的姑娘和小花儿说那个男人是牛头，健硕男人穿白色大褂，掌柜的叫王大哥"
+
+    expected = []
+    for rule in scanner.rules:
+        for match in re.finditer(f"(?P<{rule.name}>{rule.pattern})", sentence):
+            if rule.accept is None or rule.accept(match):
+                expected.append((match.start(), match.end(), match.group(0)))
+
+    hits = scanner.scan(sentence)
+    assert hits == expected
+    # 前缀与敬称规则各命中一次；敬称按列表顺序优先匹配"姑"而不是"姑娘"
+    assert hits.count((0, 4, "老王的姑")) == 2
+    assert not any(text == "那个男人" for _, _, text in hits)
+
+
+def test_alias_aggregation():
+    """测试别名按称呼计数：阈值为 1 时与逐句生成提及一致，分片合并后顺序不变，阈值过滤低频称呼"""
+    from src.core.alias import AliasHits
+
+    recognizer = AliasRecognizer()
+    sentences = ["老王是王大哥", "老王和小红儿", "白衣人看着老王", "掌柜的叫王大哥"]
+    offsets = [0, 10, 20, 30]
+    expected = [m.model_dump() for m in recognizer.recognize_aliases(sentences, offsets)]
+
+    first, second = AliasHits(), AliasHits()
+    for sent_id in range(2):
+        first.add_spans(recognizer.sentence_alias_spans(sentences[sent_id]), sent_id, offsets[sent_id])
+    for sent_id in range(2, 4):
+        second.add_spans(recognizer.sentence_alias_spans(sentences[sent_id]), sent_id - 2, offsets[sent_id] - 20)
+    first.merge(second, sent_offset=2, char_offset=20)
+
+    assert [m.model_dump() for m in recognizer.build_mentions(first)] == expected
+
+    frequent = recognizer.build_mentions(first, min_count=2)
+    assert {m.text for m in frequent} == {text for text, count in first.counts.items() if count >= 2}
+    assert "大哥" in {m.text for m in frequent}
+    assert "白衣人" not in {m.text for m in frequent}
+
+
+def test_mention_table():
+    """测试列式提及表：与提及列表互相转换、拼接时合并驻留表、按称呼分组统计，合并结果与提及列表一致"""
+    from src.core.mentions import MentionTable
+    from src.models.character import CharacterMention
+
+    ner = [
+        CharacterMention(text="王强", start=10, end=12, sent_id=1, confidence=0.6, source="jieba_ner"),
+        CharacterMention(text="王强", start=3, end=5, sent_id=0, confidence=0.6, source="jieba_ner"),
+    ]
+    aliases = [
+        CharacterMention(text="老王", start=30, end=32, sent_id=2),
+        CharacterMention(text="王强", start=40, end=42, sent_id=2),
+    ]
+    table = MentionTable.concat([MentionTable.from_mentions(ner), MentionTable.from_mentions(aliases)])
+
+    assert table.names == ["王强", "老王"]
+    assert [m.model_dump() for m in table.to_mentions()] == [m.model_dump() for m in ner + aliases]
+    assert table.name_counts().tolist() == [3, 1]
+    assert table.min_starts().tolist() == [3, 30]
+    assert table.sentence_ids([0, 1]).tolist() == [0, 1, 2]
+
+    sentences = ["王强来了", "王强笑了", "老王和王强"]
+    from_table, table_map = AliasRecognizer().merge_characters(table, sentences, "b1")
+    from_list, list_map = AliasRecognizer().merge_characters(ner + aliases, sentences, "b1")
+    assert [c.model_dump() for c in from_table] == [c.model_dump() for c in from_list]
+    assert table_map == list_map
+    assert (from_table[0].canonical_name, from_table[0].mentions, from_table[0].first_appearance_idx) == ("王强", 3, 3)
+
+
+def test_alias_index():
+    """测试别名索引：一次扫描得到全部命中，人物顺序与逐个别名判断一致"""
+    from src.core.alias_index import AliasIndex
+
+    alias_map = {"小张": "张三", "张三": "张三", "三哥": "张三", "老王": "王五", "王": "王五"}
+    index = AliasIndex(alias_map)
+    sentence = "老王对张三哥说，小张来了。"
+
+    assert [(hit.alias, hit.offset) for hit in index.find(sentence)] == [
+        ("老王", 0), ("王", 1), ("张三", 3), ("三哥", 4), ("小张", 8)
+    ]
+
+    naive = []
+    for alias, main_name in alias_map.items():
+        if alias in sentence and main_name not in naive:
+            naive.append(main_name)
+    assert index.characters(sentence) == naive == ["张三", "王五"]
+    assert index.first("王大哥") == "王五"
+    assert index.first("路人") is None
+
+
+def test_relation_window_cooccurrence():
+    """测试关联矩阵的窗口共现与逐句双重循环统计一致"""
+    import random
+    from src.core.relation import RelationExtractor
+
+    random.seed(7)
+    names = ["甲", "乙", "丙", "丁", "戊"]
+    sentences = ["".join(random.sample(names, random.randint(0, 3))) + "。" for _ in range(60)]
+    alias_map = {name: name for name in names}
+
+    expected = {}
+    chars = [[name for name in names if name in sentence] for sentence in sentences]
+    for i, current in enumerate(chars):
+        for j, char1 in enumerate(current):
+            for char2 in current[j + 1:]:
+                pair = tuple(sorted([char1, char2]))
+                expected[pair] = expected.get(pair, 0) + 1
+        for offset in (1, 2):
+            for char1 in current:
+                for char2 in (chars[i + offset] if i + offset < len(chars) else []):
+                    if char1 != char2:
+                        pair = tuple(sorted([char1, char2]))
+                        expected[pair] = expected.get(pair, 0) + 1
+
+    relations = RelationExtractor().extract_relations(sentences, [], alias_map, window=2)
+    assert {(r.from_char, r.to_char): r.weight for r in relations} == expected
+    assert [r.weight for r in relations] == sorted((r.weight for r in relations), reverse=True)
+
+    decayed = RelationExtractor().extract_relations(sentences, [], alias_map, window=2, decay=0.5)
+    assert all(r.weight <= expected[(r.from_char, r.to_char)] for r in decayed)
+
+
+def test_semantic_pairs_blocked():
+    """测试分块矩阵乘找出的相似名字对与逐对点积一致"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(5, 16))
+    embeddings = centers[rng.integers(0, 5, size=40)] + rng.normal(scale=0.3, size=(40, 16))
+    embeddings = (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+
+    expected = [
+        (i, j) for i in range(40) for j in range(i + 1, 40)
+        if float(np.dot(embeddings[i], embeddings[j])) >= 0.8
+    ]
+    recognizer = AliasRecognizer()
+
+    assert recognizer._find_semantic_pairs_blocked(embeddings, 0.8, tile_size=7) == expected
+    assert recognizer._find_semantic_pairs(embeddings, 0.8) == expected
+
+    pytest.importorskip("faiss")
+    assert set(recognizer._find_semantic_pairs_ann(embeddings, 0.8)) == set(expected)
+
+
+def test_string_merge_blocking():
+    """测试字符串合并的候选对剪枝与逐对计算结果一致，并返回计算与剪枝的对数"""
+    import random
+    import numpy as np
+
+    random.seed(11)
+    chars = "王强雅芙老张叔小月儿大姐山羊头白褂"
+    names = sorted({"".join(random.choices(chars, k=random.randint(1, 5))) for _ in range(300)})
+    recognizer = AliasRecognizer()
+
+    for cutoff in (0.6, 0.75, 0.9):
+        expected = [
+            (i, j) for i in range(len(names)) for j in range(i + 1, len(names))
+            if recognizer._string_similarity(names[i], names[j]) >= cutoff
+        ]
+        candidates = recognizer._string_candidates(names, cutoff)
+        assert [
+            (i, j) for i, j in candidates
+            if recognizer._string_similarity(names[i], names[j]) >= cutoff
+        ] == expected
+        assert len(candidates) < len(names) * (len(names) - 1) // 2
+
+    # 合并时返回名字对统计
+    groups = {name: (name, set(), [idx]) for idx, name in enumerate(names)}
+    _, stats = recognizer._string_merge(groups, 0.9, np.ones(len(names)), names)
+    total = len(names) * (len(names) - 1) // 2
+    scored = len(recognizer._string_candidates(names, 0.9))
+    assert stats == {"pairs": total, "scored": scored, "pruned": total - scored}
+    assert 0 < scored < total
+
+
+def test_embedding_cache(tmp_path):
+    """测试上下文句向量缓存：请求内去重、跨进程复用本地存储、超出容量按跨进程的最近使用时间淘汰"""
+    import numpy as np
+    from src.config import settings
+    from src.core.embedding_cache import EmbeddingCache
+
+    class FakeModel:
+        def __init__(self):
+            self.encoded = []
+
+        def encode(self, texts, **kwargs):
+            self.encoded.append(list(texts))
+            return np.array([[len(t), 1.0, 0.5] for t in texts], dtype=np.float32)
+
+    def recognizer(max_size):
+        alias = AliasRecognizer()
+        alias.embedding_model = FakeModel()
+        alias.embedding_cache = EmbeddingCache(str(tmp_path), max_size=max_size)
+        alias.embedding_cache._redis_failed()  # 只测试本地存储
+        return alias
+
+    first = recognizer(3)
+    vectors = first._encode_contexts(["甲说。", "乙说了。", "甲说。"])
+    assert first.embedding_model.encoded == [["甲说。", "乙说了。"]]
+
+    # 新实例（相当于新进程）直接读取本地存储
+    second = recognizer(3)
+    assert np.array_equal(second._encode_contexts(["甲说。", "乙说了。", "甲说。"]), vectors)
+    assert second.embedding_model.encoded == []
+
+    second._encode_contexts(["丙说话了。", "丁也说话了。"])
+    assert len(second.embedding_cache.store) == 3
+    evicted = second.embedding_cache.key(settings.EMBEDDING_MODEL, "甲说。")
+    assert second.embedding_cache.store.get_many([evicted]) == {}
+
+    # 其他实例（进程）的读取同样刷新使用时间：乙 刚被读取，写入新向量时淘汰 丙
+    key = second.embedding_cache.key
+    recent, oldest = key(settings.EMBEDDING_MODEL, "乙说了。"), key(settings.EMBEDDING_MODEL, "丙说话了。")
+    assert recent in first.embedding_cache.store.get_many([recent])
+    second._encode_contexts(["戊说。"])
+    assert set(second.embedding_cache.store.get_many([recent, oldest])) == {recent}
+
+
+def test_embedding_length_buckets(monkeypatch):
+    """测试上下文按 token 预算截断、按长度分桶编码后恢复原顺序"""
+    import numpy as np
+    from src.config import settings
+
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_LENGTH", 6)
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 2)
+
+    class FakeModel:
+        def __init__(self):
+            self.encoded = []
+
+        def encode(self, texts, **kwargs):
+            self.encoded.append(list(texts))
+            return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+    alias = AliasRecognizer()
+    alias.embedding_model = FakeModel()
+    alias.embedding_cache = None
+
+    sentences = ["甲甲甲", "乙乙乙", "丙丙丙"]
+    assert alias._collect_context([1], sentences) == "甲甲甲。"
+
+    contexts = ["四个字了", "一", "三个字", "二字"]
+    vectors = alias._encode_contexts(contexts)
+    assert alias.embedding_model.encoded == [["一", "二字"], ["三个字", "四个字了"]]
+    assert vectors[:, 0].tolist() == [4, 1, 3, 2]
+
+
+def test_onnx_embedding_backend(monkeypatch):
+    """测试 ONNX 句向量后端：按字映射、补齐、掩码平均池化与归一化，以及按配置选择后端"""
+    import numpy as np
+    from src.config import settings
+    from src.core.embedding_backends import OnnxEmbeddingBackend, create_embedding_backend
+
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_LENGTH", 5)
+
+    class FakeSession:
+        def run(self, outputs, feeds):
+            self.feeds = feeds
+            # 隐状态第 0 维为 token id，第 1 维恒为 1
+            ids = feeds["input_ids"].astype(np.float32)
+            return [np.stack([ids, np.ones_like(ids)], axis=-1)]
+
+    backend = create_embedding_backend("onnx")
+    assert isinstance(backend, OnnxEmbeddingBackend)
+    backend.vocab = {"[PAD]": 0, "[UNK]": 100, "[CLS]": 101, "[SEP]": 102, "甲": 3, "a": 4}
+    backend.session = FakeSession()
+    backend._input_names = ["input_ids", "attention_mask"]
+
+    vectors = backend.encode(["甲A", "甲甲甲甲甲"])
+    assert backend.session.feeds["input_ids"].tolist() == [
+        [101, 3, 4, 102, 0],
+        [101, 3, 3, 3, 102],
+    ]
+    expected = np.array([[(101 + 3 + 4 + 102) / 4, 1.0], [(101 + 9 + 102) / 5, 1.0]])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(vectors, expected)
+    assert "onnx-int8" in backend.model_id
+
+    with pytest.raises(ValueError):
+        create_embedding_backend("tensorflow")
+
+
+def test_recognition_executor_backpressure():
+    """测试识别执行池：任务在线程中执行，超出并发数 + 等待位时立即拒绝并给出 Retry-After"""
+    import asyncio
+    import threading
+    from src.executor import ExecutorSaturated, RecognitionExecutor
+
+    async def scenario():
+        executor = RecognitionExecutor("thread", max_workers=1, max_queue=1, min_retry_after=3)
+        release = threading.Event()
+        main_thread = threading.get_ident()
+
+        def job(value):
+            release.wait(5)
+            assert threading.get_ident() != main_thread
+            return value * 2
+
+        first = executor.submit(job, 1)
+        second = executor.submit(job, 2)
+        with pytest.raises(ExecutorSaturated) as error:
+            executor.submit(job, 3)
+        assert error.value.retry_after == 3
+        assert executor.stats()["running"] == 1 and executor.stats()["queued"] == 1
+
+        # 事件循环在任务执行期间仍然可以处理其他协程
+        await asyncio.sleep(0)
+        release.set()
+        assert await first == 2 and await second == 4
+
+        stats = executor.stats()
+        assert stats["completed"] == 2 and stats["rejected"] == 1
+        assert stats["running"] == 0 and stats["queued"] == 0
+        assert await executor.submit(job, 5) == 10
+
+        executor.shutdown()
+        with pytest.raises(ExecutorSaturated):
+            executor.submit(job, 6)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_recognitions_share_recognizer(monkeypatch):
+    """测试执行池中的多个线程共用一个识别器：并发识别与串行识别结果一致（NER 缓存频繁淘汰）"""
+    pytest.importorskip("jieba")
+    from concurrent.futures import ThreadPoolExecutor
+    from src import lexicon
+    from src.config import settings
+    from src.core.ner_cache import NERCache
+    from src.recognizer import CharacterRecognizer
+
+    monkeypatch.setattr(settings, "ENABLE_CACHE", False)
+    monkeypatch.setattr(settings, "NER_ENGINE", "jieba")
+    monkeypatch.setattr(lexicon, "_recent", lexicon.OrderedDict())
+
+    recognizer = CharacterRecognizer()
+    recognizer.initialize()
+    recognizer.ner_recognizer.cache = NERCache(max_size=4)
+
+    texts = [
+        "司徒雅芙看着窗外。王强笑着说道：“你好。”" * 20,
+        "老张走了进来。月儿笑着说道：“张叔好。”老张点了点头。" * 20,
+    ]
+
+    def run(text):
+        result = recognizer.recognize(RecognitionRequest(text=text, book_id=f"b{texts.index(text)}"))
+        return [(c["canonical_name"], c["mentions"], tuple(c["aliases"])) for c in result.characters]
+
+    # 第一次识别后写入书籍词典，之后的识别都会启用词典
+    for text in texts:
+        run(text)
+    expected = [run(text) for text in texts]
+    assert all(lexicon._recent.get(f"b{idx}") for idx in range(len(texts)))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(run, texts * 4))
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert results == expected * 4
+
+
+def test_progress_reporter_coalescing(monkeypatch):
+    """测试进度上报合并：逐句进度按增量节流，阶段切换与完成总是写入，且只写入变化的字段"""
+    from src import progress
+    from src.config import settings
+    from src.task_manager import TaskStatus
+
+    updates, metas = [], []
+
+    class FakeTaskManager:
+        def update_task(self, task_id, **fields):
+            updates.append({key: value for key, value in fields.items() if value is not None})
+
+    monkeypatch.setattr(progress, "task_manager", FakeTaskManager())
+    monkeypatch.setattr(progress, "cache_meta", lambda task_id, meta: metas.append(meta))
+    monkeypatch.setattr(progress, "cache_stage", lambda *args: None)
+    monkeypatch.setattr(progress, "cache_result", lambda *args: None)
+    monkeypatch.setattr(settings, "PROGRESS_PUBLISH_INTERVAL_MS", 60_000)
+    monkeypatch.setattr(settings, "PROGRESS_PUBLISH_DELTA", 10)
+
+    reporter = progress.ProgressReporter("task")
+    reporter.start()
+    reporter.on_stage("preprocess", {"total_sentences": 1000})
+    for processed in range(1, 1001):
+        reporter.on_sentence(processed, 1000)
+    reporter.on_stage("ner", {})
+    reporter.complete({"characters": []})
+
+    # 开始、预处理、进度 20/30/40/50/60（最后一句）、ner 阶段、完成
+    assert len(updates) == 9
+    assert reporter.publish_stats() == {"published": 9, "suppressed": 995}
+    assert updates[7] == {"message": "人名识别中"}
+    assert updates[0]["status"] == TaskStatus.PROCESSING
+    # 逐句更新只包含变化的字段
+    assert set(updates[2]) == {"progress", "message", "processed_sentences"}
+    assert "status" not in metas[2] and metas[2]["progress"] == 20
+    assert updates[-1]["status"] == TaskStatus.COMPLETED and updates[-1]["result"] == {"characters": []}
+
+
+def test_reliable_task_queue(monkeypatch):
+    """测试可靠队列：确认前任务数据保留，Worker 心跳超时后任务被回收，多次失败后移入死信列表"""
+    fakeredis = pytest.importorskip("fakeredis")
+    import json
+    import time
+    from src import cache
+    from src.config import settings
+
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(cache, "_get_client", lambda: client)
+    monkeypatch.setattr(settings, "TASK_MAX_ATTEMPTS", 2)
+
+    cache.heartbeat_consumer("w1")
+    cache.heartbeat_consumer("w2")
+    cache.enqueue_task("t1", {"text": "甲"})
+    cache.enqueue_task("t2", {"text": "乙"})
+
+    # 处理完成并确认后删除任务数据
+    task = cache.dequeue_task("w1", timeout=1)
+    assert task == ("t1", {"text": "甲"}, 1)
+    assert client.lrange(cache._processing_key("w1", cache.choose_lane(text_length=1)), 0, -1) == ["t1"]
+    cache.ack_task("w1", "t1")
+    assert client.get(cache._task_data_key("t1")) is None
+
+    # w2 领取任务后失去心跳：任务回到队首，计一次中断
+    assert cache.dequeue_task("w2", timeout=1).task_id == "t2"
+    client.zadd(cache.TASK_CONSUMERS_KEY, {"w2": time.time() - settings.TASK_VISIBILITY_TIMEOUT - 1})
+    assert cache.reclaim_stale_tasks() == 1
+    assert client.zscore(cache.TASK_CONSUMERS_KEY, "w2") is None
+    assert cache.get_queue_stats()["pending"] == 1
+
+    # 第二次执行仍失败：达到最大次数，移入死信列表并保留任务数据
+    task = cache.dequeue_task("w1", timeout=1)
+    assert task.attempt == 2
+    assert cache.fail_task("w1", "t2", "boom") is False
+    dead = json.loads(client.lindex(cache.TASK_DEAD_LETTER_KEY, 0))
+    assert (dead["task_id"], dead["attempts"], dead["error"]) == ("t2", 2, "boom")
+    assert client.get(cache._task_data_key("t2")) is not None
+    stats = cache.get_queue_stats()
+    assert (stats["pending"], stats["consumers"], stats["dead_letter"]) == (0, 1, 1)
+
+
+def test_task_queue_lanes(monkeypatch):
+    """测试优先级通道：按文本长度选择通道，按权重轮询，同一 book_id 超过并发上限的任务等待名额，回收时放回各自通道"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from src import cache
+    from src.config import settings
+
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(cache, "_get_client", lambda: client)
+    monkeypatch.setattr(settings, "TASK_LANES", {"interactive": 3, "normal": 1, "bulk": 1})
+    monkeypatch.setattr(settings, "TASK_LANE_MAX_CHARS", {"interactive": 10, "normal": 100})
+
+    assert cache.choose_lane(text_length=5) == "interactive"
+    assert cache.choose_lane(text_length=50) == "normal"
+    assert cache.choose_lane(text_length=500) == "bulk"
+    assert cache.choose_lane("bulk", 5) == "bulk"
+    with pytest.raises(ValueError):
+        cache.choose_lane("urgent")
+
+    # 默认通道沿用原队列键
+    assert cache._lane_key("normal") == cache.TASK_QUEUE_KEY
+
+    # 平滑加权轮询：每 5 轮中 interactive 被选中 3 次，且不连续占满
+    scheduler = cache.LaneScheduler(settings.TASK_LANES)
+    assert [scheduler.order()[0] for _ in range(5)] == ["interactive", "normal", "interactive", "bulk", "interactive"]
+
+    # 大任务先入队，小任务仍先被处理；通道为空时依次尝试其他通道
+    cache.heartbeat_consumer("w1")
+    cache.enqueue_task("big", {"text": "字" * 500, "book_id": "b1"})
+    cache.enqueue_task("small", {"text": "短句", "book_id": "b1"})
+    cache.enqueue_task("other", {"text": "短句", "book_id": "b2"})
+    stats = cache.get_queue_stats()
+    assert stats["pending"] == 3
+    assert {lane: item["depth"] for lane, item in stats["lanes"].items()} == {"interactive": 2, "normal": 0, "bulk": 1}
+
+    monkeypatch.setattr(cache, "_lane_scheduler", None)
+    monkeypatch.setattr(settings, "TASK_BOOK_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "TASK_LANE_POLL_INTERVAL", 5)
+    assert cache.dequeue_task("w1", timeout=1).task_id == "small"
+
+    # b1 已有一个任务在处理：big 超过并发上限，移入等待列表直到 small 确认完成
+    assert cache.dequeue_task("w1", timeout=1).task_id == "other"
+    assert cache.dequeue_task("w1", timeout=0.2) is None
+    assert client.llen(cache._lane_key("bulk")) == 0
+    assert cache.get_queue_stats()["lanes"]["bulk"]["book_waiting"] == 1
+
+    # 同一通道中排在受限任务之后的任务立即领取，不等待轮询间隔
+    cache.enqueue_task("big2", {"text": "字" * 500, "book_id": "b1"})
+    cache.enqueue_task("big3", {"text": "字" * 500, "book_id": "b3"})
+    assert cache.dequeue_task("w1", timeout=1).task_id == "big3"
+    assert client.lrange(cache._book_waiting_key("b1", "bulk"), 0, -1) == ["big", "big2"]
+    cache.ack_task("w1", "small")
+    assert cache.dequeue_task("w1", timeout=1).task_id == "big"
+
+    # 回收时任务回到各自的通道，释放的名额唤醒 big2
+    assert cache.reclaim_consumer("w1") == 3
+    assert client.lrange(cache._lane_key("interactive"), 0, -1) == ["other"]
+    assert client.lrange(cache._lane_key("bulk"), 0, -1) == ["big3", "big2", "big"]
+
+    # 已被回收的任务迟到的确认不删除任务数据
+    cache.ack_task("w1", "big")
+    assert client.get(cache._task_data_key("big")) is not None
+
+    stats = cache.get_queue_stats()
+    assert stats["pending"] == 4
+    assert [stats["lanes"][lane]["claimed"] for lane in ("interactive", "normal", "bulk")] == [2, 0, 2]
+    assert stats["lanes"]["bulk"]["book_waiting"] == 0
+
+
+def test_worker_supervisor(monkeypatch):
+    """测试预派生进程池：子进程崩溃后重启，通过共享内存上报任务数，停止时等待全部子进程退出"""
+    import os
+    import time
+    from src.config import settings
+    from src.supervisor import WorkerSupervisor, pool_size
+
+    monkeypatch.setattr(settings, "WORKER_RESTART_DELAY", 0.0)
+
+    def child(slot):
+        slot.task_started()
+        slot.task_finished()
+        if slot.restarts == 0:
+            os._exit(3)  # 首次启动后崩溃
+        time.sleep(30)  # 等待 SIGTERM
+
+    exits = []
+    supervisor = WorkerSupervisor(child, 2, on_child_exit=lambda slot, code: exits.append(code))
+
+    def wait_until(condition):
+        deadline = time.monotonic() + 10
+        while not condition() and time.monotonic() < deadline:
+            supervisor.poll()
+            time.sleep(0.02)
+        assert condition()
+
+    supervisor.spawn_all()
+    wait_until(lambda: len(exits) == 2 and all(slot.pid for slot in supervisor.slots))
+    wait_until(lambda: all(slot.completed == 2 for slot in supervisor.slots))
+
+    stats = supervisor.stats()
+    assert exits == [3, 3]
+    assert [item["restarts"] for item in stats] == [1, 1]
+    assert all(item["in_flight"] == 0 and item["rss_mb"] for item in stats)
+
+    supervisor.stop()
+    wait_until(lambda: not supervisor.poll())
+    assert exits[2:] == [-15, -15]
+
+    assert pool_size(3) == 3
+    assert 1 <= pool_size(0) <= (os.cpu_count() or 1)
+
+
 def test_request_model():
     """测试请求模型"""
     request = RecognitionRequest(
@@ -1,25 +1,43 @@
 """独立的任务处理 Worker
 从 Redis 队列中获取任务并处理，完全解耦于 FastAPI 主进程
+
+任务处理完成后才确认（ack）；Worker 中途退出时，其他 Worker 在心跳超时后回收任务重新执行。
+可以在多个节点上同时运行任意数量的 Worker。
+
+WORKER_PROCESSES（或 --workers）大于 1 时以预派生模式运行：父进程加载一次模型后 fork 出子进程，
+子进程共享模型内存；父进程重启崩溃的子进程，并定期汇报各子进程的内存与在途任务。
 """
+import argparse
+import os
+import socket
 import sys
 import signal
+import threading
 import time
+import uuid
 from pathlib import Path
 
 # 添加 src 到路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 import asyncio
+from typing import Optional
+
 import httpx
 from loguru import logger
 
-from src.cache import dequeue_task, cache_result, cache_callback
+from src.cache import (
+    ack_task, cache_result, cache_callback, cache_worker_pool, dequeue_task, fail_task,
+    heartbeat_consumer, reclaim_consumer, reclaim_stale_tasks, remove_consumer
+)
 from src.config import settings
 from src.models import RecognitionRequest, RecognitionOptions
+from src.parallel import shutdown_shard_pool
 from src.recognizer import CharacterRecognizer
+from src.supervisor import ChildSlot, WorkerSupervisor, pool_size
 from src.utils import setup_logging
+from src.progress import ProgressReporter
 from src.task_manager import task_manager
-from main import ProgressReporter
 
 
 # 配置日志
@@ -85,17 +103,46 @@ async def send_callback(
         logger.error(f"发送回调失败: {callback_url}, error={e}")
 
 
-async def process_task(task_id: str, task_data: dict):
+def start_heartbeat(consumer_id: str, stop: threading.Event) -> threading.Thread:
+    """
+    启动心跳线程：定期刷新本 Worker 的心跳，并回收心跳超时的 Worker 的任务
+
+    识别在主线程中同步执行，心跳放在独立线程中，长任务执行期间不会被误判为超时。
+    """
+    def beat():
+        while not stop.is_set():
+            heartbeat_consumer(consumer_id)
+            reclaimed = reclaim_stale_tasks()
+            if reclaimed:
+                logger.warning(f"回收了 {reclaimed} 个超时任务")
+            stop.wait(settings.TASK_HEARTBEAT_INTERVAL)
+
+    heartbeat_consumer(consumer_id)
+    thread = threading.Thread(target=beat, name="queue-heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+async def process_task(task_id: str, task_data: dict, attempt: int = 1) -> Optional[str]:
     """
     处理单个识别任务
 
     Args:
         task_id: 任务ID
         task_data: 任务数据
+        attempt: 本次是第几次执行
+
+    Returns:
+        失败原因，成功时为 None；未到最后一次执行的失败只标记为等待重试，不发送失败回调
     """
     reporter = ProgressReporter(task_id)
+    final_attempt = attempt >= settings.TASK_MAX_ATTEMPTS
 
     try:
+        if attempt > settings.TASK_MAX_ATTEMPTS:
+            # 多次在执行中途中断（如 Worker 崩溃），不再尝试
+            raise RuntimeError(f"任务已中断 {attempt - 1} 次，不再重试")
+
         # 构造 RecognitionRequest
         options_dict = task_data.get("options", {})
         options = RecognitionOptions(**options_dict) if options_dict else None
@@ -146,10 +193,16 @@ async def process_task(task_id: str, task_data: dict):
         else:
             logger.info(f"任务 {task_id} 无回调URL，结果已缓存到 Redis")
 
+        return None
+
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
-        logger.error(f"任务 {task_id} 失败: {e}\n{error_trace}")
+        logger.error(f"任务 {task_id} 第 {attempt} 次执行失败: {e}\n{error_trace}")
+
+        if not final_attempt:
+            reporter.retry(str(e))
+            return str(e)
 
         reporter.fail(str(e))
 
@@ -158,10 +211,21 @@ async def process_task(task_id: str, task_data: dict):
         if callback_url:
             await send_callback(callback_url, task_id, None, error=str(e), meta=reporter.meta_snapshot())
 
+        return str(e)
+
 
-async def worker_loop():
-    """Worker 主循环"""
-    logger.info("🚀 Worker 启动成功，开始监听任务队列...")
+async def worker_loop(consumer_id: Optional[str] = None, slot: Optional[ChildSlot] = None):
+    """
+    Worker 主循环
+
+    Args:
+        consumer_id: 队列消费者标识，默认由主机名与进程号生成
+        slot: 预派生模式下的子进程槽位，用于上报在途任务
+    """
+    consumer_id = consumer_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    stop_heartbeat = threading.Event()
+    start_heartbeat(consumer_id, stop_heartbeat)
+    logger.info(f"🚀 Worker {consumer_id} 启动成功，开始监听任务队列...")
 
     consecutive_errors = 0
     max_consecutive_errors = 5
@@ -169,17 +233,26 @@ async def worker_loop():
     while running:
         try:
             # 从队列中取任务（阻塞5秒）
-            task_info = dequeue_task(timeout=5)
+            task = dequeue_task(consumer_id, timeout=5)
 
-            if task_info is None:
+            if task is None:
                 # 队列为空，继续等待
                 continue
 
-            task_id, task_data = task_info
-            logger.info(f"📥 获取到任务: {task_id}")
-
-            # 处理任务
-            await process_task(task_id, task_data)
+            logger.info(f"📥 获取到任务: {task.task_id}（第 {task.attempt} 次执行）")
+
+            # 处理任务，结束后确认；失败时重新入队或移入死信列表
+            if slot is not None:
+                slot.task_started()
+            try:
+                error = await process_task(task.task_id, task.data, task.attempt)
+            finally:
+                if slot is not None:
+                    slot.task_finished()
+            if error is None:
+                ack_task(consumer_id, task.task_id)
+            else:
+                fail_task(consumer_id, task.task_id, error)
 
             # 重置错误计数
             consecutive_errors = 0
@@ -199,11 +272,62 @@ async def worker_loop():
             # 等待一段时间后重试
             await asyncio.sleep(5)
 
+    stop_heartbeat.set()
+    requeued = remove_consumer(consumer_id)
+    if requeued:
+        logger.info(f"放回 {requeued} 个未完成的任务")
     logger.info("Worker 已停止")
 
 
+def run_child(slot: ChildSlot) -> None:
+    """预派生子进程入口：模型已由父进程加载，直接进入主循环"""
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    try:
+        asyncio.run(worker_loop(slot.child_id, slot))
+    finally:
+        shutdown_shard_pool()
+
+
+def reclaim_child(slot: ChildSlot, code: int) -> None:
+    """子进程退出后立即回收其处理中的任务（不必等待心跳超时）"""
+    reclaimed = reclaim_consumer(slot.child_id)
+    if reclaimed:
+        logger.warning(f"Worker 子进程 {slot.index} 退出 (code {code})，回收 {reclaimed} 个任务")
+
+
+def run_supervisor(processes: int) -> None:
+    """
+    预派生模式：父进程加载模型后 fork 子进程
+
+    Args:
+        processes: 配置的子进程数，0 表示按 CPU 与内存自动计算
+    """
+    # 模型在 fork 之前加载，子进程以写时复制方式共享
+    recognizer.initialize()
+
+    size = pool_size(processes)
+    logger.info(f"预派生 Worker 进程池: {size} 个子进程")
+
+    supervisor = WorkerSupervisor(
+        run_child,
+        size,
+        on_child_exit=reclaim_child,
+        on_report=lambda report: cache_worker_pool(f"{report['node']}:{report['pid']}", report)
+    )
+    supervisor.run()
+
+
 def main():
     """主入口"""
+    parser = argparse.ArgumentParser(description="Character Recognition Worker")
+    parser.add_argument(
+        "--workers", type=int, default=settings.WORKER_PROCESSES,
+        help="子进程数：1 为单进程，大于 1 为预派生模式，0 为按 CPU 与内存自动计算"
+    )
+    args, _ = parser.parse_known_args()
+
     logger.info(f"Character Recognition Worker v{settings.APP_VERSION}")
     logger.info(f"Redis URL: {settings.REDIS_URL}")
     logger.info(f"缓存启用: {settings.ENABLE_CACHE}")
@@ -224,10 +348,15 @@ def main():
 
     # 运行 Worker
     try:
+        if args.workers != 1:
+            run_supervisor(args.workers)
+            return
         asyncio.run(worker_loop())
     except Exception as e:
         logger.error(f"Worker 异常退出: {e}")
         sys.exit(1)
+    finally:
+        shutdown_shard_pool()
 
 
 if __name__ == "__main__":